@@ -14,16 +14,32 @@
 # OR (2) TO PROVIDE TECHNICAL SUPPORT TO USERS.
 
 import os
+import copy
+import tempfile
+import hashlib
 import datetime
+import logging
+from collections import OrderedDict
+import multiprocessing
 import numpy as np
 from pytz import timezone
-from .util.ek60_raw_file import RawSimradFile, SimradEOF
+# numexpr is optional.  If it is installed it is used when converting power.
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+from .util.ek60_raw_file import RawSimradFile, MappedRawSimradFile, SimradEOF
+from .util.ek60_raw_index import get_index
+from .util.date_conversion import nt_to_datetime64
 from .util.nmea_data import nmea_data
-from ..ping_data import PingData
+from ..ping_data import PingData, grow_capacity
 from ..processing.processed_data import ProcessedData
 from ..processing import line
 
 
+log = logging.getLogger(__name__)
+
+
 class EK60(object):
     """This class is the 'file reader' class for Simrad EK60 instrument files.
 
@@ -56,10 +72,23 @@ class EK60(object):
             the NMEA data from the data files.
         read_incremental; Boolean value controlling whether files are read
             incrementally or all at once. The default value is False.
+        read_chunk_pings: Integer number of pings to read in each chunk when
+            reading incrementally.
+        read_chunk_seconds: Float number of seconds of data to read in each
+            chunk when reading incrementally.
         read_angles: Boolean control variable to set whether or not to store
             angle data.
         read_power: Boolean control variable to set whether or not to store
             the power data.
+        read_compact: Boolean control variable to set whether or not to store
+            the power and angle data in their compact, indexed form. See
+            RawData.
+        read_ragged: Boolean control variable to set whether or not to store
+            the power and angle data in flat, ragged sample buffers instead
+            of rectangular arrays. See RawData.
+        read_scratch_dir: The path of the directory of the temporary files
+            that store the power and angle data when they are memory mapped
+            or None to store them in memory. See RawData.
         read_max_sample_count: Integer value to specify the max sample count
             to read. This property can be used to limit the number of samples
             read (and memory used) when your data of interest is less than
@@ -84,6 +113,10 @@ class EK60(object):
             read. An empty list will result in all channels being read.
     """
 
+    # Define the datagram types that are stored. Other datagram types are
+    # skipped when reading.
+    DATAGRAM_TYPES = ['RAW', 'NME', 'TAG', 'BOT', 'DEP']
+
 
     def __init__(self):
         """Initializes EK60 class object.
@@ -134,16 +167,54 @@ class EK60(object):
         # Specify if we should read files incrementally or all at once.
         self.read_incremental = False
 
+        # Set read_memory_map to True to read files using a memory mapped
+        # file object instead of the standard buffered file object.
+        self.read_memory_map = False
+
+        # Set read_index to True to use datagram index files when reading.
+        # Only the datagrams within the time and ping bounds are read when
+        # reading with an index.
+        self.read_index = False
+
+        # Set read_chunk_pings and/or read_chunk_seconds to define the size of
+        # the chunks read when reading incrementally.  If neither is set, each
+        # chunk contains the data from a single file.
+        self.read_chunk_pings = None
+        self.read_chunk_seconds = None
+
         # Define an internal state variable that is set when we initiate
         # incremental reading.
         self._is_reading = False
 
+        # Define the internal state of the incremental reader.  These store
+        # the list of files that have not been read, the open file object
+        # and the number of pings and start time of the current chunk.
+        self._read_files = []
+        self._read_n_files = 0
+        self._read_fid = None
+        self._read_ping_numbers = None
+        self._read_last_ping = None
+        self._chunk_n_pings = 0
+        self._chunk_start_time = None
+
         # Set read_angles to true to store angle data.
         self.read_angles = True
 
         # Set read_angles to true to store power data.
         self.read_power = True
 
+        # Set read_compact to true to store the power and angle data in their
+        # indexed form.  The data are converted when they are retrieved.
+        self.read_compact = False
+
+        # Set read_ragged to true to store the power and angle data of each
+        # ping in flat sample buffers without padding.
+        self.read_ragged = False
+
+        # Set read_scratch_dir to a directory path to store the power and
+        # angle data in memory mapped temporary files in that directory.
+        self.read_scratch_dir = None
+
         # Specify the maximum sample count to read.  This property can be used
         # to limit the number of samples read (and memory used) when your data
         # of interest is large.
@@ -189,6 +260,11 @@ class EK60(object):
         # we're storing.
         self._file_channel_map = []
 
+        # Bottom detection datagrams read from .bot and .out files are
+        # buffered and merged with the raw data in a batch after the file is
+        # read.  This list should not be altered or used.
+        self._bottom_datagrams = []
+
 
     def read_bot(self, bot_files):
         """Passes a list of .bot filenames to read_raw.
@@ -220,7 +296,10 @@ class EK60(object):
                  max_sample_count=None, start_time=None, end_time=None,
                  start_ping=None, end_ping=None, frequencies=None,
                  channel_ids=None, time_format_string='%Y-%m-%d %H:%M:%S',
-                 incremental=None, start_sample=None, end_sample=None):
+                 incremental=None, start_sample=None, end_sample=None,
+                 memory_map=None, index=None, workers=None, chunk_pings=None,
+                 chunk_seconds=None, compact=None, ragged=None,
+                 scratch_dir=None):
         """Reads one or more Simrad EK60 ES60/70 .raw files.
 
         This method also reads .out and .bot files, but you must read the
@@ -255,12 +334,50 @@ class EK60(object):
                 start and end time arguments. Format is used to create datetime
                 objects start and end time strings
             incremental (bool): A value of True indicates object will read
-                files incrementally. Otherwise, files are read in their
-                entirety.
+                files incrementally. The first chunk of data is read and
+                read_next is called to read the following chunks. Otherwise,
+                files are read in their entirety.
             start_sample (int): Specify starting sample number if not
                 reading from first sample.
             end_sample (int): Specify ending sample number if not
                 reading to last sample.
+            memory_map (bool): Set to True to read files using a memory
+                mapped file object. This is generally faster when reading
+                large files from local disks.
+            index (bool): Set to True to read files using datagram index
+                files. Index files are created alongside the raw files the
+                first time a file is read. Only the datagrams within the
+                specified time and ping bounds are read from the file.
+            workers (int): Set to the number of processes to use to read
+                the files in parallel. Each file is read by a worker process
+                and the data are merged in the order the files are listed.
+                Files are always read sequentially when the start_ping or
+                end_ping is set, when reading incrementally or when reading
+                .bot/.out files.
+            chunk_pings (int): Set to the number of pings to read in each
+                chunk when reading incrementally.
+            chunk_seconds (float): Set to the number of seconds of data to
+                read in each chunk when reading incrementally.
+            compact (bool): Set to True to store the power and angle data in
+                their indexed form (int16 power and int8 angles). This uses
+                about a third of the memory and the data are converted when
+                they are retrieved. This setting only applies to channels that
+                don't already have a RawData object.
+            ragged (bool): Set to True to store the power and angle data of
+                each ping in flat sample buffers instead of rectangular arrays
+                that are padded to the longest ping. This reduces the memory
+                used when the number of samples changes within the data. This
+                setting only applies to channels that don't already have a
+                RawData object.
+            scratch_dir (str): Set to the path of a directory to store the
+                power and angle data in memory mapped temporary files in that
+                directory. This allows reading more data than fit in memory.
+                This setting only applies to channels that don't already have
+                a RawData object.
+
+        Returns:
+            When reading incrementally, True if data were read and False if
+            there are no data to read.
         """
 
         # Update the reading state variables.
@@ -282,6 +399,12 @@ class EK60(object):
             self.read_power = power
         if angles:
             self.read_angles = angles
+        if compact:
+            self.read_compact = compact
+        if ragged:
+            self.read_ragged = ragged
+        if scratch_dir:
+            self.read_scratch_dir = scratch_dir
         if max_sample_count:
             self.read_max_sample_count = max_sample_count
         if frequencies:
@@ -290,122 +413,827 @@ class EK60(object):
             self.read_channel_ids = channel_ids
         if incremental:
             self.read_incremental = incremental
-
-        #TODO:  Implement incremental reading.
-        #       This is going to take some re-org since we can't simply
-        #       iterate thru the list of files. We need to be able to read a
-        #       subset of data from a file and if required open the next
-        #       file in the list and continue reading the subset.
+        if memory_map:
+            self.read_memory_map = memory_map
+        if index:
+            self.read_index = index
+        if chunk_pings:
+            self.read_chunk_pings = chunk_pings
+        if chunk_seconds:
+            self.read_chunk_seconds = chunk_seconds
 
         # Ensure that the raw_files argument is a list.
         if isinstance(raw_files, str):
             raw_files = [raw_files]
 
+        # Check if we're reading the files in parallel.  Pings are counted
+        # across files when applying ping bounds and bottom data are
+        # merged with existing raw data so in these cases files must be
+        # read sequentially.
+        if (workers and workers > 1 and len(raw_files) > 1 and
+                not self.read_incremental and
+                self.read_start_ping is None and self.read_end_ping is None and
+                not any([os.path.splitext(f)[1].lower() in ['.bot', '.out']
+                         for f in raw_files])):
+            self._read_raw_parallel(raw_files, workers)
+            return
+
+        # Check if we're reading incrementally.  If so, store the list of
+        # files and read the first chunk of data.
+        if self.read_incremental:
+            self._read_files = list(raw_files)
+            self._read_n_files = 0
+            self._read_fid = None
+            self._is_reading = True
+            return self.read_next()
+
         # Initialize a file counter.
         n_files = 0
 
         # Iterate through the list of .raw files to read.
         for filename in raw_files:
 
-            # Read data from the file and add to self.raw_data.  Then read the
-            # configuration datagrams.  The CON0 datagram will come first.  If
-            # this is an ME70 .raw file, the CON1 datagram will follow.
-            with RawSimradFile(filename, 'r') as fid:
-
-                # Read the CON0 configuration datagram.
-                config_datagram = fid.read(1)
-                config_datagram['timestamp'] = \
-                        np.datetime64(config_datagram['timestamp'], '[ms]')
-                if n_files == 0:
-                    self.start_time = config_datagram['timestamp']
-
-                # Create a mapping of channel numbers to channel IDs for all
-                # transceivers in the file.
-                self._file_channel_map = [None] * \
-                    config_datagram['transceiver_count']
-                for idx in config_datagram['transceivers'].keys():
-                    self._file_channel_map[idx-1] = \
-                        config_datagram['transceivers'][idx]['channel_id']
-
-                # Check if reading an ME70 file with a CON1 datagram.
-                next_datagram = fid.peek()
-                if next_datagram == 'CON1':
-                    CON1_datagram = fid.read(1)
-                else:
-                    CON1_datagram = None
-
-                # Check if a RawData object for this channel needs to be
-                # created.
-                self._channel_map = {}
-                for channel in config_datagram['transceivers']:
-                    # Get the channel ID.
-                    channel_id = config_datagram['transceivers'][channel][
-                        'channel_id']
-
-                    # Check if we are reading this channel.
-                    if (self.read_channel_ids and channel_id not in
-                            self.read_channel_ids):
-                        # There are specific channel IDs specified and this
-                        # is *NOT* one of them, so continue.
-                        continue
-
-                    # Check if we are reading this frequency.
-                    frequency = config_datagram['transceivers'][channel][
-                        'frequency']
-                    if self.read_frequencies and frequency not in \
-                            self.read_frequencies:
-                        # There are specific frequencies specified and this
-                        # is *NOT* one of them, so continue.
-                        continue
-
-                    # Check if a RawData object exists for this channel.  If
-                    # not, create it, add it to the list of channel_ids,
-                    # and update the public channel id map.
-                    if channel_id not in self.raw_data:
-                        self.raw_data[channel_id] = RawData(channel_id,
-                                store_power=self.read_power,
-                                store_angles=self.read_angles,
-                                max_sample_number=self.read_max_sample_count)
-
-                        self.channel_ids.append(channel_id)
-
-                        self.n_channels += 1
-                        self.channel_id_map[self.n_channels] = channel_id
-
-                    # Update the internal mapping of channel number to
-                    # channel ID used when reading the datagrams.  This
-                    # mapping is only valid for the current file that is
-                    # being read.
-                    self._channel_map[channel] = channel_id
-
-                    # Create a channel_metadata object to store this channel's
-                    # configuration and rawfile metadata.
-                    metadata = ChannelMetadata(filename,
-                                config_datagram['transceivers'][channel],
-                                config_datagram['survey_name'],
-                                config_datagram['transect_name'],
-                                config_datagram['sounder_name'],
-                                config_datagram['version'],
-                                self.raw_data[channel_id].n_pings,
-                                config_datagram['timestamp'],
-                                extended_configuration=CON1_datagram)
-
-                    # Update the channel_metadata property of the RawData
-                    # object.
-                    self.raw_data[channel_id].current_metadata = metadata
+            # Open the file and read the configuration datagrams.
+            fid, dgram_index = self._open_raw_file(filename, n_files)
+            with fid:
 
                 # Read the rest of the datagrams.
-                self._read_datagrams(fid, self.read_incremental)
+                if self.read_index or self.read_memory_map:
+                    self._read_indexed_datagrams(fid, dgram_index)
+                else:
+                    self._read_datagrams(fid, self.read_incremental)
 
                 n_files += 1
 
         # Trim excess data from arrays after reading.
+        self._trim_data()
+
+
+    def read_next(self):
+        """Reads the next chunk of data when reading incrementally.
+
+        When reading incrementally, read_raw reads the first chunk of data
+        and read_next is called to read each of the following chunks. Each
+        chunk is stored in new RawData and nmea_data objects which replace
+        the objects from the previous chunk. Chunks contain chunk_pings pings
+        or chunk_seconds seconds of data (whichever comes first), or if
+        neither was specified, the data from a single file. Reading continues
+        from where the previous chunk ended, including the next file in the
+        list of files when the end of a file is reached.
+
+        Returns:
+            True if data were read and False if there are no more data to
+            read.
+        """
+
+        # Check if we're reading.
+        if not self._is_reading:
+            return False
+
+        # Create new RawData and nmea_data objects for this chunk.
+        self._start_chunk()
+
+        while True:
+            # Check if we need to open the next file.
+            if self._read_fid is None:
+                if len(self._read_files) == 0:
+                    # There are no more files to read.
+                    self._is_reading = False
+                    break
+
+                # Open the next file and read the configuration datagrams.
+                filename = self._read_files.pop(0)
+                self._read_fid, dgram_index = self._open_raw_file(filename,
+                        self._read_n_files)
+                self._read_n_files += 1
+
+                # If we're using an index, select the datagrams we're reading.
+                if self.read_index or self.read_memory_map:
+                    selected_idx, self._read_ping_numbers, \
+                            self._read_last_ping = \
+                            self._select_indexed_datagrams(self._read_fid,
+                                                           dgram_index)
+                    self._read_fid.select_datagrams(selected_idx)
+                else:
+                    self._read_ping_numbers = None
+                    self._read_last_ping = None
+
+            # Read datagrams until the chunk is full or we reach the end of
+            # the file.
+            chunk_full = self._read_datagrams(self._read_fid, True,
+                    ping_numbers=self._read_ping_numbers)
+            if chunk_full:
+                break
+
+            # We've reached the end of the file - close it.
+            self._read_fid.close()
+            self._read_fid = None
+            if self._read_last_ping is not None:
+                self.n_pings = self._read_last_ping
+
+            # If we're not reading chunks of a specific size we read one file
+            # at a time.
+            if (not self.read_chunk_pings and not self.read_chunk_seconds and
+                    self._chunk_n_pings > 0):
+                break
+
+        # Trim excess data from arrays after reading.
+        self._trim_data()
+
+        return self._chunk_n_pings > 0
+
+
+    def iter_raw(self, raw_files, chunk_pings=None, chunk_seconds=None,
+                 **kwargs):
+        """Generator that reads raw files incrementally.
+
+        iter_raw reads the files in chunks and yields the raw_data dictionary
+        after each chunk is read. Each chunk is stored in new RawData
+        objects so references to the RawData objects from previous chunks
+        remain valid.
+
+        Args:
+            raw_files (list): List containing full paths to data files to be
+                read.
+            chunk_pings (int): The number of pings in each chunk.
+            chunk_seconds (float): The number of seconds in each chunk.
+            **kwargs: Additional keywords are passed to read_raw.
+
+        Yields:
+            The raw_data dictionary containing the RawData objects for the
+            chunk.
+        """
+
+        more_data = self.read_raw(raw_files, incremental=True,
+                                  chunk_pings=chunk_pings,
+                                  chunk_seconds=chunk_seconds, **kwargs)
+        while more_data:
+            yield self.raw_data
+            more_data = self.read_next()
+
+
+    def iter_Sv(self, raw_files, chunk_pings=None, chunk_seconds=None,
+                calibration=None, linear=False, tvg_correction=True,
+                heave_correct=False, return_depth=False, v_axis=None,
+                **kwargs):
+        """Generator that reads raw files incrementally and yields Sv.
+
+        iter_Sv reads the files in chunks (see iter_raw) and converts the
+        power data of each chunk to Sv. All of the chunks of a channel share
+        the same vertical axis, which is the vertical axis of the first chunk
+        of the channel unless v_axis is specified. Data from chunks with a
+        different vertical axis are interpolated onto the channel's axis.
+        Samples that fall outside of the channel's axis are dropped. This
+        happens when a later chunk has a longer range than the first chunk
+        and a warning is logged the first time samples of a channel are
+        dropped. Pass a v_axis that covers the full range of the data to keep
+        these samples. The gain and TVG vectors are computed once and reused
+        for the following chunks when the calibration parameters and range
+        are unchanged.
+
+        Only one chunk of raw data is held in memory at a time so the memory
+        used is bounded by the chunk size and not by the amount of data read.
+
+        Args:
+            raw_files (list): List containing full paths to data files to be
+                read.
+            chunk_pings (int): The number of pings in each chunk.
+            chunk_seconds (float): The number of seconds in each chunk.
+            calibration (calibration object): The data calibration object
+                used to convert the data or a dictionary, keyed by channel
+                ID, of calibration objects. Calibration parameters must be
+                scalars since they are applied to every chunk.
+            linear (bool): Set to True to return sv instead of Sv.
+            tvg_correction (bool): Set to True to apply a correction to the
+                range of 2 * sample thickness.
+            heave_correct (bool): Set to True to apply heave correction.
+            return_depth (bool): Set to True to return the vertical axis of
+                the data as depth.
+            v_axis (array): A numpy array containing the vertical axis to
+                return the data on. If None, the vertical axis of the first
+                chunk of each channel is used and samples of later chunks
+                beyond this axis are dropped.
+            **kwargs: Additional keywords are passed to read_raw.
+
+        Yields:
+            A dictionary, keyed by channel ID, of ProcessedData objects
+            containing the Sv (or sv) data of the chunk.
+        """
+
+        # Store the vertical axis and gain cache of each channel and track
+        # the channels we have warned about dropping samples.
+        channel_v_axis = {}
+        gain_caches = {}
+        dropped_channels = set()
+
+        for raw_data in self.iter_raw(raw_files, chunk_pings=chunk_pings,
+                                      chunk_seconds=chunk_seconds, **kwargs):
+            sv_data = {}
+            for channel_id in self.channel_ids:
+                # Skip channels without data in this chunk.
+                if raw_data[channel_id].n_pings < 1:
+                    continue
+
+                # Get the calibration object for this channel.
+                if isinstance(calibration, dict):
+                    channel_cal = calibration.get(channel_id, None)
+                else:
+                    channel_cal = calibration
+
+                # Convert the power to Sv.
+                p_data = raw_data[channel_id].get_Sv(calibration=channel_cal,
+                        linear=linear, tvg_correction=tvg_correction,
+                        heave_correct=heave_correct, return_depth=return_depth,
+                        gain_cache=gain_caches.setdefault(channel_id, {}))
+
+                # Put the data on the channel's vertical axis.
+                if channel_id not in channel_v_axis:
+                    if v_axis is None:
+                        channel_v_axis[channel_id] = \
+                                p_data.get_v_axis()[0].copy()
+                    else:
+                        channel_v_axis[channel_id] = np.asarray(v_axis)
+                n_dropped = self._match_v_axis(p_data,
+                                               channel_v_axis[channel_id])
+                if n_dropped > 0 and channel_id not in dropped_channels:
+                    log.warning('iter_Sv: %d samples of channel %s fall '
+                                'outside of the vertical axis of the first '
+                                'chunk and were dropped. Pass a v_axis that '
+                                'covers the full range of the data to keep '
+                                'them.', n_dropped, channel_id)
+                    dropped_channels.add(channel_id)
+
+                sv_data[channel_id] = p_data
+
+            yield sv_data
+
+
+    def _match_v_axis(self, p_data, v_axis):
+        """Interpolates the sample data of a ProcessedData object onto a
+        vertical axis.
+
+        Samples of the new axis that fall outside of the object's vertical
+        axis are set to NaN and samples of the object that fall outside of
+        the new axis are dropped. Sample data are interpolated in linear
+        units.
+
+        Args:
+            p_data (ProcessedData): The ProcessedData object to modify.
+            v_axis (array): The new vertical axis.
+
+        Returns:
+            The number of samples, not counting NaNs, that were dropped
+            because they fall outside of the new axis.
+        """
+
+        # Get the existing vertical axis.
+        old_v_axis, axis_type = p_data.get_v_axis()
+
+        # Check if the vertical axes are the same.
+        if (old_v_axis.shape[0] == v_axis.shape[0] and
+                np.allclose(old_v_axis, v_axis)):
+            return 0
+
+        # Count the existing samples that are more than half a sample beyond
+        # either end of the new axis.  These are dropped.
+        if v_axis.shape[0] > 1:
+            half_sample = np.abs(v_axis[1] - v_axis[0]) / 2.0
+        else:
+            half_sample = p_data.sample_thickness / 2.0
+        dropped = np.logical_or(old_v_axis < np.min(v_axis) - half_sample,
+                                old_v_axis > np.max(v_axis) + half_sample)
+        n_dropped = np.count_nonzero(~np.isnan(p_data.data[:, dropped]))
+
+        # Compute the fractional sample number of each new sample.  The
+        # samples of the existing axis are evenly spaced.
+        n_samples = old_v_axis.shape[0]
+        sample_pos = (v_axis - old_v_axis[0]) / p_data.sample_thickness
+        in_bounds = np.logical_and(sample_pos > -0.01,
+                                   sample_pos < n_samples - 0.99)
+        sample_pos = np.clip(sample_pos, 0, n_samples - 1)
+        first_sample = np.minimum(np.floor(sample_pos).astype(np.int64),
+                                  n_samples - 2 if n_samples > 1 else 0)
+        weight = (sample_pos - first_sample).astype(p_data.data.dtype)
+
+        # Check if the new samples line up with the existing samples.  If so
+        # we can simply copy them.
+        if np.allclose(weight[in_bounds] % 1, 0, atol=0.01):
+            first_sample = np.rint(sample_pos).astype(np.int64)
+            data = p_data.data[:, first_sample]
+        else:
+            # Interpolate between samples in linear units.
+            data = p_data.data
+            if p_data.is_log:
+                data = 10.0 ** (data / 10.0)
+            last_sample = np.minimum(first_sample + 1, n_samples - 1)
+            data = (data[:, first_sample] * (1 - weight) +
+                    data[:, last_sample] * weight)
+            if p_data.is_log:
+                with np.errstate(divide='ignore'):
+                    data = 10.0 * np.log10(data)
+
+        # Set the samples outside of the existing axis to NaN.
+        data[:, ~in_bounds] = np.nan
+
+        # Update the sample data and vertical axis.
+        p_data.data = data.astype(p_data.data.dtype, copy=False)
+        setattr(p_data, axis_type, v_axis.copy())
+        p_data.n_samples = v_axis.shape[0]
+        if v_axis.shape[0] > 1:
+            p_data.sample_thickness = np.mean(np.ediff1d(v_axis))
+
+        return n_dropped
+
+
+    def _open_raw_file(self, filename, n_files):
+        """Opens a raw file and reads the configuration datagrams.
+
+        The configuration datagrams are read and the RawData objects and
+        channel maps are created or updated.
+
+        Args:
+            filename (str): The full path to the file.
+            n_files (int): The number of files that have been read.
+
+        Returns:
+            A tuple containing the file object and the datagram index of the
+            file (or None if the file is not being read with an index).
+        """
+
+        # Open the file.  If we're using an index, get the datagram index for
+        # this file and open it using the index to locate the datagrams.
+        dgram_index = None
+        if self.read_index:
+            dgram_index = get_index(filename)
+            fid = MappedRawSimradFile(filename, 'r', index=dgram_index)
+        elif self.read_memory_map:
+            # Open the file and get the index from the mapped file.
+            fid = MappedRawSimradFile(filename, 'r')
+            dgram_index = fid.get_index()
+        else:
+            fid = RawSimradFile(filename, 'r')
+
+        # Read the configuration datagrams.  The CON0 datagram will come
+        # first.  If this is an ME70 .raw file, the CON1 datagram will follow.
+        config_datagram = fid.read(1)
+        config_datagram['timestamp'] = \
+                np.datetime64(config_datagram['timestamp'], '[ms]')
+        if n_files == 0:
+            self.start_time = config_datagram['timestamp']
+
+        # Check if reading an ME70 file with a CON1 datagram.
+        next_datagram = fid.peek()
+        if next_datagram['type'] == 'CON1':
+            CON1_datagram = fid.read(1)
+        else:
+            CON1_datagram = None
+
+        # Create the RawData objects and channel maps for this file.
+        self._configure_channels(filename, config_datagram, CON1_datagram)
+
+        # Have the parser decode only the samples and data we store.
+        self._set_sample_window(fid)
+
+        # If we're not using an index, have the file object skip the
+        # datagrams we would discard so they are not read or parsed.
+        if dgram_index is None:
+            fid.set_filter(types=self.DATAGRAM_TYPES,
+                           channels=list(self._channel_map.keys()),
+                           start_time=self.read_start_time,
+                           end_time=self.read_end_time,
+                           skip_callback=self._skip_datagram)
+
+        return fid, dgram_index
+
+
+    def _set_sample_window(self, fid):
+        """Sets the window of samples decoded by the RAW datagram parser.
+
+        The window starts at read_start_sample and ends at the last sample
+        that can be stored given read_end_sample and the max_sample_number
+        of the RawData objects of the channels we're reading. Power and angle
+        data are only decoded if a channel stores them.
+
+        Args:
+            fid (RawSimradFile): The file object.
+        """
+
+        raw_data = [self.raw_data[channel_id] for channel_id in
+                    self._channel_map.values()]
+        if len(raw_data) == 0:
+            return
+
+        # Determine the last sample we can store.
+        end_sample = self.read_end_sample
+        if all([data.max_sample_number for data in raw_data]):
+            last_sample = max([data.max_sample_number for data in
+                               raw_data]) - 1
+            if end_sample is None or end_sample > last_sample:
+                end_sample = last_sample
+
+        fid.set_sample_window(start_sample=self.read_start_sample,
+                end_sample=end_sample,
+                power=any([data.store_power for data in raw_data]),
+                angles=any([data.store_angles for data in raw_data]))
+
+
+    def _skip_datagram(self, header):
+        """Updates the end time and ping counter for a skipped datagram.
+
+        This method is called by the file object for datagrams within the
+        time bounds that are skipped because we aren't reading their channel
+        or type. These datagrams are counted the same way they would be if
+        they were read and discarded by _process_datagram.
+
+        Args:
+            header (dict): The datagram header including the timestamp.
+        """
+
+        # Update the end_time property.
+        if self.end_time is None or self.end_time < header['timestamp']:
+            self.end_time = header['timestamp']
+
+        # Update the ping counter.
+        if header['type'].startswith('RAW') and header['channel'] == 1:
+            self.n_pings += 1
+
+
+    def _configure_channels(self, filename, config_datagram, CON1_datagram,
+                            **raw_data_kwargs):
+        """Configures the channels using a configuration datagram.
+
+        The channel maps are created and, for each channel that we are
+        reading, the RawData object is created if required and its current
+        metadata is set.
+
+        Args:
+            filename (str): The name of the data source.
+            config_datagram (dict): The CON0 configuration datagram.
+            CON1_datagram (dict): The CON1 datagram of ME70 files or None.
+            **raw_data_kwargs: Additional keywords are passed to RawData when
+                new RawData objects are created.
+        """
+
+        # Merge the bottom detections of the previous file before its
+        # channel map is replaced.
+        self._merge_bottom_data()
+
+        # Create a mapping of channel numbers to channel IDs for all
+        # transceivers in the file.
+        self._file_channel_map = [None] * \
+            config_datagram['transceiver_count']
+        for idx in config_datagram['transceivers'].keys():
+            self._file_channel_map[idx-1] = \
+                config_datagram['transceivers'][idx]['channel_id']
+
+        # Check if a RawData object for this channel needs to be
+        # created.
+        self._channel_map = {}
+        for channel in config_datagram['transceivers']:
+            # Get the channel ID.
+            channel_id = config_datagram['transceivers'][channel][
+                'channel_id']
+
+            # Check if we are reading this channel.
+            if (self.read_channel_ids and channel_id not in
+                    self.read_channel_ids):
+                # There are specific channel IDs specified and this
+                # is *NOT* one of them, so continue.
+                continue
+
+            # Check if we are reading this frequency.
+            frequency = config_datagram['transceivers'][channel][
+                'frequency']
+            if self.read_frequencies and frequency not in \
+                    self.read_frequencies:
+                # There are specific frequencies specified and this
+                # is *NOT* one of them, so continue.
+                continue
+
+            # Check if a RawData object exists for this channel.  If
+            # not, create it, add it to the list of channel_ids,
+            # and update the public channel id map.
+            if channel_id not in self.raw_data:
+                self.raw_data[channel_id] = RawData(channel_id,
+                        store_power=self.read_power,
+                        store_angles=self.read_angles,
+                        compact=self.read_compact,
+                        ragged=self.read_ragged,
+                        scratch_dir=self.read_scratch_dir,
+                        max_sample_number=self.read_max_sample_count,
+                        **raw_data_kwargs)
+
+                self.channel_ids.append(channel_id)
+
+                self.n_channels += 1
+                self.channel_id_map[self.n_channels] = channel_id
+
+            # Update the internal mapping of channel number to
+            # channel ID used when reading the datagrams.  This
+            # mapping is only valid for the current file that is
+            # being read.
+            self._channel_map[channel] = channel_id
+
+            # Create a channel_metadata object to store this channel's
+            # configuration and rawfile metadata.
+            metadata = ChannelMetadata(filename,
+                        config_datagram['transceivers'][channel],
+                        config_datagram['survey_name'],
+                        config_datagram['transect_name'],
+                        config_datagram['sounder_name'],
+                        config_datagram['version'],
+                        self.raw_data[channel_id].n_pings,
+                        config_datagram['timestamp'],
+                        extended_configuration=CON1_datagram)
+
+            # Update the channel_metadata property of the RawData
+            # object.
+            self.raw_data[channel_id].current_metadata = metadata
+
+
+    def _start_chunk(self):
+        """Starts a new chunk of data when reading incrementally.
+
+        New RawData objects are created for each channel using the current
+        file's metadata and a new nmea_data object is created.
+        """
+
+        for channel_id in self.channel_ids:
+            old_data = self.raw_data[channel_id]
+            new_data = RawData(channel_id,
+                    store_power=self.read_power,
+                    store_angles=self.read_angles,
+                    compact=self.read_compact,
+                    ragged=self.read_ragged,
+                    scratch_dir=self.read_scratch_dir,
+                    max_sample_number=self.read_max_sample_count)
+
+            # Copy the current metadata for the new object.
+            if old_data.current_metadata is not None:
+                metadata = copy.copy(old_data.current_metadata)
+                metadata.start_ping = new_data.n_pings
+                new_data.current_metadata = metadata
+
+            self.raw_data[channel_id] = new_data
+
+        self.nmea_data = nmea_data()
+
+        # Reset the chunk counters.
+        self._chunk_n_pings = 0
+        self._chunk_start_time = None
+
+
+    def _chunk_is_full(self, header):
+        """Checks if the current chunk is full.
+
+        Args:
+            header (dict): The header of the next RAW datagram with a channel
+                number of 1, as returned by the file object's peek method.
+
+        Returns:
+            True if the ping that starts with this datagram should be stored
+            in the next chunk.
+        """
+
+        if self.read_chunk_pings:
+            if self._chunk_n_pings >= self.read_chunk_pings:
+                return True
+
+        if self.read_chunk_seconds and self._chunk_start_time is not None:
+            ping_time = nt_to_datetime64((header['high_date'] << 32) +
+                                         header['low_date'])
+            chunk_ms = int(round(self.read_chunk_seconds * 1000))
+            if ping_time - self._chunk_start_time >= np.timedelta64(chunk_ms,
+                                                                    'ms'):
+                return True
+
+        return False
+
+
+    def _trim_data(self):
+        """Trims excess data from the data arrays after reading.
+
+        Buffered bottom detections are merged with the raw data first.  The
+        trimmed arrays are views of the arrays that were grown while reading
+        so they are copied if the views are much smaller than the grown
+        arrays, freeing the unused capacity.
+        """
+
+        self._merge_bottom_data()
+
         for channel_id in self.channel_ids:
-            self.raw_data[channel_id].trim()
+            # Only trim objects that contain data.  Rolling arrays are fixed
+            # in size and are not trimmed.
+            if (self.raw_data[channel_id].n_pings > 0 and
+                    not self.raw_data[channel_id].rolling_array):
+                self.raw_data[channel_id].trim()
+                self.raw_data[channel_id]._compact_arrays()
+        self.nmea_data.trim()
+
+
+    def _merge_bottom_data(self):
+        """Merges the buffered bottom detections with the raw data.
+
+        Matching each detection to the pings as it is read requires a search
+        of the ping times for every datagram so the BOT and DEP datagrams are
+        buffered and the detections of each channel are matched to the pings
+        in one batch.  The channels of the detections are mapped using the
+        current file's channel map so the buffer must be merged before the
+        next file is configured.
+        """
+
+        if len(self._bottom_datagrams) == 0:
+            return
+
+        for dgram_type in ['BOT', 'DEP']:
+            datagrams = [datagram for datagram in self._bottom_datagrams if
+                         datagram['type'].startswith(dgram_type)]
+            if len(datagrams) == 0:
+                continue
+
+            # Stack the detections into arrays of (datagram, channel).
+            times = np.array([datagram['timestamp'] for datagram in
+                              datagrams], dtype='datetime64[ms]')
+            depths = np.vstack([datagram['depth'] for datagram in datagrams])
+            if dgram_type == 'DEP':
+                reflectivity = np.vstack([datagram['reflectivity'] for
+                                          datagram in datagrams])
+
+            # Iterate through our channels, extract the depths, and update
+            # the channel.
+            for channel_id in self.channel_ids:
+                idx = self._file_channel_map.index(channel_id)
+                if dgram_type == 'DEP':
+                    self.raw_data[channel_id].append_bots(times,
+                            depths[:, idx], reflectivity=reflectivity[:, idx])
+                else:
+                    self.raw_data[channel_id].append_bots(times,
+                                                          depths[:, idx])
+
+        self._bottom_datagrams = []
+
+
+    def _read_raw_parallel(self, raw_files, workers):
+        """Reads raw files in parallel.
+
+        Each file is read by a separate EK60 object in a pool of worker
+        processes. The results are merged into this object in the order of
+        the files in the raw_files list.
+
+        Args:
+            raw_files (list): List containing full paths to data files to be
+                read.
+            workers (int): The number of worker processes.
+        """
+
+        # Get the reading state we pass to the worker processes.
+        read_state = {}
+        for attribute in self.__dict__:
+            if attribute.startswith('read_'):
+                read_state[attribute] = getattr(self, attribute)
+
+        # Create the pool and read the files.  imap returns the results in
+        # the order of the files so we can merge them as they are returned.
+        pool = multiprocessing.Pool(processes=workers)
+        try:
+            n_files = 0
+            raw_data = {}
+            for reader in pool.imap(_read_raw_file, [(filename, read_state)
+                                    for filename in raw_files]):
+                # The start time is the start time of the first file.
+                if n_files == 0:
+                    self.start_time = reader.start_time
+
+                # Merge the data read by this worker.
+                self._merge_reader(reader, raw_data)
+                n_files += 1
+        finally:
+            pool.close()
+            pool.join()
+
+        # Append the data to our RawData objects.
+        for channel_id in raw_data:
+            self._append_raw_data(channel_id, raw_data[channel_id])
         self.nmea_data.trim()
 
 
-    def _read_datagrams(self, fid, incremental):
+    def _merge_reader(self, reader, raw_data):
+        """Merges the state and data of an EK60 object that read a file.
+
+        The EK60 object's properties and NMEA data are merged into this
+        object and its RawData objects are added to the raw_data dict so
+        they can be appended to our RawData objects all at once.
+
+        Args:
+            reader (EK60): The EK60 object containing the data read from a
+                file.
+            raw_data (dict): A dictionary keyed by channel ID containing the
+                lists of RawData objects to append.
+        """
+
+        # Update the end time.
+        if reader.end_time is not None:
+            if self.end_time is None or self.end_time < reader.end_time:
+                self.end_time = reader.end_time
+
+        # Update the ping numbers.  Ping numbers in the reader are relative to
+        # the file so we offset them by the number of pings we have read.
+        if reader.start_ping:
+            if not self.start_ping:
+                self.start_ping = self.n_pings + reader.start_ping
+            self.end_ping = self.n_pings + reader.end_ping
+        self.n_pings += reader.n_pings
+
+        # Update the channel lists and maps.
+        for channel_id in reader.channel_ids:
+            if channel_id not in self.raw_data:
+                self.raw_data[channel_id] = RawData(channel_id,
+                        store_power=self.read_power,
+                        store_angles=self.read_angles,
+                        compact=self.read_compact,
+                        ragged=self.read_ragged,
+                        scratch_dir=self.read_scratch_dir,
+                        max_sample_number=self.read_max_sample_count)
+                self.channel_ids.append(channel_id)
+                self.n_channels += 1
+                self.channel_id_map[self.n_channels] = channel_id
+
+            # Add the RawData object if it contains data.
+            if reader.raw_data[channel_id].n_pings > 0:
+                raw_data.setdefault(channel_id, []).append(
+                        reader.raw_data[channel_id])
+        self._channel_map = reader._channel_map
+        self._file_channel_map = reader._file_channel_map
+
+        # Append the NMEA data.
+        self.nmea_data.append(reader.nmea_data)
+
+
+    def _append_raw_data(self, channel_id, new_raw_data):
+        """Appends RawData objects to one of our RawData objects.
+
+        Our RawData object is resized once to hold the data from all of the
+        objects and the data are copied in. The ChannelMetadata objects of
+        the appended data are updated with their new ping numbers.
+
+        Args:
+            channel_id (str): The channel ID of the RawData object we are
+                appending to.
+            new_raw_data (list): The list of RawData objects to append.
+        """
+
+        my_data = self.raw_data[channel_id]
+
+        # Update the ping numbers stored in the ChannelMetadata objects. The
+        # start ping of the first file read by a RawData object is -1 since
+        # its arrays have not been allocated.
+        n_pings = max(my_data.n_pings, 0)
+        for new_data in new_raw_data:
+            if n_pings > 0:
+                for metadata in new_data.metadata_table:
+                    metadata.start_ping = max(metadata.start_ping, 0) + n_pings
+                    metadata.end_ping += n_pings
+            n_pings += new_data.n_pings
+
+        # If our RawData object is empty, the first object becomes our
+        # object.
+        if my_data.n_pings <= 0:
+            my_data = new_raw_data.pop(0)
+            self.raw_data[channel_id] = my_data
+        if len(new_raw_data) == 0:
+            return
+
+        # Resize our data arrays to hold the new data.
+        n_samples = max([my_data.n_samples] + [new_data.n_samples for
+                                               new_data in new_raw_data])
+        this_ping = my_data.n_pings
+        my_data.resize(n_pings, n_samples)
+
+        # Copy the data into our arrays.  The ChannelMetadata objects are
+        # added to our metadata table and ragged samples are copied into our
+        # sample buffers first.
+        for new_data in new_raw_data:
+            new_data = my_data._add_metadata(new_data)
+            if my_data.ragged:
+                new_data = my_data._add_ragged_samples(new_data)
+            next_ping = this_ping + new_data.n_pings
+            for attribute in my_data._data_attributes:
+                if not hasattr(new_data, attribute):
+                    continue
+                data = getattr(my_data, attribute)
+                new = getattr(new_data, attribute)
+                if data.ndim == 1:
+                    data[this_ping:next_ping] = new[0:new_data.n_pings]
+                elif data.ndim == 2:
+                    data[this_ping:next_ping, 0:new.shape[1]] = \
+                            new[0:new_data.n_pings, :]
+                    data[this_ping:next_ping, new.shape[1]:] = \
+                            my_data._get_fill_value(data.dtype)
+            this_ping = next_ping
+        my_data.n_pings = n_pings
+
+
+    def _read_datagrams(self, fid, incremental, ping_numbers=None):
         """Reads datagrams.
 
         An internal method to read all of the datagrams contained in a file.
@@ -416,156 +1244,316 @@ class EK60(object):
                 object.
             incremental (bool): Boolean to control incremental reading. True
                 = incremental reading, False reads entire file.
-        """
-
-        #TODO: implement incremental reading
-        #      The user should be able to specify incremental reading in
-        #      their call to read_raw. incremental reading should read in the
-        #      specified number of "pings", save the reader state,
-        #      then return. Subsequent calls would pick up where the reading
-        #      left off.  As stated above, the exact mechanics need to be
-        #      worked out since it will not work as currently implemented.
-
+            ping_numbers (array): The ping number of each datagram in the
+                file when the datagrams have been selected from an index. If
+                None, pings are counted as the datagrams are read.
 
-        #TODO:  figure out what if anything we want to do with these.
-        #       Either expose in some useful way or remove.
-        num_sample_datagrams = 0
-        num_sample_datagrams_skipped = 0
-        num_datagrams_parsed = 0
-        num_bot_datagrams = 0
+        Returns:
+            True if reading incrementally and the current chunk is full,
+            otherwise False when the end of the file is reached.
+        """
 
         # While datagrams are available, try to read in the next datagram.
         while True:
+            # If we're reading incrementally, check if the next datagram
+            # starts a new ping that belongs in the next chunk.
+            if incremental and self._chunk_n_pings > 0:
+                try:
+                    next_header = fid.peek()
+                except SimradEOF:
+                    break
+                if next_header['type'].startswith('RAW'):
+                    if ping_numbers is not None:
+                        new_ping = (int(ping_numbers[fid.tell()]) !=
+                                    self.n_pings)
+                    else:
+                        new_ping = next_header['channel'] == 1
+                    if new_ping and self._chunk_is_full(next_header):
+                        return True
+
             try:
                 new_datagram = fid.read(1)
             except SimradEOF:
                 break
 
-            # Convert the timestamp to a datetime64 object.
-            new_datagram['timestamp'] = \
-                    np.datetime64(new_datagram['timestamp'], '[ms]')
+            # Get the ping number of this datagram if we know it.
+            if ping_numbers is not None:
+                ping_number = int(ping_numbers[fid.tell() - 1])
+            else:
+                ping_number = None
 
-            # Check if data should be stored based on time bounds.
-            if self.read_start_time is not None:
-                if new_datagram['timestamp'] < self.read_start_time:
-                    continue
-            if self.read_end_time is not None:
-                if new_datagram['timestamp'] > self.read_end_time:
-                    continue
+            # Store the datagram.
+            self._process_datagram(new_datagram, ping_number=ping_number)
 
-            num_datagrams_parsed += 1
+        return False
 
-            # Update the end_time property.
-            if self.end_time is not None:
-                # We can't assume data will be read in time order.
-                if self.end_time < new_datagram['timestamp']:
-                    self.end_time = new_datagram['timestamp']
-            else:
+
+    def _process_datagram(self, new_datagram, ping_number=None):
+        """Processes a datagram.
+
+        The datagram is checked against the time and ping bounds and its data
+        are stored in the RawData, nmea_data or bottom data attributes.
+
+        Args:
+            new_datagram (dict): The datagram as returned by the parsers in
+                util.parsers.
+            ping_number (int): The ping number of a RAW datagram if it is
+                already known. If None, pings are counted as channel 1
+                datagrams are processed.
+        """
+
+        # Convert the timestamp to a datetime64 object.
+        new_datagram['timestamp'] = \
+                np.datetime64(new_datagram['timestamp'], '[ms]')
+
+        # Check if data should be stored based on time bounds.
+        if self.read_start_time is not None:
+            if new_datagram['timestamp'] < self.read_start_time:
+                return
+        if self.read_end_time is not None:
+            if new_datagram['timestamp'] > self.read_end_time:
+                return
+
+        # Update the end_time property.
+        if self.end_time is not None:
+            # We can't assume data will be read in time order.
+            if self.end_time < new_datagram['timestamp']:
                 self.end_time = new_datagram['timestamp']
+        else:
+            self.end_time = new_datagram['timestamp']
+
+        # Process the datagrams by type.
+
+        # RAW datagrams store raw acoustic data for a channel.
+        if new_datagram['type'].startswith('RAW'):
+
+            # Update the ping counter.  If the datagrams were selected
+            # using an index, the ping numbers are already known.
+            if ping_number is not None:
+                self.n_pings = ping_number
+            elif new_datagram['channel'] == 1:
+                self.n_pings += 1
+
+            # Check if we should store this data based on ping bounds.
+            if self.read_start_ping is not None:
+                if self.n_pings < self.read_start_ping:
+                    return
+            if self.read_end_ping is not None:
+                if self.n_pings > self.read_end_ping:
+                    return
+
+            # Check if we're supposed to store this channel.
+            if new_datagram['channel'] in self._channel_map:
+
+                # Update the chunk counters if this is a new ping.
+                if self.end_ping != self.n_pings:
+                    self._chunk_n_pings += 1
+                    if self._chunk_start_time is None:
+                        self._chunk_start_time = new_datagram['timestamp']
+
+                # Set the first ping number we read.
+                if not self.start_ping:
+                    self.start_ping = self.n_pings
+                # Update the last ping number.
+                self.end_ping = self.n_pings
+
+                # Get the channel id.
+                channel_id = self._channel_map[new_datagram['channel']]
+
+                # Call the appropriate channel's append_ping method.
+                self.raw_data[channel_id].append_ping(new_datagram,
+                        start_sample=self.read_start_sample,
+                        end_sample=self.read_end_sample)
+
+        # NME datagrams store ancillary data as NMEA-0817 style ASCII data.
+        elif new_datagram['type'].startswith('NME'):
+            # Add the datagram to our nmea_data object.
+            self.nmea_data.add_datagram(new_datagram['timestamp'],
+                                        new_datagram['nmea_string'])
+
+        # TAG datagrams contain time-stamped annotations inserted via the
+        # recording software.
+        elif new_datagram['type'].startswith('TAG'):
+            #  TODO: Implement annotation reading
+            print(new_datagram)
+            pass
+
+        # BOT datagrams contain sounder detected bottom depths from ".bot"
+        # files and DEP datagrams contain sounder detected bottom depths from
+        # ".out" files as well as "reflectivity" data.  The datagrams are
+        # buffered and merged with the raw data by _merge_bottom_data.
+        elif (new_datagram['type'].startswith('BOT') or
+                new_datagram['type'].startswith('DEP')):
+            self._bottom_datagrams.append(new_datagram)
+        else:
+            print("Unknown datagram type: " + str(new_datagram['type']))
 
-            # Process the datagrams by type.
 
-            # RAW datagrams store raw acoustic data for a channel.
-            if new_datagram['type'].startswith('RAW'):
+    def _select_indexed_datagrams(self, fid, dgram_index):
+        """Selects the datagrams to read from a file using its index.
 
-                if new_datagram['channel'] == 1:
-                    self.n_pings += 1
+        The datagrams following the current file position are filtered using
+        the time and ping bounds and the channels being read and the numbers
+        of the selected datagrams are returned.  Pings are counted the same way
+        as _read_datagrams counts them so ping numbers are unchanged when
+        reading with an index.
 
-                # Check if we should store this data based on ping bounds.
-                if self.read_start_ping is not None:
-                    if self.n_pings < self.read_start_ping:
-                        continue
-                if self.read_end_ping is not None:
-                    if self.n_pings > self.read_end_ping:
-                        continue
+        Args:
+            fid (MappedRawSimradFile): Pointer to currently open file object.
+                The file must have been opened with dgram_index.
+            dgram_index (array): The datagram index of the file.
+
+        Returns:
+            A tuple containing an array of the selected datagram numbers, an
+            array of the ping numbers of the selected datagrams, and the value
+            of the ping counter after all of the datagrams in the file have
+            been processed.
+        """
 
-                # Check if we're supposed to store this channel.
-                if new_datagram['channel'] in self._channel_map:
+        # Get the index of the datagrams that have not been read.
+        first_dgram = fid.tell()
+        dgram_index = dgram_index[first_dgram:]
+
+        # Datagrams with a timestamp of 0 are skipped by the reader.
+        in_bounds = dgram_index['nt_time'] != 0
+
+        # Apply the time bounds.
+        dgram_times = nt_to_datetime64(dgram_index['nt_time'])
+        if self.read_start_time is not None:
+            in_bounds &= dgram_times >= self.read_start_time
+        if self.read_end_time is not None:
+            in_bounds &= dgram_times <= self.read_end_time
+
+        # The end time is updated with all datagrams within the time bounds,
+        # including those we skip below.
+        if np.any(in_bounds):
+            last_time = dgram_times[in_bounds].max()
+            if self.end_time is None or self.end_time < last_time:
+                self.end_time = last_time
+
+        # Compute the ping number of each RAW datagram.
+        is_raw = np.char.startswith(dgram_index['type'], b'RAW')
+        ping_number = self.n_pings + np.cumsum(in_bounds & is_raw &
+                                               (dgram_index['channel'] == 1))
+
+        # Apply the ping bounds and channel selection to the RAW datagrams.
+        selected = in_bounds.copy()
+        if self.read_start_ping is not None:
+            selected[is_raw & (ping_number < self.read_start_ping)] = False
+        if self.read_end_ping is not None:
+            selected[is_raw & (ping_number > self.read_end_ping)] = False
+        selected[is_raw & ~np.isin(dgram_index['channel'],
+                                   list(self._channel_map.keys()))] = False
+
+        # Get the index of the selected datagrams.
+        selected_idx = np.nonzero(selected)[0]
+
+        # Get the ping counter value after all datagrams have been processed.
+        if ping_number.size > 0:
+            n_pings = int(ping_number[-1])
+        else:
+            n_pings = self.n_pings
 
-                    # Set the first ping number we read.
-                    if not self.start_ping:
-                        self.start_ping = self.n_pings
-                    # Update the last ping number.
-                    self.end_ping = self.n_pings
+        return selected_idx + first_dgram, ping_number[selected_idx], n_pings
 
-                    # Get the channel id.
-                    channel_id = self._channel_map[new_datagram['channel']]
 
-                    # Call the appropriate channel's append_ping method.
-                    self.raw_data[channel_id].append_ping(new_datagram,
-                            start_sample=self.read_start_sample,
-                            end_sample=self.read_end_sample)
+    def _read_indexed_datagrams(self, fid, dgram_index):
+        """Reads the datagrams of a file using the file's datagram index.
 
-                    num_sample_datagrams += 1
-                else:
-                    num_sample_datagrams_skipped += 1
-
-            # NME datagrams store ancillary data as NMEA-0817 style ASCII data.
-            elif new_datagram['type'].startswith('NME'):
-                # Add the datagram to our nmea_data object.
-                self.nmea_data.add_datagram(new_datagram['timestamp'],
-                                            new_datagram['nmea_string'])
-
-            # TAG datagrams contain time-stamped annotations inserted via the
-            # recording software.
-            elif new_datagram['type'].startswith('TAG'):
-                #  TODO: Implement annotation reading
-                print(new_datagram)
-                pass
-
-            # BOT datagrams contain sounder detected bottom depths from ".bot"
-            # files.
-            elif new_datagram['type'].startswith('BOT'):
-                # Iterate through our channels, extract the depth, and update
-                # the channel.
-                for channel_id in self.channel_ids:
-                    idx = self._file_channel_map.index(channel_id)
-                    bottom_depth = new_datagram['depth'][idx]
-                    # Call the appropriate channel's append_bot method.
-                    self.raw_data[channel_id].append_bot(new_datagram[
-                                                             'timestamp'],
-                                                         bottom_depth)
-
-                num_bot_datagrams += 1
-
-            # DEP datagrams contain sounder detected bottom depths from ".out"
-            # files as well as "reflectivity" data.
-            elif new_datagram['type'].startswith('DEP'):
-                # Iterate through our channels, extract the depth, and update
-                # the channel.
-                for channel_id in self.channel_ids:
-                    idx = self._file_channel_map.index(channel_id)
-                    bottom_depth = new_datagram['depth'][idx]
-                    reflectivity = new_datagram['reflectivity'][idx]
-                    # Call the appropriate channel's append_bot method,including
-                    # reflectivity
-                    self.raw_data[channel_id].append_bot(new_datagram[
-                        'timestamp'], bottom_depth, reflectivity=reflectivity)
-
-                num_bot_datagrams += 1
-            else:
-                print("Unknown datagram type: " + str(new_datagram['type']))
+        The datagrams within the time and ping bounds are selected using the
+        index.  The sample datagrams are read in bulk for each channel and
+        the remaining datagrams are read by _read_datagrams.
+
+        Args:
+            fid (MappedRawSimradFile): Pointer to currently open file object.
+            dgram_index (array): The datagram index of the file.
+        """
+
+        # Select the datagrams we're reading.
+        selected_idx, ping_numbers, n_pings = \
+                self._select_indexed_datagrams(fid, dgram_index)
+
+        # Check if we can read the sample datagrams in bulk.  Bulk reading is
+        # not supported when using rolling arrays.
+        rolling = any([self.raw_data[channel_id].rolling_array for
+                       channel_id in self._channel_map.values()])
+        if not rolling:
+            is_raw = np.char.startswith(dgram_index['type'][selected_idx],
+                                        b'RAW')
+            self._read_sample_datagrams(fid, dgram_index[selected_idx[is_raw]],
+                                        ping_numbers[is_raw])
+
+            # Read the rest of the datagrams.
+            fid.select_datagrams(selected_idx[~is_raw])
+            self._read_datagrams(fid, self.read_incremental)
+        else:
+            fid.select_datagrams(selected_idx)
+            self._read_datagrams(fid, self.read_incremental,
+                                 ping_numbers=ping_numbers)
+
+        # The ping counter must include the pings we skipped.
+        self.n_pings = n_pings
+
+
+    def _read_sample_datagrams(self, fid, raw_index, ping_numbers):
+        """Reads sample datagrams in bulk.
+
+        The sample datagrams are read and parsed in blocks for each channel
+        and appended to the channel's RawData object using append_pings.
+
+        Args:
+            fid (MappedRawSimradFile): Pointer to currently open file object.
+            raw_index (array): The datagram index of the RAW datagrams to read.
+            ping_numbers (array): The ping number of each RAW datagram.
+        """
+
+        # Define the number of pings to read at a time.  This limits the
+        # memory used to store the parsed data before it is appended.
+        block_size = 1000
+
+        if raw_index.size == 0:
+            return
+
+        # Set the first ping number we read and update the last ping number.
+        if not self.start_ping:
+            self.start_ping = int(ping_numbers[0])
+        self.end_ping = int(ping_numbers[-1])
+
+        # Read the data for each channel.
+        for channel in np.unique(raw_index['channel']):
+            channel_id = self._channel_map[int(channel)]
+            offsets = raw_index['offset'][raw_index['channel'] == channel]
+
+            for idx in range(0, offsets.size, block_size):
+                sample_datagrams = fid.read_sample_datagrams(
+                        offsets[idx:idx + block_size])
+                self.raw_data[channel_id].append_pings(sample_datagrams,
+                        start_sample=self.read_start_sample,
+                        end_sample=self.read_end_sample)
 
 
     def _convert_time_bound(self, time, format_string):
-        """Converts strings to datetime objects and normalizes to UTC.
+        """Converts time bounds to datetime64[ms] objects in UTC.
 
-        Internally, all times are datetime objects converted to UTC timezone.
-        This method converts arguments to comply with this practice.
+        Internally, datagram times are datetime64[ms] objects in the UTC
+        timezone. This method converts arguments to comply with this practice
+        so they can be compared to the datagram times.
 
         Args:
-            time (str or datetime): Either a string representing a date and
-                time in format specified in format_string, or a datetime object.
+            time (str, datetime, or datetime64): Either a string representing
+                a date and time in format specified in format_string, a
+                datetime object, or a datetime64 object.  Strings and naive
+                datetime objects are assumed to be UTC.
             format_string (str): Format of time string specified in datetime
             object notations such as '%Y-%m-%d %H:%M:%S' to parse a time
             string of '2017-02-28 23:34:01'
 
         Returns:
-            Datetime object normalized to UTC time.
+            Datetime64[ms] object in UTC time.
         """
-        # If given a datetime64[ms] object, there's nothing to convert.
-        if time.dtype == '<M8[ms]':
-            return
+        # If given a datetime64 object, we only need to ensure the units.
+        if isinstance(time, np.datetime64):
+            return time.astype('datetime64[ms]')
 
         utc = timezone('utc')
 
@@ -573,9 +1561,11 @@ class EK60(object):
         if isinstance(time, str):
             time = datetime.datetime.strptime(time, format_string)
 
-        # Convert datetime object to UTC.
+        # Convert datetime object to UTC and then to datetime64.
         if isinstance(time, datetime.datetime):
-            time = utc.localize(time)
+            if time.tzinfo is not None:
+                time = time.astimezone(utc).replace(tzinfo=None)
+            time = np.datetime64(time, '[ms]')
 
         return time
 
@@ -684,16 +1674,31 @@ class RawData(PingData):
     RESAMPLE_2048 = 0.002048
     RESAMPLE_LONGEST = 1
 
+    # Define the number of pings converted at a time when converting power to
+    # Sv/sv/Sp/sp.  This limits the size of the temporary arrays created
+    # during the conversion.
+    CONVERT_BLOCK_PINGS = 1000
+
     # Create a constant to convert indexed power to power.
     INDEX2POWER = (10.0 * np.log10(2.0) / 256.0)
 
     # Create a constant to convert from indexed angles to electrical angles.
     INDEX2ELEC = 180.0 / 128.0
 
+    # The number of bytes of sample data copied at a time when the data
+    # stored in memory mapped files are copied to a new file.
+    SCRATCH_BLOCK_BYTES = 64 * 1024 * 1024
+
+    # The metadata_index value of pings that don't have a ChannelMetadata
+    # object.  It is the fill value of the uint16 index so the metadata table
+    # can hold up to 65535 objects.
+    NO_METADATA = np.iinfo(np.uint16).max
+
 
     def __init__(self, channel_id, n_pings=100, n_samples=1000,
                  rolling=False, chunk_width=500, store_power=True,
-                 store_angles=True, max_sample_number=None):
+                 store_angles=True, max_sample_number=None, compact=False,
+                 ragged=False, scratch_dir=None):
         """Creates a new, empty RawData object.
 
         The RawData class stores raw echosounder data from a single channel
@@ -704,14 +1709,53 @@ class RawData(PingData):
 
         If rolling is True, arrays of size (n_pings, n_samples) are created
         for power and angle data upon instantiation and are filled with NaNs.
-        These arrays are fixed in size and if a ping is added beyond the
-        "width" of the array the array is "rolled left", and the new ping is
-        added at the end of the array. This feature is to support future
-        development of streaming data sources such as telegram broadcasts and
-        the client/server interface.
-
-        chunk_width specifies the number of columns to add to data arrays when
-        they fill up when rolling == False.
+        These arrays are fixed in size and are used as a ring buffer. Once
+        the arrays are full, each ping that is added replaces the oldest ping
+        without moving the data in the arrays. The methods that return data
+        (get_power, get_Sv, etc.) return the pings in time order and
+        get_ordered returns a data attribute in the order the pings were
+        added. This feature supports streaming data sources such as telegram
+        broadcasts and the client/server interface.
+
+        When rolling == False, the data arrays are allocated with room for
+        chunk_width pings and when they fill up, they are grown by a factor of
+        2 (or by chunk_width pings if that is greater) so the cost of copying
+        the data is amortized over the pings that are added. n_pings is the
+        number of pings in the object and the arrays are trimmed to n_pings
+        when reading is complete.
+
+        If compact is True, power and angle data are stored in the indexed
+        form they are recorded in: power as int16 values and the alongship
+        and athwartship angles as int8 values. This uses a third of the memory
+        of the default float32 storage. The data are converted to power dB
+        and electrical angles by get_power, get_electrical_angles, etc. only
+        for the pings that are returned. Empty samples are stored as the
+        minimum value of the type (see PingData._get_fill_value). Since -128
+        is a valid angle index, angle samples are only treated as empty when
+        the power sample is empty too (or power is not stored).
+
+        If ragged is True, the power and angle samples of each ping are
+        stored back to back in flat sample buffers instead of rectangular
+        (n_pings, n_samples) arrays, and the buffer_offset and buffer_count
+        attributes store the index of the first sample of each ping in the
+        buffers and the number of samples stored. Pings are not padded to the
+        longest ping and the stored samples aren't copied when the number of
+        samples increases. The samples of the pings that are returned by
+        get_power, get_Sv, etc. are copied into a rectangular array when they
+        are retrieved. The samples of deleted or replaced pings remain in the
+        buffers until the object is trimmed. Ragged storage can not be used
+        with rolling arrays.
+
+        If scratch_dir is set, the power and angle arrays are numpy memmap
+        arrays backed by temporary files in that directory, so the data
+        don't have to fit in memory. The pings are stored in order in the
+        files and only the pages of the files that hold the pings that are
+        added or returned are read or written. The files are extended in
+        place when pings are added and are deleted when the arrays are
+        garbage collected. The files are rewritten when the number of
+        samples changes. Memory mapped storage can not be used with ragged
+        storage and the data are loaded into memory when the object is
+        pickled.
 
         Args:
             channel_id (str): The channel ID of channel whose data are stored
@@ -724,8 +1768,9 @@ class RawData(PingData):
             rolling (bool): True = arrays have fixed sizes set when class is
                 instantiated If additional pings are read array is rolled
                 left, dropping oldest ping and adding newest.
-            chunk_width (int): Sets the number of pings (columns) to expand
-                arrays when needed to hold additional pings. This is used when
+            chunk_width (int): Sets the initial number of pings (columns) of
+                the arrays and the minimum number of pings to expand arrays
+                when needed to hold additional pings. This is used when
                 rolling=False.
             store_power (bool): Boolean to control whether power data are
                 stored in this RawData object.
@@ -733,9 +1778,26 @@ class RawData(PingData):
                 stored in this RawData object.
             max_sample_number (int): Integer specifying the maximum number of
                 samples that will be stored in this instance's data arrays.
+            compact (bool): Set to True to store the power and angle data in
+                their indexed form.
+            ragged (bool): Set to True to store the power and angle data in
+                flat sample buffers.
+            scratch_dir (str): Set to the path of a directory to store the
+                power and angle data in memory mapped temporary files.
+
+        Raises:
+            ValueError: Ragged storage was requested with rolling arrays or
+                memory mapped storage.
         """
         super(RawData, self).__init__()
 
+        if ragged and rolling:
+            raise ValueError('Ragged sample storage can not be used with ' +
+                             'rolling arrays.')
+        if ragged and scratch_dir:
+            raise ValueError('Ragged sample storage can not be used with ' +
+                             'memory mapped (scratch_dir) storage.')
+
         # Specify if data array size is fixed and the array data is rolled left
         # if the array fills up (True) or if the arrays are expanded when
         # necessary to hold additional data (False).
@@ -748,6 +1810,12 @@ class RawData(PingData):
         # appending pings from the new file.
         self.current_metadata = None
 
+        # Metadata_table is the list of the unique ChannelMetadata objects of
+        # the pings in this object.  The metadata_index data attribute
+        # stores the index into the table of each ping's object.  Pings that
+        # don't have a ChannelMetadata object have the index NO_METADATA.
+        self.metadata_table = []
+
         # The channel ID is the unique identifier of the channel(s) stored in
         # the object.
         if isinstance(channel_id, list):
@@ -762,6 +1830,21 @@ class RawData(PingData):
         self.store_power = store_power
         self.store_angles = store_angles
 
+        # Keep note if we store the power and angle data in indexed form.
+        self.compact = bool(compact)
+
+        # Keep note if we store the power and angle data in flat, ragged
+        # sample buffers.
+        self.ragged = bool(ragged)
+
+        # Scratch_dir is the directory of the temporary files that back the
+        # power and angle arrays.  _scratch_files stores the open temporary
+        # file of each attribute and _scratch_maps the memmap array that maps
+        # the whole file.
+        self.scratch_dir = scratch_dir
+        self._scratch_files = {}
+        self._scratch_maps = {}
+
         # Max_sample_number can be set to an integer specifying the maximum
         # number of samples that will be stored in the sample data arrays.
         self.max_sample_number = max_sample_number
@@ -772,7 +1855,7 @@ class RawData(PingData):
         # data.  Here we *extend* the list that is defined in the parent
         # class.  We don't add the bottom data attributes here.  Those are only
         # added if .bot or .out files are read.
-        self._data_attributes += ['channel_metadata',
+        self._data_attributes += ['metadata_index',
                                   'transducer_depth',
                                   'frequency',
                                   'transmit_power',
@@ -788,10 +1871,50 @@ class RawData(PingData):
                                   'heading',
                                   'transmit_mode',
                                   'sample_offset',
-                                  'sample_count',
-                                  'power',
-                                  'angles_alongship_e',
-                                  'angles_athwartship_e']
+                                  'sample_count']
+
+        # When storing ragged data, the power and angle data are stored in
+        # the _sample_buffers dict, keyed by attribute name, and the first
+        # _buffer_size elements of the buffers are used. The per ping offset
+        # and count of the samples in the buffers are data attributes so they
+        # are manipulated with the other ping data. Otherwise, the power and
+        # angle data are 2d data attributes.
+        self._sample_buffers = {}
+        self._buffer_size = 0
+        if self.ragged:
+            self._data_attributes += ['buffer_offset',
+                                      'buffer_count']
+        else:
+            self._data_attributes += ['power',
+                                      'angles_alongship_e',
+                                      'angles_athwartship_e']
+
+        # When using rolling arrays, the data arrays are a ring buffer and
+        # _ring_head is the index of the oldest ping in the arrays.
+        self._ring_head = 0
+
+        # When pings are inserted the data arrays are grown geometrically.
+        # _capacity_arrays stores the grown arrays, keyed by attribute name,
+        # and the data attributes are set to views of the used pings so the
+        # spare capacity isn't visible.
+        self._capacity_arrays = {}
+
+        # Set cache_max_bytes to the number of bytes of memory to use to cache
+        # the ProcessedData objects returned by get_power, get_Sv and get_Sp.
+        # Products are cached by their arguments and calibration parameter
+        # values, and the least recently used products are discarded when
+        # the cache exceeds this size.  The cache is cleared whenever pings
+        # are added, removed or replaced.  The default of 0 disables caching.
+        self.cache_max_bytes = 0
+
+        # The product cache and the number of bytes of data it contains.
+        self._product_cache = OrderedDict()
+        self._product_cache_bytes = 0
+
+        # The ping time lookup stores the sorted ping times and the index of
+        # each sorted ping.  It is used to match bottom detections to pings
+        # and is created when needed and discarded with the product cache.
+        self._ping_time_lookup = None
 
         # If we're using a fixed data array size, we can allocate the arrays
         # now, and since we assume rolling arrays will be used in a visual or
@@ -828,9 +1951,18 @@ class RawData(PingData):
                              rolling=self.rolling_array, chunk_width=n_pings,
                              store_power=self.store_power,
                              store_angles=self.store_angles,
-                             max_sample_number=self.max_sample_number)
+                             max_sample_number=self.max_sample_number,
+                             compact=self.compact, ragged=self.ragged,
+                             scratch_dir=self.scratch_dir)
+
+        empty_obj = self._like(empty_obj, n_pings, np.nan, empty_times=True)
+
+        # The empty pings don't have ChannelMetadata objects but the new
+        # object shares our current one.
+        empty_obj.metadata_index.fill(self.NO_METADATA)
+        empty_obj.current_metadata = self.current_metadata
 
-        return self._like(empty_obj, n_pings, np.nan, empty_times=True)
+        return empty_obj
 
 
     def insert(self, obj_to_insert, ping_number=None, ping_time=None,
@@ -862,6 +1994,16 @@ class RawData(PingData):
         if not isinstance(obj_to_insert, RawData):
             raise TypeError('The object you are inserting must be an instance '
                             + 'of EK60.RawData')
+        self._check_sample_storage(obj_to_insert)
+
+        # Our data are changing so the cached products are no longer valid.
+        self.clear_cache()
+
+        # Add the ChannelMetadata objects to our table and check if we need
+        # to copy the ragged samples into our buffers.
+        obj_to_insert = self._add_metadata(obj_to_insert)
+        if self.ragged:
+            obj_to_insert = self._add_ragged_samples(obj_to_insert)
 
         # We are now coexisting in harmony - call parent's insert.
         super(RawData, self).insert(obj_to_insert, ping_number=ping_number,
@@ -870,25 +2012,315 @@ class RawData(PingData):
                                      index_array=index_array)
 
 
-    def append_bot(self, detection_time, detection_depth, reflectivity=None):
-        """Inserts a bottom detection depth into the detected_bottom array
-        for a specified ping time.
+    def replace(self, obj_to_insert, ping_number=None, ping_time=None,
+                index_array=None, _ignore_vertical_axes=False):
+        """Replaces the data in this object with the data provided in the
+        object to "insert".
 
-        If the time is not matched, the data is ignored.  When reading .out
-        files you can pass the reflectivity value.  To keep things simple,
-        you must add the corresponding "ping" data before
-        adding the detected bottom depth. If you try to add a bottom value for
-        a ping that has yet to be added, the matching ping_time will not exist
-        and the bottom value will be ignored.
+        This method clears the product cache and calls PingData.replace.
+        See PingData.replace for a description of the arguments.
+        """
 
-        Args:
-            detection_time (datetime): The time the bottom detection depth
-                was recorded and which needs to match ping time in order to
-                add it to the detected_bottom array.
+        self._check_sample_storage(obj_to_insert)
+
+        self.clear_cache()
+        obj_to_insert = self._add_metadata(obj_to_insert)
+        if self.ragged:
+            obj_to_insert = self._add_ragged_samples(obj_to_insert)
+        super(RawData, self).replace(obj_to_insert, ping_number=ping_number,
+                ping_time=ping_time, index_array=index_array,
+                _ignore_vertical_axes=_ignore_vertical_axes)
+
+
+    def delete(self, start_ping=None, end_ping=None, start_time=None,
+               end_time=None, remove=True, index_array=None):
+        """Deletes data from the object.
+
+        This method clears the product cache and calls PingData.delete.
+        See PingData.delete for a description of the arguments.
+        """
+
+        self.clear_cache()
+
+        # When the pings are only emptied, PingData.delete sets the unsigned
+        # metadata_index to 0 which would point the pings to the first
+        # ChannelMetadata object.  Get the indices of the pings now (the ping
+        # times are emptied by delete) so we can set them to NO_METADATA.
+        if not remove:
+            if index_array is None:
+                del_idx = self.get_indices(start_time=start_time,
+                        end_time=end_time, start_ping=start_ping,
+                        end_ping=end_ping)
+            else:
+                del_idx = index_array
+
+        super(RawData, self).delete(start_ping=start_ping, end_ping=end_ping,
+                start_time=start_time, end_time=end_time, remove=remove,
+                index_array=index_array)
+
+        if not remove:
+            self.metadata_index[del_idx] = self.NO_METADATA
+
+
+    def resize(self, new_ping_dim, new_sample_dim):
+        """Resizes the data arrays.
+
+        This method clears the product cache and calls PingData.resize.
+        See PingData.resize for a description of the arguments.
+        """
+
+        self.clear_cache()
+
+        # The ragged sample buffers don't have a sample axis so we only
+        # resize the ping axis and clip the sample counts if the number of
+        # samples is decreasing.
+        if self.ragged:
+            super(RawData, self).resize(new_ping_dim, self.n_samples)
+            if new_sample_dim < self.n_samples:
+                np.minimum(self.buffer_count, new_sample_dim,
+                           out=self.buffer_count)
+            self.n_samples = int(new_sample_dim)
+        else:
+            super(RawData, self).resize(new_ping_dim, new_sample_dim)
+
+
+    def _resize_capacity(self, n_pings, n_samples):
+        """Resizes the data arrays so they can hold the specified number of
+        pings and samples.
+
+        The ping dimension of the arrays is grown using grow_capacity so
+        inserting pings doesn't copy the data every time. The grown arrays
+        are kept in _capacity_arrays, with the unused pings set to empty
+        values, and the data attributes are set to views of the first n_pings
+        pings of these arrays.
+
+        Args:
+            n_pings (int): The number of pings the arrays must hold.
+            n_samples (int): The number of samples of the arrays.
+        """
+
+        # Grow the arrays if we don't have enough spare capacity.
+        capacity_arrays = self._get_capacity_arrays()
+        if (capacity_arrays is None or n_samples != self.n_samples or
+                capacity_arrays['ping_time'].shape[0] < n_pings):
+            n_used = self.ping_time.shape[0]
+            ping_dims = grow_capacity(n_used, n_pings, self.chunk_width)
+            self.resize(ping_dims, n_samples)
+
+            capacity_arrays = {}
+            for attr_name in self._data_attributes:
+                data = getattr(self, attr_name, None)
+                if data is not None and data.shape[0] == ping_dims:
+                    self._set_empty_pings(attr_name, data, n_used)
+                    capacity_arrays[attr_name] = data
+            self._capacity_arrays = capacity_arrays
+
+        # Set the data attributes to views of the pings we're using.
+        for attr_name, data in capacity_arrays.items():
+            setattr(self, attr_name, data[0:n_pings])
+
+
+    def _get_capacity_arrays(self):
+        """Returns the arrays that the data attributes are views of.
+
+        Returns:
+            The _capacity_arrays dict or None if the data attributes aren't
+            views of the first pings of the arrays in the dict, which is the
+            case when the data arrays have been replaced since the arrays were
+            grown.
+        """
+
+        def get_owner(data):
+            # Return the array that owns the memory of an array. Memory
+            # mapped arrays are their own owners.
+            if isinstance(data.base, np.ndarray):
+                return data.base
+            return data
+
+        capacity_arrays = getattr(self, '_capacity_arrays', None)
+        if not capacity_arrays or 'ping_time' not in capacity_arrays:
+            return None
+        for attr_name in self._data_attributes:
+            data = getattr(self, attr_name, None)
+            if data is None or data.shape[0] != self.ping_time.shape[0]:
+                continue
+            base = capacity_arrays.get(attr_name)
+            if (base is None or get_owner(data) is not get_owner(base) or
+                    data.shape[1:] != base.shape[1:] or
+                    data.strides != base.strides or
+                    data.ctypes.data != base.ctypes.data):
+                return None
+
+        return capacity_arrays
+
+
+    def _set_empty_pings(self, attr_name, data, start_ping):
+        """Sets the pings of a data attribute from start_ping on to empty
+        values.
+
+        Sample data are set to the fill value, times to NaT and the
+        metadata index to NO_METADATA.  Other integer attributes are set to
+        the values used for deleted pings.
+
+        Args:
+            attr_name (str): The name of the data attribute.
+            data (array): The data attribute's array.
+            start_ping (int): The index of the first ping to set.
+        """
+
+        if attr_name == 'metadata_index':
+            data[start_ping:] = self.NO_METADATA
+        elif data.dtype.kind == 'M':
+            data[start_ping:] = np.datetime64('NaT')
+        elif data.ndim == 2 or data.dtype.kind == 'f':
+            data[start_ping:] = self._get_fill_value(data.dtype)
+        elif data.dtype.kind == 'u':
+            data[start_ping:] = 0
+        elif data.dtype.kind == 'i':
+            data[start_ping:] = -1
+        else:
+            data[start_ping:] = None
+
+
+    def trim(self, n_pings=None, n_samples=None):
+        """Trims pings from the object to a given length.
+
+        This method calls PingData.trim and, when storing ragged data,
+        compacts the sample buffers, freeing the samples of deleted pings and
+        the unused space at the end of the buffers.
+        See PingData.trim for a description of the arguments.
+        """
+
+        super(RawData, self).trim(n_pings=n_pings, n_samples=n_samples)
+
+        # Copy the samples of our pings to new buffers that are just big
+        # enough to hold them.
+        if self.ragged:
+            ping_index = np.arange(min(self.n_pings, self.ping_time.shape[0]))
+            buffer_index = self._get_buffer_index(ping_index)
+            for name, buffer in self._sample_buffers.items():
+                self._sample_buffers[name] = buffer[buffer_index]
+            counts = self.buffer_count[ping_index].astype(np.int64)
+            self.buffer_offset[ping_index] = np.cumsum(counts) - counts
+            self._buffer_size = buffer_index.shape[0]
+
+
+    def _compact_arrays(self):
+        """Copies data attributes that are views of much larger arrays.
+
+        This method calls PingData._compact_arrays and discards the arrays
+        that were grown by insert so their unused capacity can be freed.
+        """
+
+        super(RawData, self)._compact_arrays()
+        self._capacity_arrays = {}
+
+
+    def roll(self, roll_pings):
+        """Rolls the data arrays along the ping axis.
+
+        This method clears the product cache and calls PingData.roll.
+        See PingData.roll for a description of the arguments.
+        """
+
+        self.clear_cache()
+        super(RawData, self).roll(roll_pings)
+
+
+    def clear_cache(self):
+        """Removes all of the products from the product cache.
+
+        The ping time lookup is also discarded since the cache is cleared
+        whenever pings are added, removed or replaced.
+        """
+
+        self._product_cache.clear()
+        self._product_cache_bytes = 0
+        self._ping_time_lookup = None
+
+
+    def get_ordered(self, attribute_name):
+        """Returns a data attribute with the pings in the order they were
+        added.
+
+        When using rolling arrays the pings are stored in a ring buffer and
+        the oldest ping is not necessarily the first ping in the data
+        arrays. A view of the data is returned if the pings are stored in
+        order, otherwise a copy is returned.
+
+        Args:
+            attribute_name (str): The name of the data attribute.
+
+        Returns:
+            A numpy array containing the data of the pings in the object.
+        """
+
+        data = getattr(self, attribute_name)
+        if self._ring_head == 0:
+            return data[0:self.n_pings]
+        else:
+            return data[self._get_ping_order()]
+
+
+    def _get_ping_order(self):
+        """Returns the index into the data arrays of each ping in the order
+        the pings were added.
+
+        Returns:
+            A numpy array containing the indices of the pings.
+        """
+
+        if self.rolling_array:
+            return (np.arange(self.n_pings) + self._ring_head) % \
+                    self.ping_time.shape[0]
+        else:
+            return np.arange(self.n_pings)
+
+
+    def append_bot(self, detection_time, detection_depth, reflectivity=None):
+        """Inserts a bottom detection depth into the detected_bottom array
+        for a specified ping time.
+
+        If the time is not matched, the data is ignored.  When reading .out
+        files you can pass the reflectivity value.  To keep things simple,
+        you must add the corresponding "ping" data before
+        adding the detected bottom depth. If you try to add a bottom value for
+        a ping that has yet to be added, the matching ping_time will not exist
+        and the bottom value will be ignored.
+
+        Args:
+            detection_time (datetime): The time the bottom detection depth
+                was recorded and which needs to match ping time in order to
+                add it to the detected_bottom array.
             detection_depth (float): The depth value that is being inserted.
             reflectivity (float): The reflectivity value that is being inserted
                 (optional).
         """
+
+        if reflectivity is not None:
+            reflectivity = [reflectivity]
+        self.append_bots([detection_time], [detection_depth],
+                         reflectivity=reflectivity)
+
+
+    def append_bots(self, detection_times, detection_depths,
+                    reflectivity=None):
+        """Inserts bottom detection depths into the detected_bottom array
+        for the specified ping times.
+
+        This is the vectorized form of append_bot.  The detection times are
+        matched to the ping times using the ping time lookup and detections
+        that don't match a ping are ignored.  If more than one detection
+        matches a ping, the last detection is stored.
+
+        Args:
+            detection_times (array): A numpy array of the times of the bottom
+                detections.
+            detection_depths (array): A numpy array of the depths that are
+                being inserted.
+            reflectivity (array): A numpy array of the reflectivity values
+                that are being inserted (optional).
+        """
         # Check if the detected_bottom attribute exists and create it if it
         # does not.
         if not hasattr(self, 'detected_bottom'):
@@ -902,13 +2334,63 @@ class RawData(PingData):
                 data = np.full(self.ping_time.shape[0], np.nan)
                 self.add_attribute('bottom_reflectivity', data)
 
-        # Determine the array element associated with this ping and update it
-        # with the detection depth and optional reflectivity.
-        idx_array = self.ping_time == detection_time
-        if np.any(idx_array):
-            self.detected_bottom[idx_array] = detection_depth
-            if reflectivity is not None:
-                self.bottom_reflectivity[idx_array] = reflectivity
+        # Determine the array elements associated with the detections and
+        # update them with the detection depths and optional reflectivity.
+        ping_index, detection_index = self._match_ping_times(detection_times)
+        self.detected_bottom[ping_index] = \
+                np.asarray(detection_depths)[detection_index]
+        if reflectivity is not None:
+            self.bottom_reflectivity[ping_index] = \
+                    np.asarray(reflectivity)[detection_index]
+
+
+    def _get_ping_time_lookup(self):
+        """Returns the sorted ping times and the index of each sorted ping.
+
+        The lookup is created the first time it is needed after the pings
+        change and is discarded by clear_cache.
+
+        Returns:
+            A tuple containing a numpy array of the sorted ping times and an
+            array containing the index into the data arrays of each of the
+            sorted pings.
+        """
+
+        if getattr(self, '_ping_time_lookup', None) is None:
+            ping_index = self._get_ping_order()
+            ping_time = self.ping_time[ping_index]
+            order = np.argsort(ping_time, kind='mergesort')
+            self._ping_time_lookup = (ping_time[order], ping_index[order])
+
+        return self._ping_time_lookup
+
+
+    def _match_ping_times(self, times):
+        """Finds the pings that match a set of times.
+
+        Args:
+            times (array): A numpy array of datetime64 times.
+
+        Returns:
+            A tuple containing an array of the index into the data arrays of
+            each matching ping and an array of the index into times of the
+            time each ping matches.  The matches are ordered by the index
+            into times.
+        """
+
+        times = np.asarray(times, dtype='datetime64[ms]')
+        sorted_times, sorted_index = self._get_ping_time_lookup()
+
+        # Find the range of the sorted pings that match each time.  More than
+        # one ping can have the same time.
+        first = np.searchsorted(sorted_times, times, side='left')
+        counts = np.searchsorted(sorted_times, times, side='right') - first
+        n_matches = int(counts.sum())
+        time_index = np.repeat(np.arange(times.shape[0]), counts)
+        match_index = np.repeat(first - np.cumsum(counts) + counts, counts) + \
+                np.arange(n_matches)
+
+        return sorted_index[match_index], time_index
 
 
     def append_ping(self, sample_datagram, start_sample=None, end_sample=None):
@@ -951,13 +2433,20 @@ class RawData(PingData):
             end_sample (int):
         """
 
-        # Determine the number of samples in this ping.
-        if sample_datagram['angle'] is not None:
-            angle_samps = sample_datagram['angle'].shape[0]
+        # Our data are changing so the cached products are no longer valid.
+        self.clear_cache()
+
+        # Determine the number of samples in this ping. The parser may have
+        # decoded only some of the samples so we use the datagram's count.
+        # The power and angle sample arrays start at sample_offset.
+        count = int(sample_datagram['count'])
+        data_offset = sample_datagram.get('sample_offset', 0)
+        if int(sample_datagram['mode']) & 0x2 or count == 0:
+            angle_samps = count
         else:
             angle_samps = -1
-        if sample_datagram['power'] is not None:
-            power_samps = sample_datagram['power'].shape[0]
+        if int(sample_datagram['mode']) & 0x1 or count == 0:
+            power_samps = count
         else:
             power_samps = -1
 
@@ -979,21 +2468,15 @@ class RawData(PingData):
         # number of samples in this datagram. In theory the power and angle
         # arrays should always be the same size, but we'll check all to make
         # sure.
-        max_data_samples = max(self.power.shape[1],
-                               self.angles_alongship_e.shape[1],
-                               self.angles_athwartship_e.shape[1])
+        max_data_samples = self._get_max_data_samples()
         max_new_samples = max([power_samps, angle_samps])
 
         # Check if we need to truncate the sample data.
+        data_samples = count
         if self.max_sample_number and (max_new_samples >
                                              self.max_sample_number):
             max_new_samples = self.max_sample_number
-            if angle_samps > 0:
-                sample_datagram['angle'] = sample_datagram['angle'][
-                                           0:self.max_sample_number]
-            if power_samps > 0:
-                sample_datagram['power'] = sample_datagram['power'][
-                                           0:self.max_sample_number]
+            data_samples = min(count, self.max_sample_number)
 
         # Create 2 variables to store our current array size.
         ping_dims = self.ping_time.size
@@ -1010,7 +2493,8 @@ class RawData(PingData):
                 # Need to resize the ping dimension.
                 ping_resize = True
                 # Calculate the new ping dimension.
-                ping_dims = ping_dims + self.chunk_width
+                ping_dims = grow_capacity(ping_dims, self.n_pings + 1,
+                                          self.chunk_width)
 
             # Check the samples dimension.
             if max_new_samples > max_data_samples:
@@ -1029,18 +2513,23 @@ class RawData(PingData):
             self.n_pings += 1
 
         else:
-            # Check if we need to roll.
-            if self.n_pings == ping_dims - 1:
+            # The rolling arrays are a ring buffer.  Check if the buffer is
+            # full.
+            if self.n_pings < ping_dims:
+                # It isn't full - add the ping after the newest ping and
+                # increment our ping counter.
+                this_ping = (self._ring_head + self.n_pings) % ping_dims
+                self.n_pings += 1
+            else:
                 # When a rolling array is "filled" we stop incrementing the
-                # ping counter and repeatedly append pings to the last ping
-                # index in the array.
-                this_ping = self.n_pings
+                # ping counter.  The oldest ping is overwritten and the head
+                # of the buffer moves to the next oldest ping.
+                this_ping = self._ring_head
+                self._ring_head = (self._ring_head + 1) % ping_dims
 
-                # Roll our array 1 ping.
-                self._roll_arrays(1)
-
-        # Insert the channel_metadata object reference for this ping.
-        self.channel_metadata[this_ping] = self.current_metadata
+        # Insert the index of the channel_metadata object of this ping.
+        self.metadata_index[this_ping] = self._get_metadata_index(
+                self.current_metadata)
 
         # Update the channel_metadata object with this ping number and time.
         self.current_metadata.end_ping = self.n_pings
@@ -1081,73 +2570,277 @@ class RawData(PingData):
                 self.sample_count[this_ping] = sample_datagram['count']
                 end_sample = sample_datagram['count']
 
+        # Determine the number of samples we store and the index of the first
+        # sample in the datagram's sample arrays.
+        n_stored = min(data_samples, int(self.sample_count[this_ping])) - \
+                start_sample
+        n_stored = max(min(n_stored, sample_dims), 0)
+        first = start_sample - data_offset
+        last = first + n_stored
+
+        # Get the arrays we store this ping's samples in.  Ragged samples
+        # are added to the end of the sample buffers.
+        if self.ragged:
+            samples = self._add_ragged_pings(np.array([this_ping]),
+                                             np.array([n_stored]))
+        else:
+            samples = {}
+            for name in self._get_sample_attributes():
+                samples[name] = getattr(self, name)[this_ping,:]
+
         # Now store the 2d "sample" data.  Determine what we need to store
         # based on operational mode.
-        # 1 = Power only, 2 = Angle only 3 = Power & Angle
+        # 1 = Power only, 2 = Angle only 3 = Power & Angle.  The samples are
+        # converted in place in the data arrays (or copied if we're storing
+        # compact data) and samples beyond the samples we store are set to
+        # NaN (or the fill value of the compact arrays).
 
         # Check if we need to store power data.
         if sample_datagram['mode'] != 2 and self.store_power:
 
-            # Get the subset of samples we're storing.
-            power = sample_datagram['power'][start_sample:self.sample_count[
-                this_ping]]
-
             # Convert the indexed power data to power dB.
-            power = power.astype(self.sample_dtype) * self.INDEX2POWER
-
-            # Check if we need to pad or trim our sample data.
-            sample_pad = sample_dims - power.shape[0]
-            if sample_pad > 0:
-                # The data array has more samples than this datagram - we
-                # need to pad the datagram.
-                self.power[this_ping,:] = np.pad(power,(0,sample_pad),
-                        'constant', constant_values=np.nan)
-            elif sample_pad < 0:
-                # The data array has fewer samples than this datagram - we
-                # need to trim the datagram.
-                self.power[this_ping,:] = power[0:sample_pad]
+            power = samples['power']
+            if self.compact:
+                power[0:n_stored] = sample_datagram['power'][first:last]
             else:
-                # The array has the same number of samples.
-                self.power[this_ping,:] = power
+                np.multiply(sample_datagram['power'][first:last],
+                            self.INDEX2POWER, out=power[0:n_stored],
+                            dtype=self.sample_dtype)
+            power[n_stored:] = self._get_fill_value(power.dtype)
 
         # Check if we need to store angle data.
         if sample_datagram['mode'] != 1 and self.store_angles:
             # First extract the alongship and athwartship angle data.  The low
             # 8 bits are the athwartship values and the upper 8 bits are
             # alongship.
-            alongship_e = (sample_datagram['angle'][
-                           start_sample:self.sample_count[this_ping]] >>
-                           8).astype('int8')
-            athwartship_e = (sample_datagram['angle'][
-                             start_sample:self.sample_count[this_ping]] &
-                             0xFF).astype('int8')
-
-            # Convert from indexed to electrical angles.
-            alongship_e = alongship_e.astype(self.sample_dtype) * \
-                          self.INDEX2ELEC
-            athwartship_e = athwartship_e.astype(self.sample_dtype) * \
-                            self.INDEX2ELEC
-
-            # Check if we need to pad or trim our sample data.
-            sample_pad = sample_dims - athwartship_e.shape[0]
-            if sample_pad > 0:
-                # The data array has more samples than this datagram - we
-                # need to pad the datagram
-                self.angles_alongship_e[this_ping,:] = np.pad(alongship_e,(0,
-                        sample_pad), 'constant', constant_values=np.nan)
-                self.angles_athwartship_e[this_ping,:] = np.pad(
-                    athwartship_e,(0,sample_pad),
-                        'constant', constant_values=np.nan)
-            elif sample_pad < 0:
-                # The data array has fewer samples than this datagram - we
-                # need to trim the datagram.
-                self.angles_alongship_e[this_ping,:] = alongship_e[0:sample_pad]
-                self.angles_athwartship_e[this_ping,:] = athwartship_e[
-                                                         0:sample_pad]
+            angles = sample_datagram['angle'][first:last]
+            alongship_e = samples['angles_alongship_e']
+            athwartship_e = samples['angles_athwartship_e']
+            if self.compact:
+                alongship_e[0:n_stored] = (angles >> 8).astype('int8')
+                athwartship_e[0:n_stored] = (angles & 0xFF).astype('int8')
             else:
-                # The array has the same number of samples.
-                self.angles_alongship_e[this_ping,:] = alongship_e
-                self.angles_athwartship_e[this_ping,:] = athwartship_e
+                # Convert from indexed to electrical angles.
+                np.multiply((angles >> 8).astype('int8'), self.INDEX2ELEC,
+                            out=alongship_e[0:n_stored],
+                            dtype=self.sample_dtype)
+                np.multiply((angles & 0xFF).astype('int8'), self.INDEX2ELEC,
+                            out=athwartship_e[0:n_stored],
+                            dtype=self.sample_dtype)
+            angle_fill = self._get_fill_value(alongship_e.dtype)
+            alongship_e[n_stored:] = angle_fill
+            athwartship_e[n_stored:] = angle_fill
+
+
+    def append_pings(self, sample_datagrams, start_sample=None,
+                     end_sample=None):
+        """Adds many pings worth of data to the object.
+
+        This is the bulk version of append_ping. It accepts the dict of arrays
+        returned by SimradRawParser.from_buffer, resizes the data arrays once
+        to hold all of the new pings, and writes the data into the arrays.
+        The data are stored exactly as if append_ping had been called for
+        each ping.
+
+        append_pings can not be used with rolling arrays.
+
+        Args:
+            sample_datagrams (dict): A dict of arrays containing the parsed
+                values from the sample datagrams.
+            start_sample (int):
+            end_sample (int):
+        """
+
+        if self.rolling_array:
+            raise ValueError('append_pings can not be used with rolling ' +
+                             'arrays. Use append_ping instead.')
+
+        # Our data are changing so the cached products are no longer valid.
+        self.clear_cache()
+
+        n_new_pings = sample_datagrams['count'].shape[0]
+        if n_new_pings == 0:
+            return
+
+        # Determine the number of power and angle samples in each ping. If a
+        # ping doesn't contain power or angle data, the count is -1.
+        count = sample_datagrams['count'].astype('int64')
+        mode = sample_datagrams['mode'].astype('int32')
+        power_samps = np.where((mode & 0x1) | (count == 0), count, -1)
+        angle_samps = np.where((mode & 0x2) | (count == 0), count, -1)
+        new_samples = np.maximum(power_samps, angle_samps)
+
+        # If using dynamic arrays, initialize data arrays when the first ping
+        # is added.
+        if self.n_pings == -1:
+            if self.max_sample_number:
+                number_samples = self.max_sample_number
+            else:
+                number_samples = new_samples[0]
+            # Create the initial data arrays.
+            self._create_arrays(self.chunk_width, number_samples)
+            self.n_pings = 0
+
+        # Check if we need to truncate the sample data.
+        if self.max_sample_number:
+            new_samples = np.minimum(new_samples, self.max_sample_number)
+            data_samples = np.minimum(count, self.max_sample_number)
+        else:
+            data_samples = count
+
+        # Determine the greatest number of existing samples.
+        max_data_samples = self._get_max_data_samples()
+
+        # Determine the array dimensions required to hold the new data. The
+        # ping dimension grows geometrically as it does when appending pings
+        # one at a time.
+        ping_dims = self.ping_time.size
+        sample_dims = max(max_data_samples, int(new_samples.max()))
+        n_pings_needed = self.n_pings + n_new_pings
+        ping_dims = grow_capacity(ping_dims, n_pings_needed, self.chunk_width)
+
+        # Resize if needed.
+        if ping_dims > self.ping_time.size or sample_dims > max_data_samples:
+            self.resize(ping_dims, sample_dims)
+
+        # Get an index into the data arrays for the new pings and update our
+        # ping counter.
+        these_pings = np.arange(self.n_pings, n_pings_needed)
+        self.n_pings = n_pings_needed
+
+        # Insert the index of the channel_metadata object of these pings.
+        self.metadata_index[these_pings] = self._get_metadata_index(
+                self.current_metadata)
+
+        # Update the channel_metadata object with the last ping number and
+        # time.
+        self.current_metadata.end_ping = self.n_pings
+        self.current_metadata.end_time = sample_datagrams['timestamp'][-1]
+
+        # Now insert the data into our numpy arrays.
+        self.ping_time[these_pings] = sample_datagrams['timestamp']
+        self.transducer_depth[these_pings] = sample_datagrams[
+            'transducer_depth']
+        self.frequency[these_pings] = sample_datagrams['frequency']
+        self.transmit_power[these_pings] = sample_datagrams['transmit_power']
+        self.pulse_length[these_pings] = sample_datagrams['pulse_length']
+        self.bandwidth[these_pings] = sample_datagrams['bandwidth']
+        self.sample_interval[these_pings] = sample_datagrams[
+            'sample_interval']
+        self.sound_velocity[these_pings] = sample_datagrams['sound_velocity']
+        self.absorption_coefficient[these_pings] = sample_datagrams[
+            'absorption_coefficient']
+        self.heave[these_pings] = sample_datagrams['heave']
+        self.pitch[these_pings] = sample_datagrams['pitch']
+        self.roll[these_pings] = sample_datagrams['roll']
+        self.temperature[these_pings] = sample_datagrams['temperature']
+        self.heading[these_pings] = sample_datagrams['heading']
+        self.transmit_mode[these_pings] = sample_datagrams['transmit_mode']
+
+        # Do the book keeping if we're storing a subset of samples.
+        if start_sample:
+            self.sample_offset[these_pings] = start_sample
+            if end_sample:
+                sample_count = np.full(n_new_pings,
+                                       end_sample - start_sample + 1)
+            else:
+                sample_count = count - start_sample
+        else:
+            self.sample_offset[these_pings] = 0
+            start_sample = 0
+            if end_sample:
+                sample_count = np.full(n_new_pings, end_sample + 1)
+            else:
+                sample_count = count
+        self.sample_count[these_pings] = sample_count
+
+        # Determine the number of samples we store for each ping and create
+        # a mask of the samples beyond that number that we pad with NaNs.
+        n_stored = np.clip(np.minimum(data_samples, sample_count) -
+                           start_sample, 0, sample_dims)
+        n_cols = int(n_stored.max())
+        pad_mask = np.arange(n_cols) >= n_stored[:, np.newaxis]
+
+        # When storing ragged data, the samples are written to 2d arrays
+        # that hold the new pings and the samples we store are copied to the
+        # end of the sample buffers.
+        if self.ragged:
+            ragged_samples = self._add_ragged_pings(these_pings, n_stored)
+            samples = {}
+            for name in ragged_samples:
+                samples[name] = np.full((n_new_pings, n_cols),
+                        self._get_fill_value(ragged_samples[name].dtype),
+                        dtype=ragged_samples[name].dtype)
+            these_pings = np.arange(n_new_pings)
+        else:
+            samples = {}
+            for name in self._get_sample_attributes():
+                samples[name] = getattr(self, name)
+
+        # Now store the 2d "sample" data.  Determine what we need to store
+        # based on operational mode.
+        # 1 = Power only, 2 = Angle only 3 = Power & Angle
+
+        # Check if we need to store power data.
+        power_pings = mode != 2
+        if self.store_power and np.any(power_pings):
+            rows = these_pings[power_pings]
+
+            power_fill = self._get_fill_value(samples['power'].dtype)
+            if sample_datagrams['power'] is not None and n_cols > 0:
+                # Convert the indexed power data to power dB.
+                power = sample_datagrams['power'][power_pings,
+                                                  start_sample:start_sample +
+                                                  n_cols]
+                if self.compact:
+                    power = power.copy()
+                else:
+                    power = power.astype(self.sample_dtype) * self.INDEX2POWER
+                power[pad_mask[power_pings]] = power_fill
+                samples['power'][rows, :n_cols] = power
+                samples['power'][rows, n_cols:] = power_fill
+            else:
+                samples['power'][rows, :] = power_fill
+
+        # Check if we need to store angle data.
+        angle_pings = mode != 1
+        if self.store_angles and np.any(angle_pings):
+            rows = these_pings[angle_pings]
+            alongship_data = samples['angles_alongship_e']
+            athwartship_data = samples['angles_athwartship_e']
+            angle_fill = self._get_fill_value(alongship_data.dtype)
+
+            if sample_datagrams['angle'] is not None and n_cols > 0:
+                angles = sample_datagrams['angle'][angle_pings,
+                                                   start_sample:start_sample +
+                                                   n_cols]
+
+                # First extract the alongship and athwartship angle data. The
+                # low 8 bits are the athwartship values and the upper 8 bits
+                # are alongship.  Then convert from indexed to electrical
+                # angles.
+                alongship_e = (angles >> 8).astype('int8')
+                athwartship_e = (angles & 0xFF).astype('int8')
+                if not self.compact:
+                    alongship_e = alongship_e.astype(self.sample_dtype) * \
+                                  self.INDEX2ELEC
+                    athwartship_e = athwartship_e.astype(self.sample_dtype) * \
+                                    self.INDEX2ELEC
+                alongship_e[pad_mask[angle_pings]] = angle_fill
+                athwartship_e[pad_mask[angle_pings]] = angle_fill
+
+                alongship_data[rows, :n_cols] = alongship_e
+                alongship_data[rows, n_cols:] = angle_fill
+                athwartship_data[rows, :n_cols] = athwartship_e
+                athwartship_data[rows, n_cols:] = angle_fill
+            else:
+                alongship_data[rows, :] = angle_fill
+                athwartship_data[rows, :] = angle_fill
+
+        # Copy the samples we store to the sample buffers.
+        if self.ragged:
+            for name in ragged_samples:
+                ragged_samples[name][:] = samples[name][~pad_mask]
 
 
     def get_power(self, **kwargs):
@@ -1181,6 +2874,12 @@ class RawData(PingData):
             The processed data object, p_data.
         """
 
+        # Check if we have this product in the cache.
+        cache_key = self._get_cache_key('power', kwargs)
+        p_data = self._get_cached_product(cache_key)
+        if p_data is not None:
+            return p_data
+
         # Call the generalized _get_sample_data method requesting the 'power'
         # sample attribute.
         p_data, return_indices = self._get_sample_data('power', **kwargs)
@@ -1191,6 +2890,8 @@ class RawData(PingData):
         # Set the is_log attribute and return it.
         p_data.is_log = True
 
+        self._cache_product(cache_key, p_data)
+
         return p_data
 
 
@@ -1244,7 +2945,8 @@ class RawData(PingData):
 
 
     def get_Sv(self, calibration=None, linear=False, tvg_correction=True,
-               heave_correct=False, return_depth=False, **kwargs):
+               heave_correct=False, return_depth=False, gain_cache=None,
+               **kwargs):
         """Gets Sv data
 
         The value passed to cal_parameters is a calibration parameters object.
@@ -1262,6 +2964,10 @@ class RawData(PingData):
             tvg_correction:
             heave_correct:
             return_depth (float):
+            gain_cache (dict): A dictionary used to store the gain and TVG
+                vectors calculated when converting power. Pass the same
+                dictionary when converting successive blocks of data from a
+                channel to reuse the vectors. See _convert_power.
             **kwargs (dict): A keyworded argument list.
 
         Returns:
@@ -1269,6 +2975,14 @@ class RawData(PingData):
             True).
         """
 
+        # Check if we have this product in the cache.
+        cache_key = self._get_cache_key('Sv', kwargs, calibration=calibration,
+                linear=linear, tvg_correction=tvg_correction,
+                heave_correct=heave_correct, return_depth=return_depth)
+        p_data = self._get_cached_product(cache_key)
+        if p_data is not None:
+            return p_data
+
         # Get the power data - this step also resamples and arranges the raw
         # data.
         p_data, return_indices = self._get_power(calibration=calibration,
@@ -1286,7 +3000,8 @@ class RawData(PingData):
 
         # Convert power to Sv/sv.
         sv_data = self._convert_power(p_data, calibration, attribute_name,
-                                      linear, return_indices, tvg_correction)
+                                      linear, return_indices, tvg_correction,
+                                      gain_cache=gain_cache)
 
         # Set the data attribute in the ProcessedData object.
         p_data.data = sv_data
@@ -1295,6 +3010,8 @@ class RawData(PingData):
         if heave_correct or return_depth:
             self._to_depth(p_data, calibration, heave_correct, return_indices)
 
+        self._cache_product(cache_key, p_data)
+
         return p_data
 
 
@@ -1319,7 +3036,7 @@ class RawData(PingData):
 
 
     def get_Sp(self,  calibration=None, linear=False, tvg_correction=False,
-            heave_correct=False, return_depth=False,
+            heave_correct=False, return_depth=False, gain_cache=None,
             **kwargs):
         """Gets Sp data.
 
@@ -1348,6 +3065,8 @@ class RawData(PingData):
             heave_correct (bool): If true apply heave correction.
             return_depth (bool): If true, return the vertical axis of the
                 data as depth.  Otherwise, return as range.
+            gain_cache (dict): A dictionary used to store the gain and TVG
+                vectors calculated when converting power. See get_Sv.
             **kwargs
 
         Returns:
@@ -1355,6 +3074,14 @@ class RawData(PingData):
             True).
         """
 
+        # Check if we have this product in the cache.
+        cache_key = self._get_cache_key('Sp', kwargs, calibration=calibration,
+                linear=linear, tvg_correction=tvg_correction,
+                heave_correct=heave_correct, return_depth=return_depth)
+        p_data = self._get_cached_product(cache_key)
+        if p_data is not None:
+            return p_data
+
         # Get the power data - this step also resamples and arranges the raw
         # data.
         p_data, return_indices = self._get_power(calibration=calibration,
@@ -1371,7 +3098,8 @@ class RawData(PingData):
 
         # Convert
         sp_data = self._convert_power(p_data, calibration, attribute_name,
-                                      linear, return_indices, tvg_correction)
+                                      linear, return_indices, tvg_correction,
+                                      gain_cache=gain_cache)
 
         # Set the data attribute in the ProcessedData object.
         p_data.data = sp_data
@@ -1380,6 +3108,8 @@ class RawData(PingData):
         if heave_correct or return_depth:
             self._to_depth(p_data, calibration, heave_correct, return_indices)
 
+        self._cache_product(cache_key, p_data)
+
         return p_data
 
 
@@ -1598,6 +3328,135 @@ class RawData(PingData):
         return (alongship, athwartship, return_indices)
 
 
+    def _get_cache_key(self, product, kwargs, **params):
+        """Returns the product cache key of a product.
+
+        The key is built from the product name and the values of the
+        arguments used to create it. Calibration objects are represented by
+        the values of their parameters and arrays by a digest of their
+        contents so a calibration object that is modified will not match
+        products created before it was modified.
+
+        Args:
+            product (str): The name of the product.
+            kwargs (dict): The keyword arguments passed to the product
+                method.
+            **params: The named arguments of the product method.
+
+        Returns:
+            The cache key or None if caching is disabled or the arguments
+            can't be used in a key.
+        """
+
+        # Check if caching is enabled.
+        if not self.cache_max_bytes or self.cache_max_bytes <= 0:
+            return None
+
+        def key_value(value):
+            # Convert a value to a hashable representation.
+            if isinstance(value, np.ndarray):
+                return ('ndarray', value.dtype.str, value.shape,
+                        hashlib.sha1(np.ascontiguousarray(value).view(
+                        np.uint8)).hexdigest())
+            elif isinstance(value, (list, tuple)):
+                return tuple([key_value(v) for v in value])
+            elif isinstance(value, dict):
+                return tuple([(k, key_value(value[k])) for k in
+                              sorted(value.keys())])
+            elif hasattr(value, '__dict__'):
+                # Represent objects such as calibration objects by their
+                # attribute values.
+                return (type(value).__name__, key_value(vars(value)))
+            else:
+                hash(value)
+                return value
+
+        all_params = dict(kwargs)
+        all_params.update(params)
+        try:
+            return (product, key_value(all_params))
+        except TypeError:
+            # There is an argument we can't represent in a key.
+            return None
+
+
+    def _get_cached_product(self, cache_key):
+        """Returns a copy of a product from the product cache.
+
+        Args:
+            cache_key (tuple): The product's cache key.
+
+        Returns:
+            A copy of the cached ProcessedData object or None if the product
+            is not in the cache.
+        """
+
+        if cache_key is None or cache_key not in self._product_cache:
+            return None
+
+        # Move the product to the end of the cache to mark it as the most
+        # recently used product.
+        p_data = self._product_cache.pop(cache_key)
+        self._product_cache[cache_key] = p_data
+
+        return self._copy_product(p_data)
+
+
+    def _cache_product(self, cache_key, p_data):
+        """Adds a copy of a product to the product cache.
+
+        The least recently used products are removed from the cache until
+        the cache size is within cache_max_bytes. Products larger than
+        cache_max_bytes are not cached.
+
+        Args:
+            cache_key (tuple): The product's cache key.
+            p_data (ProcessedData): The product to add.
+        """
+
+        if cache_key is None:
+            return
+
+        # Get the size of the product.
+        n_bytes = 0
+        for attribute in p_data._data_attributes:
+            data = getattr(p_data, attribute, None)
+            if isinstance(data, np.ndarray):
+                n_bytes += data.nbytes
+        if n_bytes > self.cache_max_bytes:
+            return
+
+        # Remove the least recently used products until the new product fits.
+        while (self._product_cache and self._product_cache_bytes + n_bytes >
+               self.cache_max_bytes):
+            old_key = next(iter(self._product_cache))
+            old_p_data = self._product_cache.pop(old_key)
+            self._product_cache_bytes -= old_p_data._cache_bytes
+
+        # Add a copy of the product to the cache.
+        cached_p_data = self._copy_product(p_data)
+        cached_p_data._cache_bytes = n_bytes
+        self._product_cache[cache_key] = cached_p_data
+        self._product_cache_bytes += n_bytes
+
+
+    def _copy_product(self, p_data):
+        """Returns a copy of a product.
+
+        Args:
+            p_data (ProcessedData): The product to copy.
+
+        Returns:
+            A copy of the ProcessedData object.
+        """
+
+        p_copy = p_data.copy()
+        if hasattr(p_data, 'sound_velocity'):
+            p_copy.sound_velocity = p_data.sound_velocity
+
+        return p_copy
+
+
     def _get_sample_data(self, property_name, calibration=None,
                          resample_interval=RESAMPLE_SHORTEST,
                          resample_soundspeed=None, return_indices=None,
@@ -1673,9 +3532,10 @@ class RawData(PingData):
         # Populate it with time and ping number.
         p_data.ping_time = self.ping_time[return_indices].copy()
 
-        # Get a reference to the data we're operating on.
-        if hasattr(self, property_name):
-            data = getattr(self, property_name)
+        # Get the data we're operating on for the pings we're returning.
+        if (hasattr(self, property_name) or
+                property_name in self._sample_buffers):
+            data = self._get_sample_array(property_name, return_indices)
         else:
             raise AttributeError("The attribute name " + property_name +
                                  " does not exist.")
@@ -1706,8 +3566,7 @@ class RawData(PingData):
             # There are at least 2 different sample intervals in the data.  We
             # must resample the data.  We'll deal with adjusting sample offsets
             # here too.
-            (output, sample_interval) = self._vertical_resample(data[
-                                                            return_indices],
+            (output, sample_interval) = self._vertical_resample(data,
                     cal_parms['sample_interval'], unique_sample_interval,
                                                             resample_interval,
                     cal_parms['sample_offset'], min_sample_offset,
@@ -1718,49 +3577,48 @@ class RawData(PingData):
             if unique_sample_offsets.shape[0] > 1:
                 # We have multiple sample offsets so we need to shift some of
                 # the samples.
-                output = self._vertical_shift(data[return_indices],
+                output = self._vertical_shift(data,
                         cal_parms['sample_offset'], unique_sample_offsets,
                                               min_sample_offset)
             else:
                 # The data all have the same sample intervals and sample
-                # offsets.  Simply copy the data as is.
-                output = data[return_indices].copy()
+                # offsets.  Simply use the data as is.
+                output = data
 
             # Get the sample interval value to use for range conversion below.
             sample_interval = unique_sample_interval[0]
 
         # Check if we have a fixed sound speed.
-        unique_sound_velocity = np.unique(cal_parms['sound_velocity'])
+        unique_sound_velocity, sound_velocity_counts = np.unique(
+            cal_parms['sound_velocity'], return_counts=True)
         if unique_sound_velocity.shape[0] > 1:
             # There are at least 2 different sound speeds in the data or
             # provided calibration data.  Interpolate all data to the most
             # common range (which is the most common sound speed).
-            sound_velocity = None
-            n = 0
-            for speed in unique_sound_velocity:
-                # Determine the sound speed with the most pings.
-                if np.count_nonzero(cal_parms['sound_velocity'] == speed) > n:
-                   sound_velocity = speed
+            sound_velocity = unique_sound_velocity[
+                np.argmax(sound_velocity_counts)]
 
             # Calculate the target range.
             range = get_range_vector(
                 output.shape[1], sample_interval, sound_velocity,
                 min_sample_offset)
 
-            # Get an array of indexes in the output array to interpolate.
-            pings_to_interp = np.where(cal_parms['sound_velocity'] !=
-                                       sound_velocity)[0]
+            # Iterate through the other sound speeds, interpolating the pings
+            # with each sound speed onto the target range as a block.  Pings
+            # that have been deleted without being removed have no sound
+            # speed and no data so they are skipped.
+            for speed in unique_sound_velocity:
+                if speed == sound_velocity or np.isnan(speed):
+                    continue
+                pings_to_interp = np.where(cal_parms['sound_velocity'] ==
+                                           speed)[0]
 
-            # Iterate through this list of pings to change.  Interpolating each
-            # ping.
-            for ping in pings_to_interp:
-                # Resample using the provided sound speed.
+                # Get the interpolation index and weight table for this
+                # sound speed and apply it to the pings.
                 resample_range = get_range_vector(output.shape[1],
-                                                  sample_interval,
-                        cal_parms['sound_velocity'][ping], min_sample_offset)
-
-                output[ping,:] = np.interp(range, resample_range, output[
-                                                                  ping, :])
+                        sample_interval, speed, min_sample_offset)
+                output[pings_to_interp, :] = self._interp_samples(
+                        output[pings_to_interp, :], resample_range, range)
 
         else:
             # We have a fixed sound speed and only need to calculate a single
@@ -1786,11 +3644,122 @@ class RawData(PingData):
         return p_data, return_indices
 
 
+    def _get_sample_array(self, property_name, return_indices):
+        """Returns a copy of the sample data of the specified pings.
+
+        Compact (indexed) power and angle data are converted to power dB and
+        electrical angles and empty samples are set to NaN. Ragged data are
+        copied into an array of n_samples samples per ping and the samples
+        beyond the samples stored for each ping are set to NaN.
+
+        Args:
+            property_name (str): The name of the sample data attribute.
+            return_indices (array): A numpy array of the indices of the pings
+                to return.
+
+        Returns:
+            A 2d array containing the sample data.
+        """
+
+        # Get the samples of the pings.  Ragged samples are gathered from
+        # the sample buffers.
+        if self.ragged:
+            buffer_index = self._get_buffer_index(return_indices)
+            data = self._sample_buffers[property_name][buffer_index]
+        else:
+            # np.asarray returns memory mapped data as a regular array.
+            data = np.asarray(getattr(self, property_name)[return_indices])
+
+        # Check if we need to convert the data.
+        if data.dtype.kind == 'f':
+            output = data
+        else:
+            # Determine which samples are empty.  Angle samples are only
+            # empty if the power sample is empty too since the angle fill
+            # value is also a valid angle.
+            empty = data == self._get_fill_value(data.dtype)
+            if property_name != 'power' and self.store_power:
+                if self.ragged:
+                    power = self._sample_buffers['power'][buffer_index]
+                else:
+                    power = self.power[return_indices]
+                empty &= power == self._get_fill_value(power.dtype)
+
+            # Convert the indexed data.
+            if property_name == 'power':
+                scale = self.INDEX2POWER
+            else:
+                scale = self.INDEX2ELEC
+            output = data.astype(self.sample_dtype)
+            output *= scale
+            output[empty] = np.nan
+
+        # Check if we need to copy the ragged samples into a 2d array.
+        if self.ragged:
+            counts = self.buffer_count[return_indices]
+            data = np.full((counts.shape[0], self.n_samples), np.nan,
+                           dtype=self.sample_dtype)
+            data[np.arange(self.n_samples) < counts[:, np.newaxis]] = output
+            output = data
+
+        return output
+
+
+    def _interp_samples(self, data, data_range, new_range):
+        """Linearly interpolates sample data onto a new range vector.
+
+        The samples of all of the pings are interpolated at once using a
+        table of sample indices and weights that is computed from the range
+        vectors. Like np.interp, samples beyond the ends of data_range are
+        set to the first or last sample of the ping.
+
+        Args:
+            data (array): A 2d numpy array (pings, samples) containing the
+                sample data.
+            data_range (array): The evenly spaced range vector of the
+                samples in data.
+            new_range (array): The range vector to interpolate the samples
+                onto.
+
+        Returns:
+            A 2d numpy array containing the interpolated sample data.
+        """
+
+        n_samples = data_range.shape[0]
+        if n_samples < 2:
+            return data.copy()
+
+        # Compute the fractional sample number in data of each new sample.
+        thickness = data_range[1] - data_range[0]
+        sample_pos = np.clip((new_range - data_range[0]) / thickness, 0,
+                             n_samples - 1)
+
+        # Get the index of the samples on either side of each new sample and
+        # the weight of the second sample.
+        lower = np.floor(sample_pos).astype(np.intp)
+        upper = np.minimum(lower + 1, n_samples - 1)
+        weight = sample_pos - lower
+
+        # Interpolate.  Where the weight is 0 the lower sample is used as is
+        # so NaNs in the upper sample do not propagate.
+        lower_data = data[:, lower]
+        interp_data = lower_data + (data[:, upper] - lower_data) * weight
+        exact = weight == 0
+        interp_data[:, exact] = lower_data[:, exact]
+
+        return interp_data
+
+
     def _convert_power(
             self, power_data, calibration, convert_to, linear,
-            return_indices, tvg_correction):
+            return_indices, tvg_correction, gain_cache=None):
         """Converts power to Sv/sv/Sp/sp
 
+        If gain_cache is a dictionary, the system gains computed for each
+        unique set of calibration parameters and the TVG computed for each
+        range vector are stored in it and reused when later calls are passed
+        the same dictionary.
+
         Args:
             power_data (ping_data): A ping_data object with the raw power
                 data read from the file.
@@ -1802,6 +3771,8 @@ class RawData(PingData):
             return_indices (array): A numpy array of indices to return.
             tvg_correction (bool): Set to True to apply a correction to the
                 range of 2 * sample thickness.
+            gain_cache (dict): A dictionary to store the gain and TVG
+                vectors in.
 
         Returns:
             An array with the converted data.
@@ -1830,7 +3801,152 @@ class RawData(PingData):
         cal_parms['sound_velocity'].fill(power_data.sound_velocity)
 
         # Calculate the system gains.
-        wavelength = cal_parms['sound_velocity'] / power_data.frequency
+        if gain_cache is None:
+            gains = self._get_gains(cal_parms, power_data.frequency,
+                                    convert_to)
+        else:
+            # Find the unique sets of parameters used to compute the gains
+            # and only compute the gains of sets that are not in the cache.
+            gain_keys = ['transmit_power', 'gain', 'pulse_length',
+                         'equivalent_beam_angle']
+            gain_parms = np.column_stack([cal_parms[key] for key in
+                                          gain_keys])
+            unique_parms, inverse = np.unique(gain_parms, axis=0,
+                                              return_inverse=True)
+            cache_keys = [('gain', convert_to.lower(), power_data.frequency,
+                           power_data.sound_velocity) + tuple(parms) for
+                          parms in unique_parms.tolist()]
+            missing = [i for i, key in enumerate(cache_keys) if key not in
+                       gain_cache]
+            if missing:
+                missing_parms = {key:unique_parms[missing, i] for i, key in
+                                 enumerate(gain_keys)}
+                missing_parms['sound_velocity'] = np.full(len(missing),
+                        power_data.sound_velocity, dtype=self.sample_dtype)
+                missing_gains = self._get_gains(missing_parms,
+                                                power_data.frequency,
+                                                convert_to)
+                for i, gain in zip(missing, missing_gains):
+                    gain_cache[cache_keys[i]] = gain
+            unique_gains = np.array([gain_cache[key] for key in cache_keys],
+                                    dtype=gain_parms.dtype)
+            gains = unique_gains[inverse.ravel()]
+
+        # Get the corrected range and TVG.  These only depend on the range
+        # vector so they can be reused if we have them cached.
+        tvg_key = ('tvg', convert_to.lower(), tvg_correction,
+                   power_data.range.shape[0], float(power_data.range[0]),
+                   float(power_data.sample_thickness))
+        if gain_cache is not None and tvg_key in gain_cache:
+            c_range, tvg = gain_cache[tvg_key]
+        else:
+            c_range, tvg = self._get_tvg(power_data, convert_to,
+                                         tvg_correction)
+            if gain_cache is not None:
+                gain_cache[tvg_key] = (c_range.copy(), tvg)
+
+        # Compute the per ping terms.  The gains and sa correction are
+        # combined into a single offset that is subtracted from each ping.
+        dtype = np.dtype(self.sample_dtype)
+        absorption = (2.0 * cal_parms['absorption_coefficient']).astype(dtype)
+        ping_offset = gains.astype(dtype)
+        if convert_to in ['sv','Sv']:
+            # Apply sa correction for Sv/sv.
+            ping_offset += (2.0 * cal_parms['sa_correction']).astype(dtype)
+        c_range = np.asarray(c_range, dtype=dtype)
+        tvg = np.asarray(tvg, dtype=dtype)
+
+        # The power data are converted in place if they are stored using the
+        # sample dtype.  Otherwise we allocate the output array.
+        if power_data.data.dtype == dtype:
+            data = power_data.data
+        else:
+            data = np.empty(power_data.data.shape, dtype=dtype)
+
+        # Convert the data in blocks of pings to limit the size of the
+        # temporary arrays.
+        n_pings = data.shape[0]
+        block_size = max(1, int(self.CONVERT_BLOCK_PINGS))
+        for start in range(0, n_pings, block_size):
+            end = min(start + block_size, n_pings)
+            self._convert_power_block(power_data.data[start:end],
+                    data[start:end], absorption[start:end, np.newaxis],
+                    c_range, tvg, ping_offset[start:end, np.newaxis], linear)
+
+        # Return the result.
+        return data
+
+
+    def _convert_power_block(self, power, out, absorption, c_range, tvg,
+                             ping_offset, linear):
+        """Converts a block of power data to Sv/sv/Sp/sp.
+
+        The output is computed as:
+
+            out = power + tvg + absorption * c_range - ping_offset
+
+        and is optionally converted to linear units. numexpr is used if it
+        is installed, otherwise the conversion is done with numpy operating
+        in place on the output array.
+
+        Args:
+            power (array): A 2d numpy array containing the power data.
+            out (array): A 2d numpy array the same shape as power that the
+                results are written to. out can be the power array.
+            absorption (array): A 2d numpy array with a single column
+                containing 2 * the absorption coefficient of each ping.
+            c_range (array): The corrected range vector.
+            tvg (array): The time varied gain vector.
+            ping_offset (array): A 2d numpy array with a single column
+                containing the gain and sa correction of each ping.
+            linear (bool):  Set to True to return linear values.
+        """
+
+        if numexpr is not None:
+            numexpr.evaluate('power + tvg + absorption * c_range - ping_offset',
+                    local_dict={'power':power, 'tvg':tvg,
+                                'absorption':absorption, 'c_range':c_range,
+                                'ping_offset':ping_offset},
+                    out=out, casting='same_kind')
+            if linear:
+                numexpr.evaluate('10**(out / 10)', local_dict={'out':out},
+                                 out=out, casting='same_kind')
+        else:
+            # Compute the absorption term in the output array (unless it is
+            # the power array) and then add in power and TVG.
+            if np.may_share_memory(out, power):
+                out += absorption * c_range
+            else:
+                np.multiply(absorption, c_range, out=out)
+                out += power
+            out += tvg
+
+            # Subtract the applied gains.
+            out -= ping_offset
+
+            # Check if we're returning linear or log values.
+            if linear:
+                # Convert to linear units in-place.
+                out /= 10.0
+                np.power(10.0, out, out=out)
+
+
+    def _get_gains(self, cal_parms, frequency, convert_to):
+        """Calculates the system gains used to convert power.
+
+        Args:
+            cal_parms (dict): A dictionary containing arrays of the
+                transmit_power, gain, pulse_length, equivalent_beam_angle and
+                sound_velocity values.
+            frequency (float): The frequency of the data in Hz.
+            convert_to (str):  A string that specifies what to convert the
+                power to.  Possible values are: Sv, sv, Sp, or sp.
+
+        Returns:
+            An array containing the gains.
+        """
+
+        wavelength = cal_parms['sound_velocity'] / frequency
         if convert_to in ['sv','Sv']:
             gains = 10 * np.log10((cal_parms['transmit_power'] * (10**(
                 cal_parms['gain']/10.0))**2 * wavelength**2 * cal_parms[
@@ -1840,6 +3956,23 @@ class RawData(PingData):
             gains = 10 * np.log10((cal_parms['transmit_power'] * (10**(
                 cal_parms['gain']/10.0))**2 * wavelength**2) / (16 * np.pi**2))
 
+        return gains
+
+
+    def _get_tvg(self, power_data, convert_to, tvg_correction):
+        """Calculates the corrected range and time varied gain.
+
+        Args:
+            power_data (ping_data): A ping_data object with the power data.
+            convert_to (str):  A string that specifies what to convert the
+                power to.  Possible values are: Sv, sv, Sp, or sp.
+            tvg_correction (bool): Set to True to apply a correction to the
+                range of 2 * sample thickness.
+
+        Returns:
+            A tuple containing the corrected range and TVG vectors.
+        """
+
         # Get the range for TVG calculation.  If tvg_correction = True, we
         # will apply a correction to the range of 2 * sample thickness. The
         # corrected range is also used for absorption calculations. A
@@ -1861,28 +3994,7 @@ class RawData(PingData):
             tvg[:] = 40.0 * np.log10(tvg)
         tvg[tvg < 0] = 0
 
-        # Calculate absorption.  This is the outer product of our corrected
-        # range and 2 * absorption_coefficient.  We'll use this for our output
-        # array to minimize the arrays we're creating.
-        data = np.outer(2.0 * cal_parms['absorption_coefficient'], c_range)
-
-        # Add in power and TVG.
-        data += power_data.data + tvg
-
-        # Subtract the applied gains.
-        data -= gains[:, np.newaxis]
-
-        # Apply sa correction for Sv/sv.
-        if convert_to in ['sv','Sv']:
-            data -= (2.0 * cal_parms['sa_correction'])[:, np.newaxis]
-
-        # Check if we're returning linear or log values.
-        if linear:
-            # Convert to linear units (use [:] to operate in-place).
-            data[:] = 10**(data / 10.0)
-
-        # Return the result.
-        return data
+        return c_range, tvg
 
 
     def _to_depth(self, p_data, calibration, heave_correct, return_indices):
@@ -2025,37 +4137,144 @@ class RawData(PingData):
                 param_data = self_param[return_indices]
             except:
                 # It is not a direct property, so it must be in the
-                # channel_metadata object.  Create the return array.
+                # channel_metadata objects.  Create the return array.
                 param_data = np.empty((return_indices.shape[0]), dtype=dtype)
-                # Create a counter to use to index the return array. We can't
-                # use the index value from return_indices since these values
-                # may be re-ordered.
-                ret_idx = 0
-                # Populate with the data found in the channel_metadata objects.
-
-                for idx in return_indices:
-                    # Dig out sa_correction from the table.
-                    if isinstance(self.channel_metadata[idx],
-                                  ChannelMetadata):
-                        if param_name == 'sa_correction':
-                            sa_table = getattr(self.channel_metadata[idx],
-                                               'sa_correction_table')
-                            pl_table = getattr(self.channel_metadata[idx],
-                                               'pulse_length_table')
-                            param_data[ret_idx] = sa_table[
-                                np.where(np.isclose(
-                                    pl_table, self.pulse_length[idx]))[0]][0]
-                        else:
-                            param_data[ret_idx] = getattr(
-                                self.channel_metadata[idx], param_name)
+
+                # Get the table of unique channel_metadata objects and the
+                # index into the table of each ping.
+                metadata_table, metadata_index = \
+                        self._get_metadata_table(return_indices)
+
+                # Populate the return array with the data found in the
+                # channel_metadata objects.  We get the parameter from each
+                # unique object and gather the values with the index.
+                for idx, metadata in enumerate(metadata_table):
+                    ping_mask = metadata_index == idx
+                    if not isinstance(metadata, ChannelMetadata):
+                        param_data[ping_mask] = np.nan
+                    elif param_name == 'sa_correction':
+                        # Dig out sa_correction from the table using the
+                        # pulse length of each ping.
+                        sa_table = getattr(metadata, 'sa_correction_table')
+                        pl_table = getattr(metadata, 'pulse_length_table')
+                        pulse_length = self.pulse_length[
+                            return_indices[ping_mask]]
+                        matches = np.isclose(pl_table[np.newaxis, :],
+                                             pulse_length[:, np.newaxis])
+                        if not np.all(np.any(matches, axis=1)):
+                            raise ValueError("The pulse length of one or "
+                                    "more pings is not in the sa correction "
+                                    "table.")
+                        param_data[ping_mask] = sa_table[np.argmax(matches,
+                                                                   axis=1)]
                     else:
-                        param_data[ret_idx] = np.nan
-                    # Increment the index counter.
-                    ret_idx += 1
+                        param_data[ping_mask] = getattr(metadata, param_name)
 
         return param_data
 
 
+    def _get_metadata_table(self, return_indices):
+        """Returns the unique channel_metadata objects of a set of pings.
+
+        Args:
+            return_indices (array): A numpy array of indices of the pings.
+
+        Returns:
+            A tuple containing a list of the unique channel_metadata objects
+            and an array containing the index into the list of each ping.
+            Pings without a channel_metadata object map to None.
+        """
+
+        table_index, metadata_index = np.unique(
+                self.metadata_index[return_indices], return_inverse=True)
+        metadata_table = [self.metadata_table[idx] if idx <
+                          len(self.metadata_table) else None for idx in
+                          table_index]
+
+        return metadata_table, metadata_index
+
+
+    def _get_metadata_index(self, metadata):
+        """Returns the index of a ChannelMetadata object in our table.
+
+        The object is added to the table if it isn't in it.  Objects are
+        compared by identity and the table is searched from the end since
+        pings are usually added for the most recently added object.
+
+        Args:
+            metadata (ChannelMetadata): The object to find or None.
+
+        Returns:
+            The index of the object in the metadata table or NO_METADATA if
+            metadata is None.
+
+        Raises:
+            ValueError: The metadata table is full.
+        """
+
+        if metadata is None:
+            return self.NO_METADATA
+
+        for idx in range(len(self.metadata_table) - 1, -1, -1):
+            if self.metadata_table[idx] is metadata:
+                return idx
+
+        if len(self.metadata_table) >= self.NO_METADATA:
+            raise ValueError('The RawData object can store the metadata of ' +
+                             'at most ' + str(self.NO_METADATA) + ' files.')
+        self.metadata_table.append(metadata)
+
+        return len(self.metadata_table) - 1
+
+
+    def _add_metadata(self, obj_to_insert):
+        """Adds the ChannelMetadata objects of an object to our table.
+
+        This is an internal method used when inserting, replacing and
+        appending objects. The metadata_index of the object refers to its
+        own metadata table so the indices are mapped to our table.
+
+        Args:
+            obj_to_insert (RawData): The object whose metadata we add.
+
+        Returns:
+            A shallow copy of obj_to_insert whose metadata_index attribute
+            refers to our metadata table.
+        """
+
+        # Map the indices of the object's table to our table.  The extra
+        # element maps invalid indices to NO_METADATA.
+        table_map = np.empty(len(obj_to_insert.metadata_table) + 1,
+                             dtype=np.uint16)
+        for idx, metadata in enumerate(obj_to_insert.metadata_table):
+            table_map[idx] = self._get_metadata_index(metadata)
+        table_map[-1] = self.NO_METADATA
+
+        # Create the copy of the object that refers to our table.
+        new_obj = copy.copy(obj_to_insert)
+        new_obj.metadata_table = self.metadata_table
+        new_obj.metadata_index = table_map[np.minimum(
+                obj_to_insert.metadata_index, table_map.shape[0] - 1)]
+
+        return new_obj
+
+
+    @property
+    def channel_metadata(self):
+        """An array of the ChannelMetadata object of each ping.
+
+        The array is created from the metadata table and metadata_index
+        attributes each time the property is accessed.  Pings without a
+        ChannelMetadata object are None.
+        """
+
+        table = np.empty(len(self.metadata_table) + 1, dtype='object')
+        table[0:-1] = self.metadata_table
+        table[-1] = None
+
+        return table[np.minimum(self.metadata_index, table.shape[0] - 1)]
+
+
     def _create_arrays(self, n_pings, n_samples, initialize=False):
         """Initializes RawData data arrays.
 
@@ -2070,7 +4289,7 @@ class RawData(PingData):
 
         # First, create uninitialized arrays.
         self.ping_time = np.empty((n_pings), dtype='datetime64[ms]')
-        self.channel_metadata = np.empty((n_pings), dtype='object')
+        self.metadata_index = np.empty((n_pings), np.uint16)
         self.transducer_depth = np.empty((n_pings), np.float32)
         self.frequency = np.empty((n_pings), np.float32)
         self.transmit_power = np.empty((n_pings), np.float32)
@@ -2087,23 +4306,35 @@ class RawData(PingData):
         self.transmit_mode = np.empty((n_pings), np.uint8)
         self.sample_offset =  np.empty((n_pings), np.uint32)
         self.sample_count = np.empty((n_pings), np.uint32)
-        if self.store_power:
-            self.power = np.empty(
-                (n_pings, n_samples),
-                dtype=self.sample_dtype, order='C')
+
+        # Ragged data are stored in flat sample buffers. Initially, the
+        # buffers are allocated to hold n_pings of n_samples.
+        if self.ragged:
+            self.buffer_offset = np.empty((n_pings), np.int64)
+            self.buffer_count = np.empty((n_pings), np.uint32)
+            self._sample_buffers = {}
+            self._buffer_size = 0
+            for name in self._get_sample_attributes():
+                self._sample_buffers[name] = np.empty(n_pings * n_samples,
+                        dtype=self._get_storage_dtype(name))
             self.n_samples = n_samples
 
-        if self.store_angles:
-            self.angles_alongship_e = np.empty(
-                (n_pings, n_samples), dtype=self.sample_dtype, order='C')
-            self.angles_athwartship_e = np.empty(
-                (n_pings, n_samples), dtype=self.sample_dtype, order='C')
+        elif self.store_power:
+            self.power = self._create_sample_array('power', n_pings,
+                                                   n_samples)
+            self.n_samples = n_samples
+
+        if self.store_angles and not self.ragged:
+            self.angles_alongship_e = self._create_sample_array(
+                    'angles_alongship_e', n_pings, n_samples)
+            self.angles_athwartship_e = self._create_sample_array(
+                    'angles_athwartship_e', n_pings, n_samples)
             self.n_samples = n_samples
 
         # Check if we should initialize them.
         if initialize:
             self.ping_time.fill(np.datetime64('NaT'))
-            # channel_metadata is initialized when using np.empty.
+            self.metadata_index.fill(self.NO_METADATA)
             self.transducer_depth.fill(np.nan)
             self.frequency.fill(np.nan)
             self.transmit_power.fill(np.nan)
@@ -2120,11 +4351,410 @@ class RawData(PingData):
             self.transmit_mode.fill(0)
             self.sample_offset.fill(0)
             self.sample_count.fill(0)
-            if self.store_power:
-                self.power.fill(np.nan)
-            if self.store_angles:
-                self.angles_alongship_e.fill(np.nan)
-                self.angles_athwartship_e.fill(np.nan)
+            if self.ragged:
+                self.buffer_offset.fill(0)
+                self.buffer_count.fill(0)
+            if self.store_power and not self.ragged:
+                self.power.fill(self._get_fill_value(self.power.dtype))
+            if self.store_angles and not self.ragged:
+                angle_fill = self._get_fill_value(self.angles_alongship_e.dtype)
+                self.angles_alongship_e.fill(angle_fill)
+                self.angles_athwartship_e.fill(angle_fill)
+
+
+    def _get_storage_dtype(self, property_name):
+        """Returns the data type used to store a sample data attribute.
+
+        Args:
+            property_name (str): The name of the sample data attribute.
+
+        Returns:
+            The sample_dtype or, when storing compact data, int16 for power
+            and int8 for the angles.
+        """
+
+        if not self.compact:
+            return self.sample_dtype
+        elif property_name == 'power':
+            return np.int16
+        else:
+            return np.int8
+
+
+    def _create_sample_array(self, property_name, n_pings, n_samples):
+        """Creates an uninitialized 2d sample data array.
+
+        When scratch_dir is set, the array is a memmap array backed by a new
+        temporary file in the scratch directory. The temporary file is
+        deleted when it is closed and the array is garbage collected.
+
+        Args:
+            property_name (str): The name of the sample data attribute.
+            n_pings (int): Number of pings.
+            n_samples (int): Number of samples.
+
+        Returns:
+            A 2d numpy array.
+        """
+
+        dtype = self._get_storage_dtype(property_name)
+        if not self.scratch_dir or n_pings * n_samples == 0:
+            return np.empty((n_pings, n_samples), dtype=dtype, order='C')
+
+        # Replace the attribute's temporary file.  The memory mapping of the
+        # old file stays valid after it is closed.
+        if property_name in self._scratch_files:
+            self._scratch_files[property_name].close()
+        self._scratch_files[property_name] = tempfile.TemporaryFile(
+                prefix='echolab2_', dir=self.scratch_dir)
+
+        return self._map_scratch_file(property_name, dtype, n_pings,
+                                      n_samples)
+
+
+    def _map_scratch_file(self, property_name, dtype, n_pings, n_samples):
+        """Maps an attribute's temporary file to a 2d memmap array.
+
+        The file is extended if it is smaller than the array.
+
+        Args:
+            property_name (str): The name of the sample data attribute.
+            dtype (dtype): The data type of the array.
+            n_pings (int): Number of pings.
+            n_samples (int): Number of samples.
+
+        Returns:
+            A 2d numpy memmap array.
+        """
+
+        data = np.memmap(self._scratch_files[property_name], dtype=dtype,
+                         mode='r+', shape=(n_pings, n_samples), order='C')
+        self._scratch_maps[property_name] = data
+
+        return data
+
+
+    def _resize_sample_array(self, attr_name, data, ping_dim, sample_dim):
+        """Returns a 2d data attribute resized to the specified dimensions.
+
+        When storing the power and angle data in memory mapped files, the
+        ping dimension is grown by extending the attribute's file and the
+        data are copied to a new file in blocks of pings when the sample
+        dimension changes. Otherwise, PingData._resize_sample_array is called.
+        See PingData._resize_sample_array for a description of the
+        arguments.
+        """
+
+        # Check if this attribute is stored in a memory mapped file.
+        if not self.scratch_dir or attr_name not in \
+                self._get_sample_attributes():
+            return super(RawData, self)._resize_sample_array(attr_name, data,
+                    ping_dim, sample_dim)
+
+        # Shrinking the ping axis returns a view of the existing array.
+        if sample_dim == data.shape[1] and ping_dim <= data.shape[0]:
+            return data[0:ping_dim, :]
+
+        # If the sample axis isn't changing and the array maps the start of
+        # the attribute's file, the file can be extended in place.
+        scratch_map = self._scratch_maps.get(attr_name)
+        if (sample_dim == data.shape[1] and scratch_map is not None and
+                scratch_map.shape[1] == sample_dim and
+                data.ctypes.data == scratch_map.ctypes.data):
+            return self._map_scratch_file(attr_name, data.dtype, ping_dim,
+                                          sample_dim)
+
+        # Otherwise, create a new file and copy the data in blocks of pings
+        # so we don't load all of the data into memory.
+        new_data = self._create_sample_array(attr_name, ping_dim, sample_dim)
+        fill_value = self._get_fill_value(new_data.dtype)
+        n_pings = min(ping_dim, data.shape[0])
+        n_samples = min(sample_dim, data.shape[1])
+        block_pings = max(self.SCRATCH_BLOCK_BYTES // max(sample_dim *
+                          new_data.itemsize, 1), 1)
+        for start in range(0, ping_dim, block_pings):
+            end = min(start + block_pings, ping_dim)
+            new_data[start:end, :] = fill_value
+            if start < n_pings:
+                end = min(end, n_pings)
+                new_data[start:end, 0:n_samples] = data[start:end,
+                                                        0:n_samples]
+
+        return new_data
+
+
+    def _get_save_state(self):
+        """Returns the arrays and attributes that are saved by save.
+
+        Only the pings in the object are saved, in the order they were
+        added, so rolling arrays are saved (and loaded) as regular arrays.
+        The channel_metadata objects are saved as a table of dicts and the
+        current_metadata attribute as the index of its object in the table.
+        The product cache isn't saved. See PingData._get_save_state.
+        """
+
+        arrays = {}
+        attributes = {}
+
+        # Get the data of the pings in the order they were added.
+        for attr_name in self._data_attributes:
+            if hasattr(self, attr_name):
+                arrays[attr_name] = self.get_ordered(attr_name)
+        for name, buffer in self._sample_buffers.items():
+            arrays['_sample_buffers.' + name] = buffer[0:self._buffer_size]
+
+        # Save the table of channel_metadata objects.  The current object is
+        # added to the end of the table if it isn't in the table.
+        metadata_table = list(self.metadata_table)
+        current_index = None
+        if self.current_metadata is not None:
+            for idx, metadata in enumerate(metadata_table):
+                if metadata is self.current_metadata:
+                    current_index = idx
+            if current_index is None:
+                current_index = len(metadata_table)
+                metadata_table.append(self.current_metadata)
+        attributes['channel_metadata_table'] = [metadata.__getstate__() for
+                                                metadata in metadata_table]
+        attributes['current_metadata'] = current_index
+        attributes['n_metadata'] = len(self.metadata_table)
+
+        # Get the other attributes.
+        for name, value in self.__dict__.items():
+            if name in arrays or name in attributes or name in \
+                    ['metadata_table', '_product_cache', '_scratch_files',
+                     '_scratch_maps', '_sample_buffers', '_ping_time_lookup',
+                     '_capacity_arrays']:
+                continue
+            attributes[name] = value
+        attributes['rolling_array'] = False
+        attributes['_ring_head'] = 0
+        attributes['_product_cache_bytes'] = 0
+
+        return arrays, attributes
+
+
+    def _set_load_state(self, arrays, attributes):
+        """Sets the state of an object that is being loaded.
+
+        The channel_metadata objects are re-created from the saved table.
+        See PingData._set_load_state.
+        """
+
+        # Get the ragged sample buffers.
+        self._sample_buffers = {}
+        for name in list(arrays.keys()):
+            if name.startswith('_sample_buffers.'):
+                self._sample_buffers[name[len('_sample_buffers.'):]] = \
+                        arrays.pop(name)
+
+        # Re-create the channel_metadata objects.
+        metadata_table = []
+        for values in attributes.pop('channel_metadata_table'):
+            metadata = ChannelMetadata.__new__(ChannelMetadata)
+            metadata.__setstate__(values)
+            metadata_table.append(metadata)
+        current_index = attributes.pop('current_metadata')
+        n_metadata = attributes.pop('n_metadata')
+
+        super(RawData, self)._set_load_state(arrays, attributes)
+
+        # The current object is only in the table if pings refer to it.
+        self.metadata_table = metadata_table[0:n_metadata]
+        if current_index is None:
+            self.current_metadata = None
+        else:
+            self.current_metadata = metadata_table[current_index]
+
+        # Create the product cache and the scratch file dicts.
+        self._product_cache = OrderedDict()
+        self._ping_time_lookup = None
+        self._capacity_arrays = {}
+        self._scratch_files = {}
+        self._scratch_maps = {}
+
+
+    def __getstate__(self):
+        """Returns the state of the object for pickling.
+
+        The temporary files can't be pickled so memory mapped arrays are
+        pickled as regular arrays.  The ping time lookup and the spare
+        capacity of the data arrays aren't pickled.
+        """
+
+        state = self.__dict__.copy()
+        state['_scratch_files'] = {}
+        state['_scratch_maps'] = {}
+        state['_ping_time_lookup'] = None
+        state['_capacity_arrays'] = {}
+
+        return state
+
+
+    def _get_sample_attributes(self):
+        """Returns the names of the sample data attributes we store.
+
+        Returns:
+            A list containing the names of the power and angle attributes.
+        """
+
+        names = []
+        if self.store_power:
+            names.append('power')
+        if self.store_angles:
+            names += ['angles_alongship_e', 'angles_athwartship_e']
+
+        return names
+
+
+    def _get_max_data_samples(self):
+        """Returns the number of samples our sample data arrays can hold.
+
+        Returns:
+            The greatest sample dimension of the power and angle arrays or,
+            when storing ragged data, the number of samples of the longest
+            ping.
+        """
+
+        if self.ragged:
+            return self.n_samples
+        else:
+            return max([getattr(self, name).shape[1] for name in
+                        self._get_sample_attributes()])
+
+
+    def _check_sample_storage(self, obj_to_insert):
+        """Checks that an object stores its samples like this object.
+
+        Args:
+            obj_to_insert (RawData): The object that is being inserted.
+
+        Raises:
+            TypeError: The object doesn't use the same sample storage.
+        """
+
+        if (obj_to_insert.compact != self.compact or
+                obj_to_insert.ragged != self.ragged):
+            raise TypeError('The object you are inserting must use the same ' +
+                            'sample storage (compact and ragged) as this ' +
+                            'object.')
+
+
+    def _add_ragged_pings(self, ping_index, n_stored):
+        """Allocates space at the end of the sample buffers for pings.
+
+        The space is allocated in ping order and the buffer_offset and
+        buffer_count of the pings are updated.
+
+        Args:
+            ping_index (array): A numpy array of the indices of the pings.
+            n_stored (array): A numpy array of the number of samples we store
+                for each ping.
+
+        Returns:
+            A dict, keyed by sample attribute name, of views into the sample
+            buffers where the samples of the pings are stored. The samples are
+            initialized to the fill value of the buffers.
+        """
+
+        n_stored = np.asarray(n_stored, dtype=np.int64)
+
+        # Update the offset and count of these pings.
+        self.buffer_offset[ping_index] = self._buffer_size + \
+                np.cumsum(n_stored) - n_stored
+        self.buffer_count[ping_index] = n_stored
+
+        return self._reserve_samples(int(n_stored.sum()))
+
+
+    def _reserve_samples(self, n_samples):
+        """Allocates space for samples at the end of the sample buffers.
+
+        The buffers are grown by at least a factor of 2 when they fill up so
+        the cost of copying the samples is amortized.
+
+        Args:
+            n_samples (int): The number of samples to allocate.
+
+        Returns:
+            A dict, keyed by sample attribute name, of views into the sample
+            buffers where the samples are stored. The samples are initialized
+            to the fill value of the buffers.
+        """
+
+        start = self._buffer_size
+        end = start + n_samples
+
+        # Check if we need to grow the buffers.
+        samples = {}
+        for name, buffer in self._sample_buffers.items():
+            if buffer.shape[0] < end:
+                new_buffer = np.empty(max(end, 2 * buffer.shape[0]),
+                                      dtype=buffer.dtype)
+                new_buffer[0:start] = buffer[0:start]
+                buffer = new_buffer
+                self._sample_buffers[name] = buffer
+            samples[name] = buffer[start:end]
+            samples[name].fill(self._get_fill_value(buffer.dtype))
+        self._buffer_size = end
+
+        return samples
+
+
+    def _get_buffer_index(self, ping_index):
+        """Returns the index into the sample buffers of pings' samples.
+
+        Args:
+            ping_index (array): A numpy array of the indices of the pings.
+
+        Returns:
+            A numpy array containing the index of each stored sample of the
+            pings, ping by ping.
+        """
+
+        counts = self.buffer_count[ping_index].astype(np.int64)
+        starts = np.cumsum(counts) - counts
+        n_samples = int(counts.sum())
+
+        return np.repeat(self.buffer_offset[ping_index] - starts, counts) + \
+                np.arange(n_samples)
+
+
+    def _add_ragged_samples(self, obj_to_insert):
+        """Copies the samples of a ragged object into our sample buffers.
+
+        This is an internal method used when inserting, replacing and
+        appending ragged objects. The samples are copied to the end of our
+        buffers.
+
+        Args:
+            obj_to_insert (RawData): The ragged object whose samples we copy.
+
+        Returns:
+            A shallow copy of obj_to_insert whose buffer_offset and
+            buffer_count attributes refer to the samples in our buffers.
+        """
+
+        n_pings = max(obj_to_insert.n_pings, 0)
+        buffer_index = obj_to_insert._get_buffer_index(np.arange(n_pings))
+        start = self._buffer_size
+        samples = self._reserve_samples(buffer_index.shape[0])
+
+        # Copy the samples.  Attributes that the object doesn't store are
+        # left at the fill value.
+        for name in samples:
+            if name in obj_to_insert._sample_buffers:
+                samples[name][:] = obj_to_insert._sample_buffers[name][
+                        buffer_index]
+
+        # Create the copy of the object that refers to our buffers.
+        new_obj = copy.copy(obj_to_insert)
+        new_obj.buffer_offset = obj_to_insert.buffer_offset.copy()
+        new_obj.buffer_count = obj_to_insert.buffer_count.copy()
+        counts = new_obj.buffer_count[0:n_pings].astype(np.int64)
+        new_obj.buffer_offset[0:n_pings] = start + np.cumsum(counts) - counts
+
+        return new_obj
 
 
     def __str__(self):
@@ -2152,11 +4782,14 @@ class RawData(PingData):
             msg = msg + "             data end time: " + str(
                 self.ping_time[n_pings-1]) + "\n"
             msg = msg + "           number of pings: " + str(n_pings) + "\n"
-            if self.store_power:
+            if self.ragged:
+                msg = msg + ("  sample buffer size (used): " +
+                             str(self._buffer_size) + "\n")
+            elif self.store_power:
                 n_pings,n_samples = self.power.shape
                 msg = msg + ("    power array dimensions: (" + str(n_pings) +
                              "," + str(n_samples) + ")\n")
-            if self.store_angles:
+            if self.store_angles and not self.ragged:
                 n_pings,n_samples = self.angles_alongship_e.shape
                 msg = msg + ("    angle array dimensions: (" + str(n_pings) +
                              "," + str(n_samples) + ")\n")
@@ -2172,9 +4805,22 @@ class ChannelMetadata(object):
     some metadata about the file. One of these is created for each channel for
     every .raw file read.
 
-    References to instances of these objects are stored in the RawData class.
+    References to instances of these objects are stored in the metadata_table
+    of the RawData class. Since there can be many of these objects, their
+    attributes are stored in slots.
     """
 
+    __slots__ = ['data_file', 'data_file_path', 'start_ping', 'end_ping',
+                 'start_time', 'end_time', 'survey_name', 'transect_name',
+                 'sounder_name', 'version', 'extended_configuration',
+                 'gpt_firmware_version', 'beam_type', 'frequency_hz', 'gain',
+                 'equivalent_beam_angle', 'beamwidth_alongship',
+                 'beamwidth_athwartship', 'angle_sensitivity_alongship',
+                 'angle_sensitivity_athwartship', 'angle_offset_alongship',
+                 'angle_offset_athwartship', 'pos_x', 'pos_y', 'pos_z',
+                 'dir_x', 'dir_y', 'dir_z', 'pulse_length_table', 'spare2',
+                 'gain_table', 'spare3', 'sa_correction_table', 'spare4']
+
     def __init__(self, file, config_datagram, survey_name, transect_name,
                  sounder_name, version, start_ping, start_time,
                  extended_configuration=None):
@@ -2245,6 +4891,29 @@ class ChannelMetadata(object):
         self.spare4 = config_datagram['spare4']
 
 
+    def __getstate__(self):
+        """Returns a dict of the attributes of the object.
+
+        Objects with slots don't have a __dict__ so this method is used when
+        pickling and saving the objects.
+        """
+
+        return dict((name, getattr(self, name)) for name in self.__slots__
+                    if hasattr(self, name))
+
+
+    def __setstate__(self, state):
+        """Sets the attributes of the object from a dict.
+
+        Args:
+            state (dict): A dict, keyed by attribute name, of the attribute
+                values.
+        """
+
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
 class CalibrationParameters(object):
     """
     The CalibrationParameters class contains parameters required for
@@ -2325,50 +4994,21 @@ class CalibrationParameters(object):
 
         # If we're not given specific indices, grab everything.
         if return_indices is None:
-            return_indices = np.arange(raw_data.ping_time.shape[0])
+            return_indices = np.arange(raw_data.n_pings)
 
         # Work through the calibration parameters and extract them from the
         # RawData object.
         for param_name in self._parms:
-            # Calibration parameters are found directly in the RawData
-            # object and they are in the ChannelMetadata objects.  If we
-            # don't find it directly in raw_data then we need to fish it out
-            # of the ChannelMetadata objects.
-            try:
-                # First check if this parameter is a direct property in
-                # raw_data.
-                raw_param = getattr(raw_data, param_name)
-                param_data = raw_param[return_indices].copy()
-            except:
-                # It is not a direct property so it must be in the
-                # ChannelMetadata object.  Create the return array.
-                param_data = np.empty((return_indices.shape[0]))
-                # Create a counter to use to index the return array. We can't
-                # use the index value from return_indices since these values
-                # may be re-ordered.
-                ret_idx = 0
-                # Then populate with the data found in the ChannelMetadata
-                # objects.
-
-                for idx in return_indices:
-                    # Dig out sa_correction from the table.
-                    if isinstance(raw_data.channel_metadata[idx],
-                                   ChannelMetadata):
-                        if param_name == 'sa_correction':
-                            sa_table = getattr(raw_data.channel_metadata[
-                                                   idx], 'sa_correction_table')
-                            pl_table = getattr(raw_data.channel_metadata[
-                                                   idx], 'pulse_length_table')
-                            param_data[ret_idx] = sa_table[np.where(
-                                np.isclose(pl_table, raw_data.pulse_length[
-                                    idx]))[0]][0]
-                        else:
-                            param_data[ret_idx] = getattr(
-                                self.channel_metadata[idx], param_name)
-                    else:
-                        param_data[ret_idx] = np.nan
-                    # Increment the index counter
-                    ret_idx += 1
+            # RawData._get_calibration_param returns the values stored in the
+            # RawData object when it isn't given a calibration object.  The
+            # values in the ChannelMetadata objects are gathered using the
+            # metadata table and sa_correction is looked up using the pulse
+            # length of each ping.  Attributes of the RawData object keep
+            # their storage type (i.e. sample_offset is a uint32) so we
+            # convert all of the values to float64 which is the scalar type
+            # _get_calibration_param accepts.
+            param_data = raw_data._get_calibration_param(None, param_name,
+                    return_indices, dtype='float64').astype(np.float64)
 
             # Check if we can collapse the vector - if all the values are the
             # same, we set the parameter to a scalar value.
@@ -2386,3 +5026,25 @@ class CalibrationParameters(object):
         """
         pass
 
+
+def _read_raw_file(args):
+    """Reads a single raw file in a worker process.
+
+    This function is used by EK60.read_raw when reading files in parallel.
+
+    Args:
+        args (tuple): A tuple containing the full path to the file and a dict
+            of the EK60 reading state properties.
+
+    Returns:
+        The EK60 object containing the data read from the file.
+    """
+
+    filename, read_state = args
+
+    # Create an EK60 object, set its reading state, and read the file.
+    reader = EK60()
+    reader.__dict__.update(read_state)
+    reader.read_raw(filename)
+
+    return reader
@@ -41,6 +41,7 @@ $Id$
 
 
 import datetime
+import numpy as np
 from pytz import utc as pytz_utc
 import logging
 
@@ -52,7 +53,10 @@ UTC_UNIX_EPOCH = datetime.datetime(1970, 1, 1, 0, 0, 0, tzinfo=pytz_utc)
 
 EPOCH_DELTA_SECONDS = (UTC_UNIX_EPOCH - UTC_NT_EPOCH).total_seconds()
 
-__all__ = ['nt_to_unix', 'unix_to_nt']
+#Number of microseconds between the NT and unix epochs
+EPOCH_DELTA_MICROSECONDS = int(EPOCH_DELTA_SECONDS) * 1000000
+
+__all__ = ['nt_to_unix', 'unix_to_nt', 'nt_to_datetime64']
 
 log = logging.getLogger(__name__)
 
@@ -89,6 +93,30 @@ def nt_to_unix(nt_timestamp_tuple, return_datetime=True):
         return sec_past_unix_epoch
 
 
+def nt_to_datetime64(nt_time):
+    '''
+    :param nt_time: 64bit NT timestamp(s) (count of 100ns intervals since the NT epoch)
+    :type nt_time: int or array of uint64
+
+    Returns a numpy datetime64[ms] array calculated from the 64bit NT timestamps.
+    This is a vectorized version of np.datetime64(nt_to_unix(...), '[ms]') and
+    follows the same steps:  the timestamp is converted to floating point
+    seconds, rounded to the nearest microsecond, and truncated to milliseconds.
+
+    >>> nt_time = (30196149 << 32) + 19496896
+    >>> assert nt_to_datetime64(nt_time) == np.datetime64('2011-12-23T20:54:03.963')
+    '''
+
+    sec_past_nt_epoch = np.asarray(nt_time, dtype='uint64').astype('float64') * 1.0e-7
+
+    whole_sec = np.floor(sec_past_nt_epoch)
+    microseconds = whole_sec.astype('int64') * 1000000 + \
+        np.round((sec_past_nt_epoch - whole_sec) * 1.0e6).astype('int64')
+    microseconds -= EPOCH_DELTA_MICROSECONDS
+
+    return (microseconds // 1000).astype('datetime64[ms]')
+
+
 def unix_to_nt(unix_timestamp):
     '''
     Given a date, return the 2-element tuple used for timekeeping with SIMRAD echosounders
@@ -0,0 +1,472 @@
+# coding=utf-8
+
+#     National Oceanic and Atmospheric Administration (NOAA)
+#     Alaskan Fisheries Science Center (AFSC)
+#     Resource Assessment and Conservation Engineering (RACE)
+#     Midwater Assessment and Conservation Engineering (MACE)
+
+#  THIS SOFTWARE AND ITS DOCUMENTATION ARE CONSIDERED TO BE IN THE PUBLIC DOMAIN
+#  AND THUS ARE AVAILABLE FOR UNRESTRICTED PUBLIC USE. THEY ARE FURNISHED "AS IS."
+#  THE AUTHORS, THE UNITED STATES GOVERNMENT, ITS INSTRUMENTALITIES, OFFICERS,
+#  EMPLOYEES, AND AGENTS MAKE NO WARRANTY, EXPRESS OR IMPLIED, AS TO THE USEFULNESS
+#  OF THE SOFTWARE AND DOCUMENTATION FOR ANY PURPOSE. THEY ASSUME NO RESPONSIBILITY
+#  (1) FOR THE USE OF THE SOFTWARE AND DOCUMENTATION; OR (2) TO PROVIDE TECHNICAL
+#  SUPPORT TO USERS.
+
+'''
+.. module:: echolab2.instruments.util.ek60_ingest
+
+    :synopsis:  Real-time ingest of SIMRAD EK60/ER60 datagrams from sockets
+
+    Provides the DatagramIngestServer class which receives datagrams over a
+    TCP or UDP socket and stores them in an EK60 object as they arrive, and
+    the replay_raw_file coroutine which sends the datagrams of a raw file to
+    a socket, optionally at the rate they were recorded.
+
+    Datagrams are framed the same way they are in raw files:
+
+        long dgram_size
+        char[4] type
+        (long lowDateField, long highDateField)
+        ... datagram data ...
+        long dgram_size
+
+    Sample data are stored in rolling (ring buffer) RawData objects so the
+    memory used is fixed.  Received datagrams are placed in a bounded queue
+    and parsed by a single consumer.  When the queue is full, TCP connections
+    stop reading from their socket which pushes back on the sender. UDP has
+    no flow control so datagrams that arrive when the queue is full are
+    dropped and counted.
+
+    This module requires Python 3.
+
+'''
+
+import asyncio
+import struct
+import logging
+import numpy as np
+from .ek60_raw_file import RawSimradFile, SimradEOF
+from . import parsers
+
+__all__ = ['DatagramIngestServer', 'replay_raw_file', 'parse_datagram',
+           'frame_datagram']
+
+log = logging.getLogger(__name__)
+
+#: The largest datagram accepted.  Larger sizes indicate a framing error.
+MAX_DATAGRAM_SIZE = 16 * 1024 * 1024
+
+#: The largest datagram that can be sent as a single UDP packet.
+MAX_UDP_SIZE = 65507
+
+
+def parse_datagram(raw_datagram):
+    '''
+    :param raw_datagram: the datagram type, timestamp and data (without the
+        leading and trailing size)
+    :type raw_datagram: bytes
+
+    Parses a datagram using the parser for its type.  Returns the parsed
+    datagram or None if the datagram type is unknown.
+    '''
+
+    dgram_type = bytes(raw_datagram[:3]).decode()
+    parser = RawSimradFile.DGRAM_TYPE_KEY.get(dgram_type, None)
+    if parser is None:
+        return None
+
+    return parser.from_string(raw_datagram)
+
+
+def frame_datagram(raw_datagram):
+    '''
+    :param raw_datagram: the datagram type, timestamp and data
+    :type raw_datagram: bytes
+
+    Returns the datagram with the leading and trailing datagram size added.
+    '''
+
+    return parsers._SimradDatagramParser.finalize_datagram(bytes(raw_datagram))
+
+
+def _unframe_datagram(packet):
+    '''
+    :param packet: a datagram with or without the leading and trailing size
+    :type packet: bytes
+
+    Returns the datagram without the leading and trailing size.  Used for
+    UDP packets which may or may not contain the datagram size.
+    '''
+
+    if len(packet) >= 24:
+        size = struct.unpack_from('=l', packet)[0]
+        if (size == len(packet) - 8 and
+                struct.unpack_from('=l', packet, size + 4)[0] == size):
+            return packet[4:size + 4]
+
+    return packet
+
+
+class _UDPIngestProtocol(asyncio.DatagramProtocol):
+    '''
+    Receives UDP packets and places the datagrams in the ingest queue.
+    '''
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server._enqueue_nowait(_unframe_datagram(data))
+
+    def error_received(self, exc):
+        log.warning('UDP ingest error: %s', exc)
+
+
+class DatagramIngestServer(object):
+    '''
+    Receives EK60 datagrams over a socket and stores them in an EK60 object.
+
+    :param ek60: the EK60 object the data are stored in. A new EK60 object is
+        created if None.
+    :type ek60: EK60.EK60
+
+    :param rolling_pings: the number of pings stored by each channel
+    :type rolling_pings: int
+
+    :param n_samples: the number of samples stored for each ping. Samples
+        beyond n_samples are dropped and shorter pings are padded, so pings
+        with different sample intervals or counts can share the buffers.
+    :type n_samples: int
+
+    :param max_queue: the maximum number of datagrams waiting to be stored
+    :type max_queue: int
+
+    :param max_nmea: the maximum number of NMEA datagrams kept
+    :type max_nmea: int
+
+    :param callback: a function that is called with the EK60 object and the
+        datagram after each datagram is stored
+    :type callback: callable
+
+    The EK60 object's read_* properties (channel_ids, frequencies,
+    start_sample, etc.) are applied to the received data.  Example::
+
+        server = DatagramIngestServer(rolling_pings=1000)
+        await server.start_tcp('127.0.0.1', 5000)
+        ...
+        Sv = server.ek60.get_raw_data(channel_number=1).get_Sv()
+        ...
+        await server.stop()
+    '''
+
+    def __init__(self, ek60=None, rolling_pings=1000, n_samples=1000,
+                 max_queue=1000, max_nmea=10000, callback=None):
+
+        if ek60 is None:
+            #  import here to avoid a circular import
+            from ..EK60 import EK60
+            ek60 = EK60()
+
+        self.ek60 = ek60
+        self.rolling_pings = rolling_pings
+        self.n_samples = n_samples
+        self.max_queue = max_queue
+        self.max_nmea = max_nmea
+        self.callback = callback
+
+        #  counters that can be used to monitor the server
+        self.n_received = 0
+        self.n_stored = 0
+        self.n_dropped = 0
+
+        self._queue = None
+        self._consumer = None
+        self._servers = []
+        self._transports = []
+        self._config_datagram = None
+
+
+    async def start_tcp(self, host, port):
+        '''
+        :param host: the address to listen on
+        :type host: str
+
+        :param port: the port to listen on
+        :type port: int
+
+        Starts accepting datagrams over TCP.  Returns the asyncio server.
+        '''
+
+        self._start_consumer()
+        server = await asyncio.start_server(self._handle_tcp, host, port)
+        self._servers.append(server)
+
+        return server
+
+
+    async def start_udp(self, host, port):
+        '''
+        :param host: the address to listen on
+        :type host: str
+
+        :param port: the port to listen on
+        :type port: int
+
+        Starts accepting datagrams over UDP.  Each UDP packet must contain a
+        single datagram.  Returns the asyncio transport.
+        '''
+
+        self._start_consumer()
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UDPIngestProtocol(self), local_addr=(host, port))
+        self._transports.append(transport)
+
+        return transport
+
+
+    async def stop(self, drain=True):
+        '''
+        :param drain: Set to True to store the queued datagrams before stopping
+        :type drain: bool
+
+        Stops accepting datagrams and stops the consumer.
+        '''
+
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        for transport in self._transports:
+            transport.close()
+        self._servers = []
+        self._transports = []
+
+        if self._consumer is not None:
+            if drain:
+                await self._queue.join()
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+
+
+    async def wait_idle(self):
+        '''
+        Waits until all of the queued datagrams have been stored.
+        '''
+
+        if self._queue is not None:
+            await self._queue.join()
+
+
+    def _start_consumer(self):
+        '''
+        Creates the queue and starts the consumer task if they don't exist.
+        '''
+
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if self._consumer is None:
+            self._consumer = asyncio.ensure_future(self._consume())
+
+
+    def _enqueue_nowait(self, raw_datagram):
+        '''
+        Adds a datagram to the queue, dropping it if the queue is full.
+        '''
+
+        self.n_received += 1
+        try:
+            self._queue.put_nowait(raw_datagram)
+        except asyncio.QueueFull:
+            self.n_dropped += 1
+
+
+    async def _handle_tcp(self, reader, writer):
+        '''
+        Reads framed datagrams from a TCP connection.  When the queue is full
+        we stop reading from the socket until there is space in the queue.
+        '''
+
+        peer = writer.get_extra_info('peername')
+        try:
+            while True:
+                size_bytes = await reader.readexactly(4)
+                dgram_size = struct.unpack('=l', size_bytes)[0]
+                if dgram_size < 16 or dgram_size > MAX_DATAGRAM_SIZE:
+                    log.warning('Invalid datagram size %d from %s. Closing ' +
+                                'connection.', dgram_size, peer)
+                    break
+
+                raw_datagram = await reader.readexactly(dgram_size)
+                if await reader.readexactly(4) != size_bytes:
+                    log.warning('Datagram failed size check from %s. ' +
+                                'Closing connection.', peer)
+                    break
+
+                self.n_received += 1
+                await self._queue.put(raw_datagram)
+
+        except asyncio.IncompleteReadError:
+            #  the connection was closed
+            pass
+        finally:
+            writer.close()
+
+
+    async def _consume(self):
+        '''
+        Parses the queued datagrams and stores them in the EK60 object.
+        '''
+
+        while True:
+            raw_datagram = await self._queue.get()
+            try:
+                self._store_datagram(raw_datagram)
+            except Exception as e:
+                log.warning('Unable to store datagram: %s', e)
+            finally:
+                self._queue.task_done()
+
+
+    def _store_datagram(self, raw_datagram):
+        '''
+        Parses a datagram and stores it in the EK60 object.
+        '''
+
+        datagram = parse_datagram(raw_datagram)
+        if datagram is None:
+            log.warning('Unknown datagram type %s', bytes(raw_datagram[:4]))
+            return
+
+        ek60 = self.ek60
+        if datagram['type'].startswith('CON'):
+            if datagram['type'] == 'CON1':
+                #  ME70 CON1 datagrams follow the CON0 datagram
+                if self._config_datagram is not None:
+                    self._configure(self._config_datagram, datagram)
+            else:
+                datagram['timestamp'] = \
+                        np.datetime64(datagram['timestamp'], '[ms]')
+                self._config_datagram = datagram
+                if ek60.start_time is None:
+                    ek60.start_time = datagram['timestamp']
+                self._configure(datagram, None)
+
+        elif self._config_datagram is None:
+            #  we can't store data until we know the channel configuration
+            self.n_dropped += 1
+            return
+
+        else:
+            ek60._process_datagram(datagram)
+
+            #  bottom detections are buffered by the EK60 object, merge them
+            #  now so they are available to the callback
+            if datagram['type'][:3] in ('BOT', 'DEP'):
+                ek60._merge_bottom_data()
+
+            #  limit the number of NMEA datagrams we keep
+            if ek60.nmea_data.n_raw > self.max_nmea * 1.25:
+                ek60.nmea_data.discard(ek60.nmea_data.n_raw - self.max_nmea)
+
+        self.n_stored += 1
+        if self.callback is not None:
+            self.callback(ek60, datagram)
+
+
+    def _configure(self, config_datagram, CON1_datagram):
+        '''
+        Configures the EK60 object's channels, creating rolling RawData
+        objects for new channels.
+        '''
+
+        self.ek60._configure_channels('%s:stream' % (
+                config_datagram['sounder_name']), config_datagram,
+                CON1_datagram, rolling=True, n_pings=self.rolling_pings,
+                n_samples=self.n_samples)
+
+
+async def replay_raw_file(filename, host, port, protocol='tcp', speed=1.0):
+    '''
+    :param filename: the raw file to replay
+    :type filename: str
+
+    :param host: the address to send the datagrams to
+    :type host: str
+
+    :param port: the port to send the datagrams to
+    :type port: int
+
+    :param protocol: 'tcp' or 'udp'
+    :type protocol: str
+
+    :param speed: the replay speed relative to the rate the datagrams were
+        recorded (i.e. 10 replays the file 10 times faster than real time).
+        Set to None or 0 to send the datagrams as fast as possible.
+    :type speed: float
+
+    Sends the datagrams in a raw file to a socket.  When using TCP the
+    sender waits when the receiver applies back-pressure.  Returns the number
+    of datagrams sent.
+    '''
+
+    protocol = protocol.lower()
+    if protocol not in ['tcp', 'udp']:
+        raise ValueError("protocol must be 'tcp' or 'udp'")
+
+    loop = asyncio.get_running_loop()
+    if protocol == 'tcp':
+        _, writer = await asyncio.open_connection(host, port)
+    else:
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(host, port))
+
+    n_sent = 0
+    start_nt_time = None
+    start_clock = None
+    try:
+        with RawSimradFile(filename, 'r', return_raw=True) as fid:
+            while True:
+                try:
+                    raw_datagram = fid.read(1)
+                except SimradEOF:
+                    break
+
+                #  wait until it is time to send this datagram
+                if speed:
+                    low_date, high_date = struct.unpack_from('=2L',
+                                                             raw_datagram, 4)
+                    nt_time = (high_date << 32) + low_date
+                    if start_nt_time is None:
+                        start_nt_time = nt_time
+                        start_clock = loop.time()
+                    send_time = start_clock + (nt_time - start_nt_time) / \
+                            (1e7 * speed)
+                    delay = send_time - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                framed_datagram = frame_datagram(raw_datagram)
+                if protocol == 'tcp':
+                    writer.write(framed_datagram)
+                    await writer.drain()
+                else:
+                    if len(framed_datagram) > MAX_UDP_SIZE:
+                        log.warning('Datagram too large to send over UDP ' +
+                                    '(%d bytes)', len(framed_datagram))
+                        continue
+                    transport.sendto(framed_datagram)
+                    #  yield to the event loop so we don't flood the socket
+                    await asyncio.sleep(0)
+                n_sent += 1
+    finally:
+        if protocol == 'tcp':
+            writer.close()
+        else:
+            transport.close()
+
+    return n_sent
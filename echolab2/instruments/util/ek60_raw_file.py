@@ -36,13 +36,26 @@ $Id$
 
 from io import BufferedReader, FileIO, SEEK_SET, SEEK_CUR, SEEK_END
 import struct
+import mmap
+import bisect
 import logging
+import numpy as np
 from . import parsers
+from .date_conversion import nt_to_datetime64
 
-__all__ = ['RawSimradFile']
+__all__ = ['RawSimradFile', 'MappedRawSimradFile', 'DGRAM_INDEX_DTYPE']
 
 log = logging.getLogger(__name__)
 
+#: numpy dtype of the datagram index returned by MappedRawSimradFile.get_index.
+#: channel and count are only set for RAW datagrams (-1 and 0 otherwise).
+DGRAM_INDEX_DTYPE = np.dtype([('offset', '<u8'),
+                              ('size', '<u4'),
+                              ('type', 'S4'),
+                              ('channel', '<i2'),
+                              ('nt_time', '<u8'),
+                              ('count', '<i4')])
+
 class SimradEOF(Exception):
 
     def __init__(self, message='EOF Reached!'):
@@ -119,6 +132,119 @@ class RawSimradFile(BufferedReader):
         self._total_dgram_count = None
         self._return_raw = return_raw
 
+        #  datagram filter - see set_filter
+        self._filter_active = False
+        self._filter_types = None
+        self._filter_channels = None
+        self._filter_start_time = None
+        self._filter_end_time = None
+        self._filter_callback = None
+
+        #  sample window passed to the RAW datagram parser - see set_sample_window
+        self._sample_window = None
+
+
+    def set_sample_window(self, start_sample=None, end_sample=None, power=True,
+                          angles=True):
+        '''
+        :param start_sample: the first sample of RAW datagrams to decode
+        :type start_sample: int
+
+        :param end_sample: the last sample of RAW datagrams to decode
+        :type end_sample: int
+
+        :param power: Set to False to skip decoding the power data
+        :type power: bool
+
+        :param angles: Set to False to skip decoding the angle data
+        :type angles: bool
+
+        Sets the window of samples decoded when RAW datagrams are parsed.  The
+        power and angle arrays of the parsed datagrams contain only the samples
+        in the window and the sample number of the first sample is returned in
+        the datagram's sample_offset.  Call with no arguments to decode all
+        samples.
+        '''
+
+        if start_sample is None and end_sample is None and power and angles:
+            self._sample_window = None
+        else:
+            self._sample_window = dict(start_sample=start_sample,
+                    end_sample=end_sample, power=power, angles=angles)
+
+
+    def set_filter(self, types=None, channels=None, start_time=None, end_time=None,
+                   skip_callback=None):
+        '''
+        :param types: the datagram types to read (i.e. ['RAW', 'NME']). Only the first
+            3 characters of the type are compared. None reads all types.
+        :type types: list
+
+        :param channels: the channel numbers of the RAW datagrams to read. None reads
+            all channels.
+        :type channels: list
+
+        :param start_time: datagrams with a timestamp before this time are skipped
+        :type start_time: numpy.datetime64
+
+        :param end_time: datagrams with a timestamp after this time are skipped
+        :type end_time: numpy.datetime64
+
+        :param skip_callback: called with the datagram header of each datagram
+            within the time bounds that is skipped because of its type or channel.
+            The header includes the datagram timestamp as a datetime64[ms] object.
+        :type skip_callback: callable
+
+        Sets the datagram filter applied by read. Datagrams that do not match the
+        filter are skipped using the datagram size after reading only the datagram
+        header (and the channel number of RAW datagrams). Their data are not read or
+        parsed. CON datagrams are never skipped. peek is not affected by the filter.
+        Call with no arguments to remove the filter.
+        '''
+
+        self._filter_types = None if types is None else set([t[:3] for t in types])
+        self._filter_channels = None if channels is None else set(channels)
+        self._filter_start_time = start_time
+        self._filter_end_time = end_time
+        self._filter_callback = skip_callback
+        self._filter_active = (types is not None or channels is not None or
+                start_time is not None or end_time is not None)
+
+
+    def _is_filtered(self, header):
+        '''
+        :param header: the datagram header returned by peek
+        :type header: dict
+
+        Returns True if the datagram should be skipped.
+        '''
+
+        dgram_type = header['type'][:3]
+        if dgram_type == 'CON':
+            return False
+
+        #  check the time bounds - datagrams outside the bounds are simply dropped
+        if (self._filter_start_time is not None or self._filter_end_time is not None or
+                self._filter_callback is not None):
+            header['timestamp'] = nt_to_datetime64((header['high_date'] << 32) +
+                    header['low_date'])
+            if (self._filter_start_time is not None and
+                    header['timestamp'] < self._filter_start_time):
+                return True
+            if (self._filter_end_time is not None and
+                    header['timestamp'] > self._filter_end_time):
+                return True
+
+        #  check the type and channel
+        if ((self._filter_types is not None and dgram_type not in self._filter_types) or
+                (self._filter_channels is not None and dgram_type == 'RAW' and
+                header['channel'] not in self._filter_channels)):
+            if self._filter_callback is not None:
+                self._filter_callback(header)
+            return True
+
+        return False
+
 
     def _seek_bytes(self, bytes_, whence=0):
         '''
@@ -233,23 +359,28 @@ class RawSimradFile(BufferedReader):
         Returns the datagram as a raw string
         '''
 
-        old_file_pos = self._tell_bytes()
-
         #  We've come across one instance where the timestamp is (0L, 0L)
-        #  So... now we check every single datagram for this and skip if needed
+        #  So... now we check every single datagram for this and skip if needed.
+        #  Datagrams that don't match the filter are skipped here too. We loop
+        #  instead of recursing since the filter can skip many datagrams in a row.
+        while True:
+            old_file_pos = self._tell_bytes()
 
-        try:
-            # _, dgram_type, (low_date, high_date) = self.peek()[:3]
-            header = self.peek()
+            try:
+                # _, dgram_type, (low_date, high_date) = self.peek()[:3]
+                header = self.peek()
 
-        except DatagramReadError as e:
-            e.message = 'Short read while getting raw file datagram header'
-            raise e
+            except DatagramReadError as e:
+                e.message = 'Short read while getting raw file datagram header'
+                raise e
 
-        if (header['low_date'], header['high_date']) == (0, 0):
-            log.warning('Skipping %s datagram w/ timestamp of (0, 0) at %sL:%d', header['type'], str(self._tell_bytes()), self.tell())
-            self.skip()
-            return self._read_next_dgram()
+            if (header['low_date'], header['high_date']) == (0, 0):
+                log.warning('Skipping %s datagram w/ timestamp of (0, 0) at %sL:%d', header['type'], str(self._tell_bytes()), self.tell())
+                self.skip()
+            elif self._filter_active and self._is_filtered(header):
+                self.skip()
+            else:
+                break
 
         # _ = self._read_dgram_size()
         self._seek_bytes(4, SEEK_CUR)
@@ -309,15 +440,17 @@ class RawSimradFile(BufferedReader):
         Returns a formated datagram object using the data in raw_datagram_string
         '''
 
-        dgram_type = raw_datagram_string[:3].decode()
+        dgram_type = bytes(raw_datagram_string[:3]).decode()
         try:
             parser = self.DGRAM_TYPE_KEY[dgram_type]
         except KeyError:
             #raise KeyError('Unknown datagram type %s, valid types: %s' % (str(dgram_type), str(self.DGRAM_TYPE_KEY.keys())))
             return raw_datagram_string
 
-
-        nice_dgram = parser.from_string(raw_datagram_string)
+        if self._sample_window is not None and dgram_type == 'RAW':
+            nice_dgram = parser.from_string(raw_datagram_string, **self._sample_window)
+        else:
+            nice_dgram = parser.from_string(raw_datagram_string)
         return nice_dgram
 
 
@@ -653,3 +786,340 @@ class RawSimradFile(BufferedReader):
         self._current_dgram_offset = 0
         self._total_dgram_count = None
         self._seek_bytes(0, SEEK_SET)
+
+
+
+class MappedRawSimradFile(RawSimradFile):
+    '''
+    A memory mapped version of RawSimradFile. The file is mapped into memory
+    and scanned once when opened to locate the datagram boundaries. Datagrams
+    are then handed to the parsers as memoryview slices of the map so the
+    datagram bodies are never copied into intermediate bytes objects.
+
+    The datagram level interface (read, peek, skip, skip_back, seek, tell)
+    is the same as RawSimradFile so the two classes can be used
+    interchangeably.
+
+    When return_raw is True, datagrams are returned as memoryview objects
+    that reference the map. These views must be released before the file
+    can be closed cleanly.
+
+    If a datagram index (see get_index) is passed when the file is opened
+    the datagram boundaries are taken from the index and the file is not
+    scanned.
+    '''
+
+    def __init__(self, name, mode='rb', closefd=True, return_raw=False, buffer_size=1024*1024,
+                 index=None):
+
+        RawSimradFile.__init__(self, name, mode=mode, closefd=closefd,
+                return_raw=return_raw, buffer_size=buffer_size)
+
+        #  map the file - mmap will not map an empty file so we check for that
+        BufferedReader.seek(self, 0, SEEK_END)
+        self._file_size = BufferedReader.tell(self)
+        BufferedReader.seek(self, 0, SEEK_SET)
+
+        if self._file_size > 0:
+            self._mm = mmap.mmap(self.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mm)
+        else:
+            self._mm = None
+            self._view = None
+
+        #  build the datagram offset and size lists from the index if we
+        #  have one, otherwise scan the file
+        if index is not None:
+            self._dgram_offsets = index['offset'].tolist()
+            self._dgram_sizes = index['size'].tolist()
+        else:
+            self._dgram_offsets = []
+            self._dgram_sizes = []
+            self._scan_datagrams()
+
+
+    def _scan_datagrams(self):
+        '''
+        Makes a single pass through the mapped file recording the byte offset
+        and size of each valid datagram. Datagrams that fail the size check
+        are skipped and the scan resumes at the next recognized datagram type.
+        '''
+
+        #  build a list of the datagram type tags we can resync on
+        type_tags = [key.encode() for key in self.DGRAM_TYPE_KEY.keys()]
+
+        mm = self._mm
+        file_size = self._file_size
+        pos = 0
+
+        #  the smallest valid datagram is the leading size, 16 bytes of
+        #  header and the trailing size
+        while pos + 24 <= file_size:
+            dgram_size = struct.unpack_from('=l', mm, pos)[0]
+            end_pos = pos + dgram_size + 8
+
+            #  check that the datagram is valid
+            if (dgram_size >= 16 and end_pos <= file_size and
+                    struct.unpack_from('=l', mm, end_pos - 4)[0] == dgram_size):
+                self._dgram_offsets.append(pos)
+                self._dgram_sizes.append(dgram_size)
+                pos = end_pos
+                continue
+
+            #  this datagram is bad - find the next datagram type tag
+            log.warning('Invalid datagram @ %dL: size: %d.  Attempting to find next valid datagram...',
+                pos, dgram_size)
+            next_tags = [mm.find(tag, pos + 5) for tag in type_tags]
+            next_tags = [tag_pos for tag_pos in next_tags if tag_pos >= 0]
+            if not next_tags:
+                log.warning('No valid datagrams found after %dL', pos)
+                break
+
+            #  the datagram starts 4 bytes before the type tag
+            new_pos = min(next_tags) - 4
+            log.warning('Skipped ahead %d bytes', new_pos - pos)
+            pos = new_pos
+
+
+    def _dgram_header(self, dgram_index):
+        '''
+        Returns the header of the datagram at the specified datagram offset
+        '''
+
+        offset = self._dgram_offsets[dgram_index]
+        dgram_size, dgram_type, low_date, high_date = \
+            struct.unpack_from('=l4s2L', self._mm, offset)
+        header = dict(size=dgram_size, type=dgram_type.decode(),
+                low_date=low_date, high_date=high_date)
+
+        if header['type'].startswith('RAW'):
+            header['channel'] = struct.unpack_from('h', self._mm, offset + 16)[0]
+
+        return header
+
+
+    def get_index(self):
+        '''
+        Returns a numpy structured array (dtype DGRAM_INDEX_DTYPE) containing
+        the byte offset, size, type, channel, NT timestamp and sample count
+        of every datagram in the file.  The header fields are extracted from
+        the map for all datagrams at once.
+        '''
+
+        n_dgrams = len(self._dgram_offsets)
+        index = np.zeros(n_dgrams, dtype=DGRAM_INDEX_DTYPE)
+        if n_dgrams == 0:
+            return index
+
+        index['offset'] = self._dgram_offsets
+        index['size'] = self._dgram_sizes
+        index['channel'] = -1
+
+        #  create a byte array view of the map and an array of offsets to the
+        #  datagram headers (after the leading size)
+        buf = np.frombuffer(self._mm, dtype='uint8')
+        hdr = index['offset'].astype('int64') + 4
+
+        #  extract the type and NT timestamp from the 12 byte headers
+        hdr_bytes = buf[hdr[:, np.newaxis] + np.arange(12)]
+        index['type'] = hdr_bytes[:, 0:4].copy().view('S4').ravel()
+        index['nt_time'] = hdr_bytes[:, 4:12].copy().view('<u8').ravel()
+
+        #  extract the channel number and sample count from RAW datagrams
+        is_raw = np.char.startswith(index['type'], b'RAW') & (index['size'] >= 84)
+        if np.any(is_raw):
+            raw_hdr = hdr[is_raw]
+            index['channel'][is_raw] = buf[raw_hdr[:, np.newaxis] +
+                    np.arange(12, 14)].copy().view('<i2').ravel()
+            index['count'][is_raw] = buf[raw_hdr[:, np.newaxis] +
+                    np.arange(80, 84)].copy().view('<i4').ravel()
+
+        #  release our view of the map
+        del buf
+
+        return index
+
+
+    def read_sample_datagrams(self, offsets):
+        '''
+        :param offsets: byte offsets of RAW datagrams (i.e. from the index)
+        :type offsets: array of int
+
+        Reads the RAW datagrams at the specified byte offsets in bulk.  Returns
+        a dict of arrays (see parsers.SimradRawParser.from_buffer).  The file
+        position is not changed.
+        '''
+
+        offsets = np.asarray(offsets, dtype='int64') + 4
+
+        return self.DGRAM_TYPE_KEY['RAW'].from_buffer(self._mm, offsets)
+
+
+    def select_datagrams(self, dgram_numbers):
+        '''
+        :param dgram_numbers: datagram numbers (file positions) to keep
+        :type dgram_numbers: list or array of int
+
+        Restricts the datagrams that will be returned to the datagrams at the
+        specified positions.  Datagram numbers are relative to the start of
+        the file and after this call the file is positioned at the first
+        selected datagram.
+        '''
+
+        self._dgram_offsets = [self._dgram_offsets[k] for k in dgram_numbers]
+        self._dgram_sizes = [self._dgram_sizes[k] for k in dgram_numbers]
+        self._current_dgram_offset = 0
+        self._total_dgram_count = None
+
+
+    def _seek_bytes(self, bytes_, whence=0):
+        '''
+        :param bytes_: byte offset
+        :type bytes_: int
+
+        :param whence:
+
+        Seeks the mapped file by bytes.  Since the position within the mapped
+        file is tracked by datagram, the position is moved to the first
+        datagram at or after the requested byte offset.
+        '''
+
+        if whence == SEEK_SET:
+            pos = bytes_
+        elif whence == SEEK_CUR:
+            pos = self._tell_bytes() + bytes_
+        elif whence == SEEK_END:
+            pos = self._file_size + bytes_
+        else:
+            raise ValueError('Illegal value for \'whence\' (%s), use 0 (beginning), 1 (current), or 2 (end)' % (str(whence)))
+
+        self._current_dgram_offset = bisect.bisect_left(self._dgram_offsets, pos)
+
+
+    def _tell_bytes(self):
+        '''
+        Returns the byte offset of the current datagram in the mapped file.
+        '''
+
+        if self._current_dgram_offset < len(self._dgram_offsets):
+            return self._dgram_offsets[self._current_dgram_offset]
+        else:
+            return self._file_size
+
+
+    def _read_bytes(self, k):
+        '''
+        Reads raw bytes from the mapped file at the current position
+        '''
+
+        pos = self._tell_bytes()
+        return self._mm[pos:pos + k] if self._mm is not None else b''
+
+
+    def _read_next_dgram(self):
+        '''
+        Returns the next datagram from the mapped file.  The datagram is
+        passed to the parser as a memoryview slice of the map.
+        '''
+
+        n_dgrams = len(self._dgram_offsets)
+
+        while self._current_dgram_offset < n_dgrams:
+            header = self._dgram_header(self._current_dgram_offset)
+
+            #  skip datagrams with a timestamp of (0, 0)
+            if (header['low_date'], header['high_date']) == (0, 0):
+                log.warning('Skipping %s datagram w/ timestamp of (0, 0) at %sL:%d', header['type'],
+                    str(self._tell_bytes()), self.tell())
+                self._current_dgram_offset += 1
+                continue
+
+            #  skip datagrams that don't match the filter
+            if self._filter_active and self._is_filtered(header):
+                self._current_dgram_offset += 1
+                continue
+
+            offset = self._dgram_offsets[self._current_dgram_offset] + 4
+            raw_dgram = self._view[offset:offset + header['size']]
+            self._current_dgram_offset += 1
+
+            if self._return_raw:
+                return raw_dgram
+            else:
+                return self._convert_raw_datagram(raw_dgram)
+
+        raise SimradEOF()
+
+
+    def _set_total_dgram_count(self):
+        '''
+        Stores the number of datagrams found when the file was scanned in
+        self._total_dgram_count
+
+        :raises: ValueError if self._total_dgram_count is not None (it has been set before)
+        '''
+        if self._total_dgram_count is not None:
+            raise ValueError('self._total_dgram_count has already been set.  Call .reset() first if you really want to recount')
+
+        self._total_dgram_count = len(self._dgram_offsets)
+
+
+    def at_eof(self):
+
+        return self._current_dgram_offset >= len(self._dgram_offsets)
+
+
+    def peek(self):
+        '''
+        Returns the header of the next datagram in the file.
+
+        :returns: dict(size, type, low_date, high_date) with the additional
+            channel key for RAW datagrams
+        '''
+
+        if self.at_eof():
+            raise SimradEOF()
+
+        return self._dgram_header(self._current_dgram_offset)
+
+
+    def skip(self):
+        '''
+        Skips forward to the next datagram without reading the contents of the current one
+        '''
+
+        if self.at_eof():
+            raise SimradEOF()
+
+        self._current_dgram_offset += 1
+
+
+    def skip_back(self):
+        '''
+        Skips backwards to the previous datagram without reading it's contents
+        '''
+
+        if self._current_dgram_offset == 0:
+            raise DatagramReadError('Already at start of file', (None, None),
+                file_pos=(self._tell_bytes(), self.tell()))
+
+        self._current_dgram_offset -= 1
+
+
+    def close(self):
+        '''
+        Releases the memory map and closes the underlying file.
+        '''
+
+        if getattr(self, '_mm', None) is not None:
+            try:
+                self._view.release()
+                self._mm.close()
+            except BufferError:
+                #  datagrams returned as raw memoryviews are still referencing
+                #  the map.  It will be closed when they are released.
+                log.debug('Memory map still referenced, deferring close')
+            self._view = None
+            self._mm = None
+
+        RawSimradFile.close(self)
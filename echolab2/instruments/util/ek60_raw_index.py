@@ -0,0 +1,155 @@
+# coding=utf-8
+
+#     National Oceanic and Atmospheric Administration (NOAA)
+#     Alaskan Fisheries Science Center (AFSC)
+#     Resource Assessment and Conservation Engineering (RACE)
+#     Midwater Assessment and Conservation Engineering (MACE)
+
+#  THIS SOFTWARE AND ITS DOCUMENTATION ARE CONSIDERED TO BE IN THE PUBLIC DOMAIN
+#  AND THUS ARE AVAILABLE FOR UNRESTRICTED PUBLIC USE. THEY ARE FURNISHED "AS IS."
+#  THE AUTHORS, THE UNITED STATES GOVERNMENT, ITS INSTRUMENTALITIES, OFFICERS,
+#  EMPLOYEES, AND AGENTS MAKE NO WARRANTY, EXPRESS OR IMPLIED, AS TO THE USEFULNESS
+#  OF THE SOFTWARE AND DOCUMENTATION FOR ANY PURPOSE. THEY ASSUME NO RESPONSIBILITY
+#  (1) FOR THE USE OF THE SOFTWARE AND DOCUMENTATION; OR (2) TO PROVIDE TECHNICAL
+#  SUPPORT TO USERS.
+
+'''
+.. module:: echolab2.instruments.util.ek60_raw_index
+
+    :synopsis:  Datagram index files for SIMRAD EK60/ER60 raw files
+
+    Provides functions to build, save and load datagram indexes for raw
+    files.  An index contains the byte offset, size, type, channel, NT
+    timestamp and sample count of every datagram in a file (see
+    ek60_raw_file.DGRAM_INDEX_DTYPE) and is stored in a sidecar file
+    alongside the raw file (i.e. D20110101-T000000.raw.idx).  The size and
+    modification time of the raw file are stored with the index and an index
+    that does not match its raw file is rebuilt.
+
+'''
+
+import os
+import logging
+import numpy as np
+from .ek60_raw_file import MappedRawSimradFile, DGRAM_INDEX_DTYPE
+
+__all__ = ['get_index', 'build_index', 'load_index', 'save_index',
+           'index_filename']
+
+log = logging.getLogger(__name__)
+
+#: Extension appended to the raw file name to create the index file name
+INDEX_EXTENSION = '.idx'
+
+#: Version of the index file format
+INDEX_VERSION = 1
+
+
+def index_filename(raw_filename):
+    '''
+    :param raw_filename: full path to the raw file
+    :type raw_filename: str
+
+    Returns the full path to the index file of the specified raw file.
+    '''
+
+    return raw_filename + INDEX_EXTENSION
+
+
+def build_index(raw_filename):
+    '''
+    :param raw_filename: full path to the raw file
+    :type raw_filename: str
+
+    Scans the raw file and returns its datagram index.
+    '''
+
+    with MappedRawSimradFile(raw_filename, 'r') as fid:
+        index = fid.get_index()
+
+    return index
+
+
+def save_index(raw_filename, index):
+    '''
+    :param raw_filename: full path to the raw file
+    :type raw_filename: str
+
+    :param index: the datagram index of the raw file
+    :type index: numpy structured array
+
+    Writes the index to the raw file's index file.  Returns True if the index
+    was written and False if the index file could not be written (i.e. the
+    raw file is on a read-only file system).
+    '''
+
+    file_stat = os.stat(raw_filename)
+
+    try:
+        #  pass a file object to savez so it doesn't append .npz to our name
+        with open(index_filename(raw_filename), 'wb') as idx_fid:
+            np.savez(idx_fid, index=index, version=INDEX_VERSION,
+                     file_size=file_stat.st_size, file_mtime=file_stat.st_mtime)
+    except (IOError, OSError) as e:
+        log.warning('Unable to write index file for %s: %s', raw_filename, e)
+        return False
+
+    return True
+
+
+def load_index(raw_filename):
+    '''
+    :param raw_filename: full path to the raw file
+    :type raw_filename: str
+
+    Reads the raw file's index file and returns the index.  None is returned
+    if the index file does not exist, cannot be read, or does not match the
+    current size and modification time of the raw file.
+    '''
+
+    idx_filename = index_filename(raw_filename)
+    if not os.path.isfile(idx_filename):
+        return None
+
+    file_stat = os.stat(raw_filename)
+
+    try:
+        with np.load(idx_filename) as idx_data:
+            if (int(idx_data['version']) != INDEX_VERSION or
+                    int(idx_data['file_size']) != file_stat.st_size or
+                    float(idx_data['file_mtime']) != file_stat.st_mtime):
+                log.info('Index file %s is out of date', idx_filename)
+                return None
+            index = idx_data['index']
+    except Exception as e:
+        log.warning('Unable to read index file %s: %s', idx_filename, e)
+        return None
+
+    if index.dtype != DGRAM_INDEX_DTYPE:
+        log.warning('Index file %s has an unexpected format', idx_filename)
+        return None
+
+    return index
+
+
+def get_index(raw_filename, save=True):
+    '''
+    :param raw_filename: full path to the raw file
+    :type raw_filename: str
+
+    :param save: Set to True to write the index file if it had to be built
+    :type save: bool
+
+    Returns the datagram index of the raw file.  The index is loaded from the
+    index file if it is valid, otherwise the index is built and optionally
+    saved.
+    '''
+
+    index = load_index(raw_filename)
+
+    if index is None:
+        index = build_index(raw_filename)
+        if save:
+            save_index(raw_filename, index)
+
+    return index
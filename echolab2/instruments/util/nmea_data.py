@@ -14,11 +14,16 @@
 #  SUPPORT TO USERS.
 
 
+from collections import OrderedDict
+
 import numpy as np
+from ...ping_data import grow_capacity, compact_array
 #  NOTE: echolab2 uses a modified version of pynmea2 that includes some
 #  minor bug fixes and differences of opinion in terms of the data types
 #  returned when parsing certain datagrams.
 from . import pynmea2
+from . import nmea_decoder
+from .vincenty import vincenty_inverse_array, NAUTICAL_MILES_PER_KILOMETER
 
 class nmea_data(object):
     '''
@@ -28,6 +33,9 @@ class nmea_data(object):
 
     CHUNK_SIZE = 500
 
+    #  the default maximum size in bytes of the field cache
+    CACHE_MAX_BYTES = 64 * 1024 * 1024
+
     def __init__(self):
 
         # Create a counter to keep track of the number of datagrams, This is
@@ -45,6 +53,30 @@ class nmea_data(object):
         self.talker_ids = []
         self.message_ids = []
 
+        # _datagram_ids maps the time of the stored datagrams to the sets of
+        # the talker IDs and message IDs of the datagrams with that time. It
+        # is used to detect duplicate datagrams and is created from the data
+        # arrays when it is first needed.
+        self._datagram_ids = None
+
+        # _time_index is the index of the stored datagrams sorted by time and
+        # _sorted_times are the sorted times. They are created when they are
+        # first needed and discarded by clear_cache when datagrams are added
+        # or removed.
+        self._time_index = None
+        self._sorted_times = None
+
+        # cache_max_bytes is the maximum size in bytes of the field cache. The
+        # field cache stores the time ordered indices, times and decoded field
+        # values of the datagrams of a message type and talker so the
+        # datagrams are only decoded once when the same data are requested
+        # repeatedly, for example when interpolating data for each channel.
+        # The least recently used entries are discarded when the cache
+        # exceeds this size. Setting it to 0 disables the cache.
+        self.cache_max_bytes = nmea_data.CACHE_MAX_BYTES
+        self._field_cache = OrderedDict()
+        self._field_cache_bytes = 0
+
         # nmea_definitions define the NMEA message(s) and pynmea2.NMEASentence
         # attributes of those messages that the NMEA interpolation routine
         # will process. These definitions can also be used to define meta-types
@@ -60,7 +92,7 @@ class nmea_data(object):
         self.nmea_definitions['RMC'] = {'message': ['RMC'],
                                         'fields': ['latitude', 'longitude']}
         self.nmea_definitions['HDT'] = {'message': ['HDT'],
-                                        'fields': ['heading_true']}
+                                        'fields': ['heading']}
         self.nmea_definitions['VTG'] = {'message': ['VTG'],
                                         'fields': ['true_track',
                                                    'spd_over_grnd_kts']}
@@ -107,23 +139,25 @@ class nmea_data(object):
 
             #  check if we're allowing duplicates and if this is one. We need
             #  to do this since .out files can contain duplicate NMEA data.
-            if (not allow_duplicates):
-                dup_idx = (self.nmea_times == time)
-                if (np.any(dup_idx)):
-                    #  We have a time match - check the talker and message id
-                    my_talker = self.talkers[dup_idx]
-                    my_message = self.messages[dup_idx]
-                    if ((header[0:2] in my_talker) and (header[2:6] in my_message)):
-                        #  this is the same - discard it
-                        return
+            #  A datagram is a duplicate if the datagrams with the same time
+            #  include its talker ID and its message ID.
+            datagram_ids = self._get_datagram_ids()
+            time_key = self._time_keys(np.array([time]))[0]
+            if (not allow_duplicates) and self._is_duplicate(datagram_ids,
+                    time_key, header[0:2], header[2:6]):
+                #  this is the same - discard it
+                return
+            self._add_datagram_ids(datagram_ids, [time_key], [header[0:2]],
+                                   [header[2:6]])
 
             # Increment datagram counter.
             self.n_raw += 1
 
             # Check if we need to resize our arrays. If so, resize arrays.
             if self.n_raw > self.nmea_times.shape[0]:
-                self._resize_arrays(self.nmea_times.shape[0] +
-                                    nmea_data.CHUNK_SIZE)
+                self._resize_arrays(grow_capacity(self.nmea_times.shape[0],
+                                                  self.n_raw,
+                                                  nmea_data.CHUNK_SIZE))
 
             # Add this datagram and associated data to our data arrays and
             # then Add the talker and message ID to our list of unique talkers
@@ -138,6 +172,79 @@ class nmea_data(object):
             if not header[2:5] in self.message_ids:
                 self.message_ids.append(header[2:5])
 
+            # The time index and cached fields no longer include all of our
+            # datagrams.
+            self.clear_cache()
+
+
+    def append(self, nmea_object, allow_duplicates=False):
+        """
+        Append the datagrams from another nmea_data object to this object.
+
+        append adds the datagrams contained in the provided nmea_data object
+        to this object as if they were added one by one using add_datagram,
+        except that the datagrams of nmea_object are not checked against
+        each other for duplicates.
+
+        Args:
+            nmea_object (nmea_data): The nmea_data object whose datagrams
+                will be added to this object.
+            allow_duplicates (bool): When False, NMEA datagrams that share
+                the same timestamp, talker ID, and message ID with an
+                existing datagram will be discarded.
+
+        """
+
+        n_new = nmea_object.n_raw
+        if n_new == 0:
+            return
+
+        new_times = nmea_object.nmea_times[0:n_new]
+        new_talkers = nmea_object.talkers[0:n_new]
+        new_messages = nmea_object.messages[0:n_new]
+
+        # Determine which datagrams to keep.  The new datagrams are only
+        # checked against the datagrams we already have.
+        datagram_ids = self._get_datagram_ids()
+        time_keys = self._time_keys(new_times)
+        talkers = [str(talker) for talker in new_talkers]
+        messages = [str(message) for message in new_messages]
+        if allow_duplicates:
+            keep = np.ones(n_new, dtype=bool)
+        else:
+            keep = np.array([not self._is_duplicate(datagram_ids, time_key,
+                             talker, message) for time_key, talker, message
+                             in zip(time_keys, talkers, messages)],
+                            dtype=bool)
+        self._add_datagram_ids(datagram_ids, time_keys, talkers, messages)
+        n_keep = np.count_nonzero(keep)
+
+        # Check if we need to resize our arrays. If so, resize arrays.
+        n_raw = self.n_raw + n_keep
+        if n_raw > self.nmea_times.shape[0]:
+            self._resize_arrays(grow_capacity(self.nmea_times.shape[0], n_raw,
+                                              nmea_data.CHUNK_SIZE))
+
+        # Add the datagrams and associated data to our data arrays.
+        self.raw_datagrams[self.n_raw:n_raw] = \
+                nmea_object.raw_datagrams[0:n_new][keep]
+        self.nmea_times[self.n_raw:n_raw] = new_times[keep]
+        self.talkers[self.n_raw:n_raw] = new_talkers[keep]
+        self.messages[self.n_raw:n_raw] = new_messages[keep]
+        self.n_raw = n_raw
+
+        # Update our lists of unique talkers and messages.
+        for talker_id in nmea_object.talker_ids:
+            if not talker_id in self.talker_ids:
+                self.talker_ids.append(talker_id)
+        for message_id in nmea_object.message_ids:
+            if not message_id in self.message_ids:
+                self.message_ids.append(message_id)
+
+        # The time index and cached fields no longer include all of our
+        # datagrams.
+        self.clear_cache()
+
 
     def get_datagrams(self, message_types, start_time=None, end_time=None,
                       talker_id=None, return_raw=False, return_fields=None):
@@ -199,20 +306,29 @@ class nmea_data(object):
         for msg_type in message_types:
             msg_type = msg_type.upper()
 
-            # Get the index for all datagrams within the time span.
-            return_idxs = self._get_indices(start_time, end_time,
-                    time_order=True)
+            if return_fields and not return_raw:
+                # Get the cached fields of this message type and talker and
+                # determine the range of the datagrams within the time span.
+                field_data = self._get_field_data(msg_type, talker_id,
+                                                  return_fields)
+                return_idxs = self._get_time_span(field_data['time'],
+                                                  start_time, end_time)
+                n_messages = return_idxs.stop - return_idxs.start
+            else:
+                # Get the index for all datagrams within the time span.
+                return_idxs = self._get_indices(start_time, end_time,
+                        time_order=True)
 
-            # Build a mask based on the message type and talker ID.
-            keep_mask = self.messages[return_idxs] == msg_type
-            if talker_id:
-                keep_mask &= self.talkers[return_idxs] == talker_id
+                # Build a mask based on the message type and talker ID.
+                keep_mask = self.messages[return_idxs] == msg_type
+                if talker_id:
+                    keep_mask &= self.talkers[return_idxs] == talker_id
 
-            # Apply the mask.
-            return_idxs = return_idxs[keep_mask]
+                # Apply the mask.
+                return_idxs = return_idxs[keep_mask]
 
-            # Determine the number of items we're returning.
-            n_messages = return_idxs.shape[0]
+                # Determine the number of items we're returning.
+                n_messages = return_idxs.shape[0]
 
             #  Create the return dict
             if return_raw:
@@ -229,45 +345,15 @@ class nmea_data(object):
                 if n_messages > 0:
                     if return_fields:
                         # We are only returning the fields specified in
-                        # return_fields. First build the return dictionary by
-                        # adding time values.
+                        # return_fields. Copy the times and field values of
+                        # the datagrams within the time span from the field
+                        # cache so the cached arrays can't be modified.
                         datagrams[msg_type] = {
-                                           'time': self.nmea_times[return_idxs]}
-
-                        #  TODO: Work out setting the numpy type based on the
-                        #  data type of the parsed field. Parse one message
-                        # so we can get the data types of the fields
-                        # msg_data = pynmea2.parse(self.raw_datagrams[
-                        #                          return_idxs[0]], check=False)
-                        #  Need an if block here to set the numpy type based on
-                        # the python type.
-
-                        # Set up fields to hold data.
+                                'time': field_data['time'][return_idxs].copy()}
                         for field in return_fields:
-                            datagrams[msg_type][field] = np.empty(n_messages)
-                                                                  # , dtype=??)
-
-                        # Then parse the datagrams.
-                        for idx in range(n_messages):
-                            try:
-                                # Parse this datagram...
-                                msg_data = pynmea2.parse(self.raw_datagrams
-                                                         [return_idxs[idx]],
-                                                         check=False)
-                                # and extract the requested fields.
-                                for field in return_fields:
-                                    try:
-                                        datagrams[msg_type][field][idx] = (
-                                                       getattr(msg_data, field))
-                                    except:
-                                        # Unknown field - return NaN for
-                                        # this field.
-                                        datagrams[msg_type][field][idx] = np.nan
-                            except:
-                                # Unable to parse datagram - return NaNs for
-                                # all fields.
-                                for field in return_fields:
-                                    datagrams[msg_type][field][idx] = np.nan
+                            datagrams[msg_type][field] = (
+                                    field_data['fields'][field][
+                                    return_idxs].copy())
 
                     else:
                         # We are returning all of the fields. Create an array
@@ -417,6 +503,123 @@ class nmea_data(object):
         #     p_data.add_attribute(field, out_data[field])
 
 
+    def get_distance(self, p_data, start_time=None, end_time=None,
+                     talker_id=None, source=None):
+        """
+        Return the cumulative along-track distance at the ping times.
+
+        get_distance computes the cumulative distance in nautical miles
+        traveled from the first NMEA position fix within the time span and
+        interpolates it to the ping times of the provided processed_data
+        object. The distances between consecutive position fixes are computed
+        on the WGS 84 ellipsoid using vincenty_inverse_array.
+
+        The positions are taken from the first of the 'position' message
+        types (GGA, RMC, GLL) with at least 2 valid fixes. Fixes with NaN
+        positions or positions of 0, 0 (which is what an empty position field
+        is parsed as) are not used. If there aren't enough position fixes the
+        distance is derived from the VLW trip distance ('distance'
+        meta-type). Decreases of the trip distance, when the log was reset,
+        are ignored.
+
+        Args:
+            p_data (ProcessedData): A processed data object that contains the
+                ping_time vector to interpolate to.
+            start_time (datetime or datetime64): The start of the time span of
+                the NMEA data to use. If None, the earliest time.
+            end_time (datetime or datetime64): The end of the time span of the
+                NMEA data to use. If None, the latest time.
+            talker_id (str): Set to a specific talker ID to only use the data
+                of that talker. When set to None, the talker ID is ignored.
+            source (str): Set to 'position' to only use the position fixes or
+                'distance' to only use the VLW trip distance. When set to None,
+                positions are used if available and the trip distance
+                otherwise.
+
+        Returns: A dictionary containing the cumulative distance in nmi at
+            each ping (distance_nmi) and the ping times (ping_time). The
+            distances of pings outside of the span of the NMEA data are NaN.
+
+        """
+
+        if source not in (None, 'position', 'distance'):
+            raise ValueError("The distance source must be None, 'position' "
+                             "or 'distance'.")
+
+        nmea_times = None
+        distance = None
+
+        if source in (None, 'position'):
+            # Get the position fixes of each position message type.
+            position = self.nmea_definitions['position']
+            message_data = self.get_datagrams(position['message'],
+                    start_time=start_time, end_time=end_time,
+                    talker_id=talker_id, return_fields=['latitude',
+                                                        'longitude'])
+
+            # Use the first message type that has at least 2 valid fixes.
+            for msg_type in position['message']:
+                if message_data[msg_type]['time'] is None:
+                    continue
+                lat = message_data[msg_type]['latitude']
+                lon = message_data[msg_type]['longitude']
+                valid = np.isfinite(lat) & np.isfinite(lon)
+                valid &= (lat != 0) | (lon != 0)
+                if np.count_nonzero(valid) < 2:
+                    continue
+                lat = lat[valid]
+                lon = lon[valid]
+
+                # Compute the distances between the fixes in nmi and sum them.
+                # Distances that fail to converge, which only happens for
+                # nearly antipodal points, are ignored.
+                segments = vincenty_inverse_array(lat[:-1], lon[:-1], lat[1:],
+                                                  lon[1:])
+                segments *= NAUTICAL_MILES_PER_KILOMETER
+                segments[np.isnan(segments)] = 0
+                nmea_times = message_data[msg_type]['time'][valid]
+                distance = np.concatenate(([0.0], np.cumsum(segments)))
+                break
+
+        if distance is None and source in (None, 'distance'):
+            # Derive the distance from the VLW trip distance.
+            log = self.nmea_definitions['distance']
+            field = log['fields'][0]
+            message_data = self.get_datagrams(log['message'],
+                    start_time=start_time, end_time=end_time,
+                    talker_id=talker_id, return_fields=[field])
+
+            for msg_type in log['message']:
+                if message_data[msg_type]['time'] is None:
+                    continue
+                trip = message_data[msg_type][field]
+                valid = np.isfinite(trip)
+                if np.count_nonzero(valid) < 2:
+                    continue
+                trip = trip[valid]
+
+                # Sum the increases of the trip distance so resets of the log
+                # don't decrease the distance.
+                segments = np.diff(trip)
+                segments[segments < 0] = 0
+                nmea_times = message_data[msg_type]['time'][valid]
+                distance = np.concatenate(([0.0], np.cumsum(segments)))
+                break
+
+        # Interpolate the distance to the ping times.
+        out_data = {}
+        if distance is None:
+            out_data['distance_nmi'] = np.full(p_data.ping_time.shape[0],
+                                               np.nan)
+        else:
+            out_data['distance_nmi'] = np.interp(p_data.ping_time.astype('d'),
+                    nmea_times.astype('d'), distance, left=np.nan,
+                    right=np.nan)
+        out_data['ping_time'] = p_data.ping_time.copy()
+
+        return out_data
+
+
     def _get_indices(self, start_time, end_time, time_order=True):
         """
         Return index of data contained in speciofied time range.
@@ -438,25 +641,17 @@ class nmea_data(object):
 
         """
 
-        #  Ensure that we have times to work with.
-        if start_time is None:
-            start_time = np.min(self.nmea_times)
-        if end_time is None:
-            end_time = np.max(self.nmea_times)
+        # Get the time ordered index of our datagrams and find the range of
+        # the sorted times within the time span.
+        time_index, sorted_times = self._get_time_index()
+        span = self._get_time_span(sorted_times, start_time, end_time)
 
-        # Sort time index if returning time ordered indexes.
+        # Return the indices that are included in the specified range, in
+        # the order they were added if time ordered indexes weren't requested.
         if time_order:
-            primary_index = self.nmea_times.argsort()
+            return time_index[span]
         else:
-            primary_index = self.nmea_times
-
-        # Determine the indices of the data that fall within the time span
-        # provided.
-        mask = self.nmea_times[primary_index] >= start_time
-        mask = np.logical_and(mask, self.nmea_times[primary_index] <= end_time)
-
-        #  and return the indices that are included in the specified range
-        return primary_index[mask]
+            return np.sort(time_index[span])
 
 
     def _resize_arrays(self, new_size):
@@ -464,7 +659,10 @@ class nmea_data(object):
         Resize arrays if needed to hold more data.
 
         _resize_arrays expands our data arrays and is called when said arrays
-        are filled with data and more data need to be added.
+        are filled with data and more data need to be added. The arrays are
+        grown using grow_capacity so the cost of copying the data is
+        amortized. When the arrays are shrunk, they are set to views of the
+        existing arrays.
 
         Args:
             new_size (int): New size for arrays, Since these are all 1d
@@ -472,10 +670,306 @@ class nmea_data(object):
 
         """
 
-        self.nmea_times = np.resize(self.nmea_times,(new_size))
-        self.raw_datagrams = np.resize(self.raw_datagrams,(new_size))
-        self.talkers = np.resize(self.talkers,(new_size))
-        self.messages = np.resize(self.messages,(new_size))
+        if new_size <= self.nmea_times.shape[0]:
+            self.nmea_times = self.nmea_times[0:new_size]
+            self.raw_datagrams = self.raw_datagrams[0:new_size]
+            self.talkers = self.talkers[0:new_size]
+            self.messages = self.messages[0:new_size]
+        else:
+            self.nmea_times = np.resize(self.nmea_times,(new_size))
+            self.raw_datagrams = np.resize(self.raw_datagrams,(new_size))
+            self.talkers = np.resize(self.talkers,(new_size))
+            self.messages = np.resize(self.messages,(new_size))
+
+
+    def discard(self, n_datagrams):
+        """
+        Remove the oldest datagrams from this object.
+
+        discard removes the first n_datagrams datagrams that were added to
+        the object. It is used to limit the size of the object when NMEA
+        data are continuously added.
+
+        Args:
+            n_datagrams (int): The number of datagrams to remove.
+
+        """
+
+        n_datagrams = min(max(int(n_datagrams), 0), self.n_raw)
+        if n_datagrams == 0:
+            return
+
+        # Shift the remaining datagrams to the start of our arrays.
+        n_keep = self.n_raw - n_datagrams
+        self.raw_datagrams[0:n_keep] = self.raw_datagrams[n_datagrams:self.n_raw]
+        self.nmea_times[0:n_keep] = self.nmea_times[n_datagrams:self.n_raw]
+        self.talkers[0:n_keep] = self.talkers[n_datagrams:self.n_raw]
+        self.messages[0:n_keep] = self.messages[n_datagrams:self.n_raw]
+
+        # Clear the unused elements so stale datagrams aren't matched as
+        # duplicates.
+        self.raw_datagrams[n_keep:self.n_raw] = None
+        self.nmea_times[n_keep:self.n_raw] = np.datetime64('NaT')
+        self.talkers[n_keep:self.n_raw] = ''
+        self.messages[n_keep:self.n_raw] = ''
+
+        self.n_raw = n_keep
+
+        # The duplicate IDs, time index and cached fields are re-created from
+        # the remaining datagrams when they are next needed.
+        self._datagram_ids = None
+        self.clear_cache()
+
+
+    def clear_cache(self):
+        """
+        Discard the time index and the cached field values.
+
+        clear_cache is called when datagrams are added or removed. The time
+        index and field values are re-created when they are next needed.
+
+        """
+
+        self._time_index = None
+        self._sorted_times = None
+        if getattr(self, '_field_cache', None) is None:
+            self._field_cache = OrderedDict()
+        self._field_cache.clear()
+        self._field_cache_bytes = 0
+
+
+    def _get_time_index(self):
+        """
+        Return the time ordered index of our datagrams and the sorted times.
+
+        The index is created if it doesn't exist. A stable sort is used so
+        datagrams with the same time stay in the order they were added.
+        Datagrams without a valid time are not included.
+
+        Returns: The time ordered index of the datagrams and the array of
+            sorted datagram times.
+
+        """
+
+        if getattr(self, '_time_index', None) is None:
+            times = self.nmea_times[0:self.n_raw]
+            time_index = np.argsort(times, kind='mergesort')
+
+            # NaT sorts to the end so we can drop invalid times from the end.
+            n_valid = self.n_raw - np.count_nonzero(np.isnat(times))
+            self._time_index = time_index[0:n_valid]
+            self._sorted_times = times[self._time_index]
+
+        return self._time_index, self._sorted_times
+
+
+    @staticmethod
+    def _get_time_span(sorted_times, start_time, end_time):
+        """
+        Return the slice of the sorted times within a time span.
+
+        Args:
+            sorted_times (array): A sorted array of datetime64 times.
+            start_time (datetime or datetime64): The start of the time span
+                or None to start with the first time.
+            end_time (datetime or datetime64): The end of the time span or
+                None to end with the last time.
+
+        Returns: A slice of the sorted times that are greater than or equal
+            to start_time and less than or equal to end_time.
+
+        """
+
+        start = 0
+        end = sorted_times.shape[0]
+        if start_time is not None:
+            start = np.searchsorted(sorted_times, np.datetime64(start_time),
+                                    side='left')
+        if end_time is not None:
+            end = np.searchsorted(sorted_times, np.datetime64(end_time),
+                                  side='right')
+
+        return slice(int(start), int(max(start, end)))
+
+
+    def _get_field_data(self, message_type, talker_id, fields):
+        """
+        Return the times and decoded fields of a message type and talker.
+
+        The time ordered indices and times of the datagrams of the message
+        type and talker and the decoded field values are taken from the field
+        cache. Entries for message types and talkers that aren't cached are
+        created, and fields that aren't cached are decoded and added to the
+        entry. Entries are then added to the cache and the least recently
+        used entries are removed until the cache is within cache_max_bytes.
+
+        Args:
+            message_type (str): The uppercase NMEA message type.
+            talker_id (str): The uppercase talker ID or None for all talkers.
+            fields (list): List of the pynmea2 attribute names to decode.
+
+        Returns: A dictionary containing the time ordered datagram index
+            (index), the datagram times (time), the number of bytes of data
+            in the entry (n_bytes) and a dictionary of the decoded field
+            values keyed by field name (fields).
+
+        """
+
+        # Objects pickled before the field cache was added don't have it.
+        if getattr(self, '_field_cache', None) is None:
+            self.clear_cache()
+        cache_max_bytes = getattr(self, 'cache_max_bytes',
+                                  nmea_data.CACHE_MAX_BYTES)
+
+        # Remove the entry from the cache if it exists. It is added back to
+        # the end of the cache to mark it as the most recently used entry.
+        cache_key = (message_type, talker_id)
+        field_data = self._field_cache.pop(cache_key, None)
+        if field_data is not None:
+            self._field_cache_bytes -= field_data['n_bytes']
+        else:
+            # Get the time ordered index of this message type and talker.
+            time_index = self._get_time_index()[0]
+            keep_mask = self.messages[time_index] == message_type
+            if talker_id:
+                keep_mask &= self.talkers[time_index] == talker_id
+            time_index = time_index[keep_mask]
+            field_data = {'index': time_index,
+                          'time': self.nmea_times[time_index],
+                          'fields': {}}
+            field_data['n_bytes'] = (time_index.nbytes +
+                                     field_data['time'].nbytes)
+
+        # Decode the fields that we don't have. nmea_decoder extracts the
+        # fields of the common message types directly from the sentence text
+        # and falls back to parsing with pynmea2 for anything it can't
+        # handle. Fields that can't be decoded are NaN.
+        new_fields = []
+        for field in fields:
+            if field not in field_data['fields'] and field not in new_fields:
+                new_fields.append(field)
+        if new_fields:
+            columns = nmea_decoder.decode_fields(
+                    self.raw_datagrams[field_data['index']], message_type,
+                    new_fields)
+            for field in new_fields:
+                field_data['fields'][field] = columns[field]
+                field_data['n_bytes'] += columns[field].nbytes
+
+        # Remove the least recently used entries until this entry fits and
+        # add it to the cache. Entries larger than the cache aren't cached.
+        if field_data['n_bytes'] <= cache_max_bytes:
+            while (self._field_cache and self._field_cache_bytes +
+                   field_data['n_bytes'] > cache_max_bytes):
+                old_key = next(iter(self._field_cache))
+                old_field_data = self._field_cache.pop(old_key)
+                self._field_cache_bytes -= old_field_data['n_bytes']
+            self._field_cache[cache_key] = field_data
+            self._field_cache_bytes += field_data['n_bytes']
+
+        return field_data
+
+
+    def _get_datagram_ids(self):
+        """
+        Return the talker IDs and message IDs of our datagrams by time.
+
+        The dict is created from the data arrays if it doesn't exist.
+
+        Returns: A dict keyed by the time of the stored datagrams (see
+            _time_keys) containing a tuple of the set of talker IDs and the
+            set of message IDs of the datagrams with that time.
+
+        """
+
+        if getattr(self, '_datagram_ids', None) is None:
+            self._datagram_ids = {}
+            self._add_datagram_ids(self._datagram_ids,
+                    self._time_keys(self.nmea_times[0:self.n_raw]),
+                    [str(talker) for talker in self.talkers[0:self.n_raw]],
+                    [str(message) for message in self.messages[0:self.n_raw]])
+
+        return self._datagram_ids
+
+
+    @staticmethod
+    def _add_datagram_ids(datagram_ids, time_keys, talkers, messages):
+        """
+        Add the talker IDs and message IDs of datagrams to a datagram ID dict.
+
+        Args:
+            datagram_ids (dict): The dict returned by _get_datagram_ids.
+            time_keys (list): The datagram times returned by _time_keys.
+            talkers (list): The talker IDs of the datagrams.
+            messages (list): The message IDs of the datagrams.
+
+        """
+
+        for time_key, talker, message in zip(time_keys, talkers, messages):
+            ids = datagram_ids.get(time_key)
+            if ids is None:
+                ids = datagram_ids[time_key] = (set(), set())
+            ids[0].add(talker)
+            ids[1].add(message)
+
+
+    @staticmethod
+    def _is_duplicate(datagram_ids, time_key, talker, message):
+        """
+        Return True if a datagram is a duplicate of our datagrams.
+
+        As when the times were searched, the talker ID and message ID are
+        checked separately against all of the datagrams with the same time.
+
+        Args:
+            datagram_ids (dict): The dict returned by _get_datagram_ids.
+            time_key (int): The datagram time returned by _time_keys.
+            talker (str): The talker ID of the datagram.
+            message (str): The message ID of the datagram.
+
+        Returns: True if the datagram is a duplicate.
+
+        """
+
+        ids = datagram_ids.get(time_key)
+        return ids is not None and talker in ids[0] and message in ids[1]
+
+
+    @staticmethod
+    def _time_keys(times):
+        """
+        Return the keys used to look up datagrams by time.
+
+        The times are converted to integer numbers of milliseconds so times
+        with different units compare equal.
+
+        Args:
+            times (array): Array of datagram timestamps.
+
+        Returns: A list of the times as integers.
+
+        """
+
+        return times.astype('datetime64[ms]').astype(np.int64).tolist()
+
+
+    def __getstate__(self):
+        """
+        Return the state of the object for pickling.
+
+        The duplicate IDs, time index and field cache are not pickled, they
+        are re-created from the data arrays when they are needed.
+
+        """
+
+        state = self.__dict__.copy()
+        state['_datagram_ids'] = None
+        state['_time_index'] = None
+        state['_sorted_times'] = None
+        state['_field_cache'] = OrderedDict()
+        state['_field_cache_bytes'] = 0
+
+        return state
 
 
     def trim(self):
@@ -483,10 +977,16 @@ class nmea_data(object):
         Trim arrays to proper size after all data are added.
 
         trim is called when one is done adding data to the object. It
-        removes empty elements of the data arrays.
+        removes empty elements of the data arrays. The trimmed arrays are
+        copied if they are views of much larger arrays so the unused capacity
+        can be freed.
         """
 
         self._resize_arrays(self.n_raw)
+        self.nmea_times = compact_array(self.nmea_times)
+        self.raw_datagrams = compact_array(self.raw_datagrams)
+        self.talkers = compact_array(self.talkers)
+        self.messages = compact_array(self.messages)
 
 
     def __str__(self):
@@ -0,0 +1,430 @@
+# coding=utf-8
+
+#     National Oceanic and Atmospheric Administration (NOAA)
+#     Alaskan Fisheries Science Center (AFSC)
+#     Resource Assessment and Conservation Engineering (RACE)
+#     Midwater Assessment and Conservation Engineering (MACE)
+
+#  THIS SOFTWARE AND ITS DOCUMENTATION ARE CONSIDERED TO BE IN THE PUBLIC DOMAIN
+#  AND THUS ARE AVAILABLE FOR UNRESTRICTED PUBLIC USE. THEY ARE FURNISHED "AS IS."
+#  THE AUTHORS, THE UNITED STATES GOVERNMENT, ITS INSTRUMENTALITIES, OFFICERS,
+#  EMPLOYEES, AND AGENTS MAKE NO WARRANTY, EXPRESS OR IMPLIED, AS TO THE USEFULNESS
+#  OF THE SOFTWARE AND DOCUMENTATION FOR ANY PURPOSE. THEY ASSUME NO RESPONSIBILITY
+#  (1) FOR THE USE OF THE SOFTWARE AND DOCUMENTATION; OR (2) TO PROVIDE TECHNICAL
+#  SUPPORT TO USERS.
+
+'''
+.. module:: echolab2.instruments.util.nmea_decoder
+
+Vectorized decoding of numeric NMEA sentence fields.
+
+decode_fields returns the values of pynmea2 sentence attributes of a set of
+NMEA sentences as numpy arrays. Instead of parsing each sentence with pynmea2,
+the sentences are copied into a 2d array of bytes and the checksums, field
+boundaries and field values are computed for all of the sentences at once.
+The field layouts are taken from the pynmea2 sentence classes so the values
+are the same as the values returned by parsing the sentences with pynmea2.
+
+Talker sentences (GGA, GLL, RMC, HDT, VTG, VLW, ...) and the PASHR attitude
+sentence (message ID SHR) are decoded. Sentences that don't have the usual
+form, for example sentences without a checksum, are parsed with pynmea2.
+'''
+
+import numpy as np
+#  NOTE: echolab2 uses a modified version of pynmea2 that includes some
+#  minor bug fixes and differences of opinion in terms of the data types
+#  returned when parsing certain datagrams.
+from . import pynmea2
+from .pynmea2.nmea_utils import LatLonFix
+from .pynmea2.types.proprietary.ash import ASHRATT
+
+
+#  the number of sentences that are decoded at a time. This limits the size
+#  of the temporary arrays.
+BLOCK_SIZE = 65536
+
+#  the attributes of parsed sentences that are not sentence fields
+_SENTENCE_ATTRIBUTES = ['talker', 'sentence_type', 'data', 'manufacturer',
+                        'subtype']
+
+#  the byte values of the characters we test for
+_DOLLAR = ord('$')
+_COMMA = ord(',')
+_STAR = ord('*')
+_DOT = ord('.')
+
+#  lookup tables of the characters matched by the pynmea2 sentence regex
+_IS_WORD = np.zeros(256, dtype=bool)
+for _c in bytearray(b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+                    b'0123456789_'):
+    _IS_WORD[_c] = True
+_IS_SPACE = np.zeros(256, dtype=bool)
+for _c in bytearray(b' \t\n\r\x0b\x0c'):
+    _IS_SPACE[_c] = True
+_IS_DIGIT = np.zeros(256, dtype=bool)
+for _c in bytearray(b'0123456789'):
+    _IS_DIGIT[_c] = True
+_HEX_VALUE = np.full(256, -1, dtype=np.int16)
+for _c in bytearray(b'0123456789ABCDEF'):
+    _HEX_VALUE[_c] = int(chr(_c), 16)
+    _HEX_VALUE[ord(chr(_c).lower())] = int(chr(_c), 16)
+_TO_UPPER = np.arange(256, dtype=np.uint8)
+_TO_UPPER[ord('a'):ord('z') + 1] -= 32
+
+
+def decode_fields(sentences, message_type, fields):
+    """
+    Return numpy arrays of the values of fields of NMEA sentences.
+
+    The values are the values of the pynmea2 attributes of the parsed
+    sentences converted to floats. Values of fields that are empty, can't be
+    converted or aren't attributes of the sentences, and all of the values of
+    sentences that can't be parsed, are NaN.
+
+    Args:
+        sentences (array): Array of NMEA sentence strings of the same message
+            type.
+        message_type (str): The NMEA message ID of the sentences, e.g. 'GGA'.
+        fields (list): List of the pynmea2 attribute names to return.
+
+    Returns: Dictionary, keyed by field name, of numpy float arrays of the
+        field values.
+
+    """
+
+    sentences = np.asarray(sentences, dtype=object)
+    n_sentences = sentences.shape[0]
+    columns = {}
+    for field in fields:
+        columns[field] = np.full(n_sentences, np.nan)
+
+    # If we don't know the layout of the fields, parse the sentences.
+    layout = _get_layout(message_type.upper(), fields)
+    if layout is None:
+        _parse_sentences(sentences, np.arange(n_sentences), fields, columns)
+        return columns
+
+    for start in range(0, n_sentences, BLOCK_SIZE):
+        _decode_block(sentences[start:start + BLOCK_SIZE], start, layout,
+                      fields, columns)
+
+    return columns
+
+
+def _get_layout(message_type, fields):
+    """
+    Return the layout of the fields of a message type.
+
+    Args:
+        message_type (str): The upper case NMEA message ID.
+        fields (list): List of the pynmea2 attribute names.
+
+    Returns: A dictionary describing the sentence header and the location
+        of each field, or None if the fields can't be decoded.
+
+    """
+
+    if message_type == 'SHR':
+        #  SHR data are in proprietary PASHR sentences.  pynmea2 parses these
+        #  as ASHRATT sentences when the timestamp field has the form
+        #  hhmmss.sss and the data start after '$PASH'.
+        cls = ASHRATT
+        header = b'PASH'
+        data_start = 5
+    else:
+        cls = pynmea2.TalkerSentence.sentence_types.get(message_type)
+        if cls is None:
+            return None
+        header = message_type.encode('ascii')
+        data_start = 7
+
+    field_specs = {}
+    for field in fields:
+        if field in cls.name_to_idx:
+            #  fields without a type or with a float type are returned by
+            #  pynmea2 as strings or floats that are converted to floats.
+            definition = cls.fields[cls.name_to_idx[field]]
+            if len(definition) >= 3 and definition[2] is not float:
+                return None
+            field_specs[field] = ('value', cls.name_to_idx[field])
+        elif field in ['latitude', 'longitude'] and issubclass(cls, LatLonFix):
+            if field == 'latitude':
+                field_specs[field] = ('degrees', cls.name_to_idx['lat'],
+                                      cls.name_to_idx['lat_dir'], b'N', b'S')
+            else:
+                field_specs[field] = ('degrees', cls.name_to_idx['lon'],
+                                      cls.name_to_idx['lon_dir'], b'E', b'W')
+        elif hasattr(cls, field) or field in _SENTENCE_ATTRIBUTES:
+            #  some other attribute we can't decode.
+            return None
+        else:
+            #  this isn't an attribute of the sentences.
+            field_specs[field] = ('nan',)
+
+    return {'header': header, 'data_start': data_start,
+            'proprietary': message_type == 'SHR', 'fields': field_specs}
+
+
+def _decode_block(sentences, offset, layout, fields, columns):
+    """
+    Decode the fields of a block of sentences.
+
+    Args:
+        sentences (array): Array of the NMEA sentence strings of the block.
+        offset (int): The index of the first sentence of the block in the
+            column arrays.
+        layout (dict): The field layout returned by _get_layout.
+        fields (list): List of the pynmea2 attribute names.
+        columns (dict): Dictionary of the column arrays that are filled.
+
+    """
+
+    n_sentences = sentences.shape[0]
+    if n_sentences == 0:
+        return
+
+    #  copy the sentences into a 2d array of bytes. Sentences that aren't
+    #  ASCII strings are parsed.
+    try:
+        sentence_bytes = np.array(sentences.tolist(), dtype='S')
+    except (UnicodeError, TypeError, ValueError):
+        _parse_sentences(sentences, np.arange(n_sentences) + offset, fields,
+                         columns)
+        return
+    width = sentence_bytes.dtype.itemsize
+    if width <= layout['data_start']:
+        _parse_sentences(sentences, np.arange(n_sentences) + offset, fields,
+                         columns)
+        return
+    chars = sentence_bytes.view(np.uint8).reshape(n_sentences, width)
+    lengths = np.char.str_len(sentence_bytes)
+    column = np.arange(width)
+    rows = np.arange(n_sentences)
+
+    #  check the sentence header, e.g. '$GPGGA,' for talker sentences or
+    #  '$PASH' for PASHR sentences.
+    header = np.frombuffer(layout['header'], dtype=np.uint8)
+    data_start = layout['data_start']
+    is_simple = (chars[:, 0] == _DOLLAR) & (lengths > data_start)
+    if layout['proprietary']:
+        is_simple &= np.all(_TO_UPPER[chars[:, 1:5]] == header, axis=1)
+    else:
+        is_simple &= np.all(_IS_WORD[chars[:, 1:6]], axis=1)
+        is_simple &= np.all(_TO_UPPER[chars[:, 3:6]] == header, axis=1)
+        is_simple &= (chars[:, 1] != ord('P')) & (chars[:, 1] != ord('p'))
+        is_simple &= chars[:, 6] == _COMMA
+
+    #  find the checksum which must be the only '*', followed by 2 hex
+    #  digits and optional whitespace.
+    is_star = chars == _STAR
+    is_simple &= np.count_nonzero(is_star, axis=1) == 1
+    star = np.argmax(is_star, axis=1)
+    is_simple &= (star >= data_start) & (star + 3 <= lengths)
+    high = _HEX_VALUE[chars[rows, np.minimum(star + 1, width - 1)]]
+    low = _HEX_VALUE[chars[rows, np.minimum(star + 2, width - 1)]]
+    is_simple &= (high >= 0) & (low >= 0)
+    checksum = high * 16 + low
+    trailing = (column >= (star + 3)[:, np.newaxis]) & \
+            (column < lengths[:, np.newaxis])
+    is_simple &= ~np.any(trailing & ~_IS_SPACE[chars], axis=1)
+
+    #  find the commas that separate the fields.
+    is_comma = (chars == _COMMA) & (column >= data_start) & \
+            (column < star[:, np.newaxis])
+    n_commas = np.count_nonzero(is_comma, axis=1)
+    comma = np.nonzero(is_comma)[1]
+    first_comma = np.cumsum(n_commas) - n_commas
+
+    def comma_position(comma_index):
+        #  return the position of a comma in each sentence.
+        if comma.shape[0] == 0:
+            return star
+        return comma[np.clip(comma_index, 0, comma.shape[0] - 1)]
+
+    def get_field(index):
+        #  return the field as an array of bytes. Missing fields are empty.
+        if index == 0:
+            start = np.full(n_sentences, data_start)
+        else:
+            start = comma_position(first_comma + index - 1) + 1
+        end = np.where(n_commas > index, comma_position(first_comma + index),
+                       star)
+        exists = n_commas >= index
+        return _gather(chars, np.where(exists, start, star),
+                       np.where(exists, end, star))
+
+    #  PASHR sentences are only ASHRATT sentences if the timestamp has the
+    #  form hhmmss.sss
+    if layout['proprietary']:
+        timestamp = get_field(1)
+        timestamp_chars = timestamp.view(np.uint8).reshape(n_sentences, -1)
+        if timestamp_chars.shape[1] >= 10:
+            is_simple &= ((np.char.str_len(timestamp) == 10) &
+                    np.all(_IS_DIGIT[timestamp_chars[:, 0:6]], axis=1) &
+                    (timestamp_chars[:, 6] == _DOT) &
+                    np.all(_IS_DIGIT[timestamp_chars[:, 7:10]], axis=1))
+        else:
+            is_simple[:] = False
+
+    #  compute the checksums of the simple sentences. The checksum is the
+    #  xor of the characters between the '$' and the '*'. Sentences with a
+    #  bad checksum can't be parsed so their values are NaN.
+    running_xor = np.bitwise_xor.accumulate(chars, axis=1)
+    is_valid = is_simple & ((running_xor[rows, np.maximum(star - 1, 0)] ^
+                             chars[:, 0]) == checksum)
+
+    #  decode the fields.
+    for field in fields:
+        spec = layout['fields'][field]
+        if spec[0] == 'value':
+            values = _to_float(get_field(spec[1]))
+        elif spec[0] == 'degrees':
+            values, is_plain = _to_degrees(get_field(spec[1]),
+                                           get_field(spec[2]), spec[3],
+                                           spec[4])
+            #  coordinates with unexpected characters are parsed.
+            is_simple &= is_plain | ~is_valid
+        else:
+            values = np.full(n_sentences, np.nan)
+        values[~is_valid] = np.nan
+        columns[field][offset:offset + n_sentences] = values
+
+    #  parse the sentences that aren't simple.
+    not_simple = np.nonzero(~is_simple)[0]
+    if not_simple.shape[0] > 0:
+        _parse_sentences(sentences[not_simple], not_simple + offset, fields,
+                         columns)
+
+
+def _gather(chars, start, end):
+    """
+    Return the characters between start and end of each row of an array.
+
+    Args:
+        chars (array): 2d array of characters.
+        start (array): Array of the index of the first character of each row.
+        end (array): Array of the index after the last character of each row.
+
+    Returns: Numpy array of byte strings.
+
+    """
+
+    length = np.maximum(end - start, 0)
+    width = max(int(length.max()), 1)
+    index = start[:, np.newaxis] + np.arange(width)
+    values = chars[np.arange(chars.shape[0])[:, np.newaxis],
+                   np.minimum(index, chars.shape[1] - 1)]
+    values[np.arange(width) >= length[:, np.newaxis]] = 0
+
+    return np.ascontiguousarray(values).view('S%d' % width)[:, 0]
+
+
+def _to_float(values):
+    """
+    Convert an array of byte strings to floats.
+
+    The strings are converted the same way Python's float converts them and
+    empty strings and strings that can't be converted are NaN.
+
+    Args:
+        values (array): Numpy array of byte strings.
+
+    Returns: Numpy float array.
+
+    """
+
+    values = np.where(values == b'', b'nan', values)
+    try:
+        return values.astype(np.float64)
+    except ValueError:
+        #  at least one value isn't a number - convert them one at a time.
+        floats = np.empty(values.shape[0])
+        for idx, value in enumerate(values):
+            try:
+                floats[idx] = float(value)
+            except ValueError:
+                floats[idx] = np.nan
+        return floats
+
+
+def _to_degrees(values, directions, positive, negative):
+    """
+    Convert degree/minute coordinates to signed decimal degrees.
+
+    The conversion is the same as the pynmea2 LatLonFix conversion. Empty
+    and '0' coordinates are 0 and coordinates that don't have the form
+    dddmm.mmmm are NaN. The sign is set by the direction and coordinates
+    with a direction that isn't positive or negative are 0.
+
+    Args:
+        values (array): Numpy array of the byte string coordinates.
+        directions (array): Numpy array of the byte string directions.
+        positive (bytes): The direction of positive coordinates.
+        negative (bytes): The direction of negative coordinates.
+
+    Returns: A tuple containing the numpy float array of the degrees and a
+        boolean array that is False for coordinates that contain characters
+        other than digits and '.'. The values of these coordinates aren't
+        set.
+
+    """
+
+    n_values = values.shape[0]
+    chars = values.view(np.uint8).reshape(n_values, -1)
+    lengths = np.char.str_len(values)
+    column = np.arange(chars.shape[1])
+    in_value = column < lengths[:, np.newaxis]
+
+    #  the coordinates must contain digits and a single '.' with at least 3
+    #  digits before it and 1 digit after it.
+    is_dot = chars == _DOT
+    is_plain = ~np.any(in_value & ~(_IS_DIGIT[chars] | is_dot), axis=1)
+    dot = np.argmax(is_dot, axis=1)
+    is_valid = is_plain & (np.count_nonzero(is_dot, axis=1) == 1) & \
+            (dot >= 3) & (dot + 1 < lengths)
+
+    #  split the coordinates into degrees and minutes.
+    minutes_start = np.where(is_valid, dot - 2, 0)
+    degrees = _to_float(_gather(chars, np.zeros(n_values, dtype=np.intp),
+                                minutes_start))
+    minutes = _to_float(_gather(chars, minutes_start, lengths))
+    coordinates = degrees + minutes / 60
+    coordinates[~is_valid] = np.nan
+    is_zero = (values == b'') | (values == b'0')
+    coordinates[is_zero] = 0.
+
+    #  apply the direction.
+    coordinates[directions == negative] *= -1
+    coordinates[(directions != positive) & (directions != negative) &
+                ~np.isnan(coordinates)] = 0.
+
+    return coordinates, is_plain | is_zero
+
+
+def _parse_sentences(sentences, index, fields, columns):
+    """
+    Parse sentences with pynmea2 and extract the values of fields.
+
+    Args:
+        sentences (array): Array of the NMEA sentence strings.
+        index (array): Array of the index of each sentence in the columns.
+        fields (list): List of the pynmea2 attribute names.
+        columns (dict): Dictionary of the column arrays that are filled.
+
+    """
+
+    for idx, sentence in zip(index, sentences):
+        try:
+            # Parse this datagram...
+            msg_data = pynmea2.parse(sentence, check=False)
+            # and extract the requested fields.
+            for field in fields:
+                try:
+                    columns[field][idx] = getattr(msg_data, field)
+                except:
+                    # Unknown field - return NaN for this field.
+                    columns[field][idx] = np.nan
+        except:
+            # Unable to parse datagram - return NaNs for all fields.
+            for field in fields:
+                columns[field][idx] = np.nan
@@ -36,7 +36,7 @@ import logging
 import struct
 import re
 import sys
-from .date_conversion import nt_to_unix
+from .date_conversion import nt_to_unix, nt_to_datetime64
 
 
 __all__ = ['SimradNMEAParser', 'SimradDepthParser', 'SimradBottomParser',
@@ -44,6 +44,10 @@ __all__ = ['SimradNMEAParser', 'SimradDepthParser', 'SimradBottomParser',
 
 log = logging.getLogger(__name__)
 
+#  mapping of struct format characters to little endian numpy types
+_STRUCT_TO_DTYPE = {'b':'<i1', 'B':'<u1', 'h':'<i2', 'H':'<u2', 'i':'<i4', 'I':'<u4',
+                    'l':'<i4', 'L':'<u4', 'q':'<i8', 'Q':'<u8', 'f':'<f4', 'd':'<f8'}
+
 class _SimradDatagramParser(object):
     '''
     '''
@@ -65,6 +69,20 @@ class _SimradDatagramParser(object):
     def header(self, version=0):
         return self._headers[version][:]
 
+    def header_dtype(self, version=0):
+        '''
+        Returns a numpy dtype matching the datagram header which can be used to
+        decode the headers of many datagrams at once.
+        '''
+        dtype = []
+        for field, fmt in self._headers[version]:
+            if fmt.endswith('s'):
+                dtype.append((field, 'S' + fmt[:-1]))
+            else:
+                dtype.append((field, _STRUCT_TO_DTYPE[fmt]))
+
+        return np.dtype(dtype)
+
 
     def validate_data_header(self, data):
 
@@ -89,7 +107,9 @@ class _SimradDatagramParser(object):
 
     def from_string(self, raw_string):
 
-        header = raw_string[:4]
+        #  copy the 4 byte header into a bytes object so we can accept
+        #  bytes as well as buffer objects like memoryview
+        header = bytes(raw_string[:4])
         if (sys.version_info.major > 2):
             header = header.decode()
         id_, version = self.validate_data_header(header)
@@ -337,7 +357,7 @@ class SimradAnnotationParser(_SimradDatagramParser):
 
         if version == 0:
             if (sys.version_info.major > 2):
-                data['text'] = str(raw_string[self.header_size(version):].strip(b'\x00'), 'ascii', errors='replace')
+                data['text'] = str(bytes(raw_string[self.header_size(version):]).strip(b'\x00'), 'ascii', errors='replace')
             else:
                 data['text'] = unicode(raw_string[self.header_size(version):].strip('\x00'), 'ascii', errors='replace')
 
@@ -426,7 +446,7 @@ class SimradNMEAParser(_SimradDatagramParser):
 
         if version == 0:
             if (sys.version_info.major > 2):
-                data['nmea_string'] = str(raw_string[self.header_size(version):].strip(b'\x00'), 'ascii', errors='replace')
+                data['nmea_string'] = str(bytes(raw_string[self.header_size(version):]).strip(b'\x00'), 'ascii', errors='replace')
             else:
                 data['nmea_string'] = unicode(raw_string[self.header_size(version):].strip('\x00'), 'ascii', errors='replace')
 
@@ -883,10 +903,16 @@ class SimradRawParser(_SimradDatagramParser):
 
         power                           [numpy array] Unconverted power values (if present)
         angle                           [numpy array] Unconverted angle values (if present)
+        sample_offset                   [long] Sample number of the first power and angle value
 
     from_string(str):   parse a raw sample datagram
                         (with leading/trailing datagram size stripped)
 
+    from_string(str, start_sample, end_sample, power, angles):
+                        parse a raw sample datagram decoding only the samples from
+                        start_sample to end_sample (inclusive) and only the power
+                        and/or angle data.  Data that are not decoded are None.
+
     to_string(dict):    Returns raw string (including leading/trailing size fields)
                         ready for writing to disk
     '''
@@ -918,7 +944,38 @@ class SimradRawParser(_SimradDatagramParser):
                     }
         _SimradDatagramParser.__init__(self, 'RAW', headers)
 
-    def _unpack_contents(self, raw_string, version):
+    def from_string(self, raw_string, start_sample=None, end_sample=None,
+                    power=True, angles=True):
+        '''
+        :param raw_string: the datagram (with leading/trailing datagram size stripped)
+        :type raw_string: bytes or buffer object
+
+        :param start_sample: the first sample to decode
+        :type start_sample: int
+
+        :param end_sample: the last sample to decode
+        :type end_sample: int
+
+        :param power: Set to False to skip decoding the power data
+        :type power: bool
+
+        :param angles: Set to False to skip decoding the angle data
+        :type angles: bool
+
+        Parses a sample datagram.  Only the bytes of the requested samples are
+        decoded.  The sample number of the first decoded sample is returned in
+        sample_offset.  count is always the number of samples in the datagram.
+        '''
+
+        header = bytes(raw_string[:4])
+        if (sys.version_info.major > 2):
+            header = header.decode()
+        id_, version = self.validate_data_header(header)
+        return self._unpack_contents(raw_string, version, start_sample=start_sample,
+                end_sample=end_sample, power=power, angles=angles)
+
+    def _unpack_contents(self, raw_string, version, start_sample=None, end_sample=None,
+                         power=True, angles=True):
 
         header_values = struct.unpack(self.header_fmt(version), raw_string[:self.header_size(version)])
 
@@ -932,18 +989,32 @@ class SimradRawParser(_SimradDatagramParser):
 
             data['timestamp'] = nt_to_unix((data['low_date'], data['high_date']))
 
+            #  determine the window of samples we're decoding
+            first_sample = 0
+            last_sample = data['count']
+            if start_sample:
+                first_sample = min(max(start_sample, 0), data['count'])
+            if end_sample is not None:
+                last_sample = max(min(end_sample + 1, last_sample), first_sample)
+            data['sample_offset'] = first_sample
+
             if data['count'] > 0:
                 block_size = data['count'] * 2
                 indx = self.header_size(version)
+                window_start = first_sample * 2
+                window_end = last_sample * 2
 
-                if int(data['mode']) & 0x1:
-                    data['power'] = np.fromstring(raw_string[indx:indx + block_size], dtype='int16')
-                    indx += block_size
+                if int(data['mode']) & 0x1 and power:
+                    data['power'] = np.frombuffer(raw_string[indx + window_start:
+                            indx + window_end], dtype='int16')
                 else:
                     data['power'] = None
+                if int(data['mode']) & 0x1:
+                    indx += block_size
 
-                if int(data['mode']) & 0x2:
-                    data['angle'] = np.fromstring(raw_string[indx:indx + block_size], dtype='uint16')
+                if int(data['mode']) & 0x2 and angles:
+                    data['angle'] = np.frombuffer(raw_string[indx + window_start:
+                            indx + window_end], dtype='uint16')
                 else:
                     data['angle'] = None
 
@@ -953,6 +1024,98 @@ class SimradRawParser(_SimradDatagramParser):
 
         return data
 
+    def from_buffer(self, buffer, offsets, version=0):
+        '''
+        :param buffer: buffer containing the datagrams (i.e. a memory mapped raw file)
+        :type buffer: bytes, mmap, or other buffer object
+
+        :param offsets: byte offsets of the datagrams within the buffer
+                        (with the leading datagram size skipped)
+        :type offsets: array of int
+
+        Parses many sample datagrams at once.  The datagram headers are decoded
+        using a numpy structured dtype and the power and angle data are copied
+        into 2d arrays.  A dict containing the same keys as from_string is
+        returned but each value is an array with an element (or row) for each
+        datagram:
+
+            timestamp       [datetime64[ms] array]
+            power           [2d int16 array] Unconverted power values (or None)
+            angle           [2d uint16 array] Unconverted angle values (or None)
+
+        The sample arrays are sized to the largest count.  Samples beyond a
+        datagram's count are 0 as are the samples of datagrams that do not
+        contain power or angle data.  The mode and count arrays should be
+        used to determine which samples are valid.
+        '''
+
+        offsets = np.asarray(offsets, dtype='int64')
+        n_dgrams = offsets.shape[0]
+        header_dtype = self.header_dtype(version)
+        header_size = header_dtype.itemsize
+
+        #  create a byte array view of the buffer and extract the headers
+        buf = np.frombuffer(buffer, dtype='uint8')
+        headers = buf[offsets[:, np.newaxis] + np.arange(header_size)]
+        headers = headers.view(header_dtype).ravel()
+
+        data = {}
+        for field in header_dtype.names:
+            data[field] = headers[field]
+        data['type'] = np.char.decode(data['type'])
+        data['spare0'] = np.char.decode(data['spare0'], 'latin_1')
+
+        nt_time = (data['high_date'].astype('uint64') << np.uint64(32)) + \
+                  data['low_date'].astype('uint64')
+        data['timestamp'] = nt_to_datetime64(nt_time)
+
+        count = data['count']
+        mode = data['mode'].astype('int32')
+        if n_dgrams > 0:
+            max_count = max(int(count.max()), 0)
+        else:
+            max_count = 0
+
+        has_power = ((mode & 0x1) > 0) & (count > 0)
+        has_angle = ((mode & 0x2) > 0) & (count > 0)
+
+        if np.any(has_power):
+            data['power'] = np.zeros((n_dgrams, max_count), dtype='int16')
+        else:
+            data['power'] = None
+        if np.any(has_angle):
+            data['angle'] = np.zeros((n_dgrams, max_count), dtype='uint16')
+        else:
+            data['angle'] = None
+
+        #  copy the sample data.  Datagrams are grouped by sample count so the
+        #  samples of each group can be gathered at once.
+        sample_offsets = offsets + header_size
+        for group_count in np.unique(count[has_power | has_angle]):
+            group_count = int(group_count)
+            block_idx = np.arange(group_count * 2)
+
+            in_group = count == group_count
+            if data['power'] is not None:
+                rows = np.nonzero(in_group & has_power)[0]
+                if rows.size > 0:
+                    block = buf[sample_offsets[rows, np.newaxis] + block_idx]
+                    data['power'][rows, :group_count] = block.view('<i2')
+
+            if data['angle'] is not None:
+                rows = np.nonzero(in_group & has_angle)[0]
+                if rows.size > 0:
+                    #  angle data follow the power data if present
+                    angle_offsets = sample_offsets[rows] + \
+                        has_power[rows] * (group_count * 2)
+                    block = buf[angle_offsets[:, np.newaxis] + block_idx]
+                    data['angle'][rows, :group_count] = block.view('<u2')
+
+        #  release our view of the buffer
+        del buf
+
+        return data
+
     def _pack_contents(self, data, version):
 
 
@@ -1,11 +1,14 @@
 import math
 
+import numpy as np
+
 # WGS 84
 a = 6378137  # meters
 f = 1 / 298.257223563
 b = 6356752.314245  # meters; b = (1 - f)a
 
 MILES_PER_KILOMETER = 0.621371
+NAUTICAL_MILES_PER_KILOMETER = 1 / 1.852
 
 MAX_ITERATIONS = 200
 CONVERGENCE_THRESHOLD = 1e-12  # .000,000,000,001
@@ -87,6 +90,217 @@ def vincenty_inverse(point1, point2, miles=False):
 
     return round(s, 6)
 
+def vincenty_inverse_array(lat1, lon1, lat2, lon2, miles=False,
+                           return_azimuths=False):
+    """
+    Vectorized version of vincenty_inverse that calculates the distances (in
+    kilometers or miles) between arrays of points. The arrays are broadcast
+    against each other. Each point pair is iterated until it converges and
+    the iteration stops when all pairs have converged. Distances that fail
+    to converge or have NaN inputs are NaN. Distances are not rounded.
+
+    When return_azimuths is True the forward azimuths at the first points
+    and the azimuths at the second points are also returned in degrees
+    clockwise from north in the range [0, 360).
+
+    Doctests:
+    >>> d = vincenty_inverse_array([0.0, 0.0, 0.0], [0.0, 0.0, 0.0],
+    ...                            [0.0, 0.0, 0.5], [0.0, 1.0, 179.7])
+    >>> [round(float(x), 6) for x in d]
+    [0.0, 111.319491, nan]
+    >>> boston = (42.3541165, -71.0693514)
+    >>> newyork = (40.7791472, -73.9680804)
+    >>> round(float(vincenty_inverse_array(*(boston + newyork))), 6)
+    298.396057
+    """
+
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float),
+        np.asarray(lat2, dtype=float), np.asarray(lon2, dtype=float))
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = (lat1.ravel(), lon1.ravel(), lat2.ravel(),
+                              lon2.ravel())
+
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    L = np.radians(lon2 - lon1)
+    Lambda = L.copy()
+
+    sinU1 = np.sin(U1)
+    cosU1 = np.cos(U1)
+    sinU2 = np.sin(U2)
+    cosU2 = np.cos(U2)
+
+    # the values of the last iteration of each point pair
+    sinLambda = np.zeros(L.shape)
+    cosLambda = np.ones(L.shape)
+    sinSigma = np.zeros(L.shape)
+    cosSigma = np.ones(L.shape)
+    sigma = np.zeros(L.shape)
+    cosSqAlpha = np.ones(L.shape)
+    cos2SigmaM = np.zeros(L.shape)
+    converged = np.zeros(L.shape, dtype=bool)
+
+    # only iterate the point pairs that haven't converged
+    active = np.nonzero(np.isfinite(L) & np.isfinite(U1) &
+                        np.isfinite(U2))[0]
+    for iteration in range(MAX_ITERATIONS):
+        if active.shape[0] == 0:
+            break
+        sU1 = sinU1[active]
+        cU1 = cosU1[active]
+        sU2 = sinU2[active]
+        cU2 = cosU2[active]
+        LambdaPrev = Lambda[active]
+
+        sinL = np.sin(LambdaPrev)
+        cosL = np.cos(LambdaPrev)
+        sinS = np.sqrt((cU2 * sinL) ** 2 + (cU1 * sU2 - sU1 * cU2 * cosL) ** 2)
+        cosS = sU1 * sU2 + cU1 * cU2 * cosL
+        sig = np.arctan2(sinS, cosS)
+        # coincident points have sinSigma == 0 and equatorial lines have
+        # cosSqAlpha == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sinA = np.where(sinS == 0, 0.0, cU1 * cU2 * sinL / sinS)
+            cosSqA = 1 - sinA ** 2
+            cos2SM = np.where(cosSqA == 0, 0.0, cosS - 2 * sU1 * sU2 / cosSqA)
+        C = f / 16 * cosSqA * (4 + f * (4 - 3 * cosSqA))
+        Lam = L[active] + (1 - C) * f * sinA * (sig + C * sinS *
+                                                (cos2SM + C * cosS *
+                                                 (-1 + 2 * cos2SM ** 2)))
+
+        sinLambda[active] = sinL
+        cosLambda[active] = cosL
+        sinSigma[active] = sinS
+        cosSigma[active] = cosS
+        sigma[active] = sig
+        cosSqAlpha[active] = cosSqA
+        cos2SigmaM[active] = cos2SM
+        Lambda[active] = Lam
+
+        done = (np.abs(Lam - LambdaPrev) < CONVERGENCE_THRESHOLD) | (sinS == 0)
+        converged[active[done]] = True
+        active = active[~done]
+
+    uSq = cosSqAlpha * (a ** 2 - b ** 2) / (b ** 2)
+    A = 1 + uSq / 16384 * (4096 + uSq * (-768 + uSq * (320 - 175 * uSq)))
+    B = uSq / 1024 * (256 + uSq * (-128 + uSq * (74 - 47 * uSq)))
+    deltaSigma = B * sinSigma * (cos2SigmaM + B / 4 * (cosSigma *
+                 (-1 + 2 * cos2SigmaM ** 2) - B / 6 * cos2SigmaM *
+                 (-3 + 4 * sinSigma ** 2) * (-3 + 4 * cos2SigmaM ** 2)))
+    s = b * A * (sigma - deltaSigma)
+    s[~converged] = np.nan
+
+    s /= 1000  # meters to kilometers
+    if miles:
+        s *= MILES_PER_KILOMETER  # kilometers to miles
+    s = s.reshape(shape)
+
+    if not return_azimuths:
+        return s
+
+    alpha1 = np.degrees(np.arctan2(cosU2 * sinLambda, cosU1 * sinU2 -
+                                   sinU1 * cosU2 * cosLambda)) % 360
+    alpha2 = np.degrees(np.arctan2(cosU1 * sinLambda, -sinU1 * cosU2 +
+                                   cosU1 * sinU2 * cosLambda)) % 360
+    alpha1[~converged] = np.nan
+    alpha2[~converged] = np.nan
+
+    return s, alpha1.reshape(shape), alpha2.reshape(shape)
+
+
+def vincenty_direct_array(lat1, lon1, azimuth, distance, miles=False):
+    """
+    Vincenty's formula (direct method) to calculate the end points of
+    arrays of start points, forward azimuths (in degrees clockwise from
+    north) and distances (in kilometers or miles) on the surface of a
+    spheroid. The arrays are broadcast against each other and each point is
+    iterated until it converges. Returns the arrays of end point latitudes
+    and longitudes and the azimuths at the end points. Points that fail to
+    converge or have NaN inputs are NaN.
+
+    Doctests:
+    >>> lat2, lon2, alpha2 = vincenty_direct_array(0.0, 0.0, 90.0, 111.319491)
+    >>> round(float(lat2), 6), round(float(lon2), 6), round(float(alpha2), 6)
+    (0.0, 1.0, 90.0)
+    """
+
+    lat1, lon1, azimuth, distance = np.broadcast_arrays(
+        np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float),
+        np.asarray(azimuth, dtype=float), np.asarray(distance, dtype=float))
+    shape = lat1.shape
+    lat1, lon1, azimuth, distance = (lat1.ravel(), lon1.ravel(),
+                                     azimuth.ravel(), distance.ravel())
+
+    if miles:
+        distance = distance / MILES_PER_KILOMETER  # miles to kilometers
+    s = distance * 1000  # kilometers to meters
+
+    alpha1 = np.radians(azimuth)
+    sinAlpha1 = np.sin(alpha1)
+    cosAlpha1 = np.cos(alpha1)
+
+    tanU1 = (1 - f) * np.tan(np.radians(lat1))
+    cosU1 = 1 / np.sqrt(1 + tanU1 ** 2)
+    sinU1 = tanU1 * cosU1
+    sigma1 = np.arctan2(tanU1, cosAlpha1)
+    sinAlpha = cosU1 * sinAlpha1
+    cosSqAlpha = 1 - sinAlpha ** 2
+    uSq = cosSqAlpha * (a ** 2 - b ** 2) / (b ** 2)
+    A = 1 + uSq / 16384 * (4096 + uSq * (-768 + uSq * (320 - 175 * uSq)))
+    B = uSq / 1024 * (256 + uSq * (-128 + uSq * (74 - 47 * uSq)))
+
+    sigma = s / (b * A)
+    sinSigma = np.zeros(s.shape)
+    cosSigma = np.ones(s.shape)
+    cos2SigmaM = np.ones(s.shape)
+    converged = np.zeros(s.shape, dtype=bool)
+
+    # only iterate the points that haven't converged
+    active = np.nonzero(np.isfinite(sigma) & np.isfinite(sigma1))[0]
+    for iteration in range(MAX_ITERATIONS):
+        if active.shape[0] == 0:
+            break
+        sigmaPrev = sigma[active]
+        Ba = B[active]
+
+        cos2SM = np.cos(2 * sigma1[active] + sigmaPrev)
+        sinS = np.sin(sigmaPrev)
+        cosS = np.cos(sigmaPrev)
+        deltaSigma = Ba * sinS * (cos2SM + Ba / 4 * (cosS *
+                     (-1 + 2 * cos2SM ** 2) - Ba / 6 * cos2SM *
+                     (-3 + 4 * sinS ** 2) * (-3 + 4 * cos2SM ** 2)))
+        sig = s[active] / (b * A[active]) + deltaSigma
+
+        cos2SigmaM[active] = cos2SM
+        sinSigma[active] = sinS
+        cosSigma[active] = cosS
+        sigma[active] = sig
+
+        done = np.abs(sig - sigmaPrev) < CONVERGENCE_THRESHOLD
+        converged[active[done]] = True
+        active = active[~done]
+
+    x = sinU1 * sinSigma - cosU1 * cosSigma * cosAlpha1
+    lat2 = np.arctan2(sinU1 * cosSigma + cosU1 * sinSigma * cosAlpha1,
+                      (1 - f) * np.sqrt(sinAlpha ** 2 + x ** 2))
+    Lambda = np.arctan2(sinSigma * sinAlpha1,
+                        cosU1 * cosSigma - sinU1 * sinSigma * cosAlpha1)
+    C = f / 16 * cosSqAlpha * (4 + f * (4 - 3 * cosSqAlpha))
+    L = Lambda - (1 - C) * f * sinAlpha * (sigma + C * sinSigma *
+                                           (cos2SigmaM + C * cosSigma *
+                                            (-1 + 2 * cos2SigmaM ** 2)))
+    lon2 = (lon1 + np.degrees(L) + 180) % 360 - 180
+    alpha2 = np.degrees(np.arctan2(sinAlpha, -x)) % 360
+
+    lat2 = np.degrees(lat2)
+    lat2[~converged] = np.nan
+    lon2[~converged] = np.nan
+    alpha2[~converged] = np.nan
+
+    return lat2.reshape(shape), lon2.reshape(shape), alpha2.reshape(shape)
+
+
 vincenty = vincenty_inverse
 
 if __name__ == '__main__':
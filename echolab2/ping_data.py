@@ -29,9 +29,138 @@
 
 """
 
+import os
+import json
+import importlib
 import numpy as np
 
 
+def grow_capacity(capacity, n_needed, min_growth):
+    """Returns the allocated length of a growing data array.
+
+    When an array that holds capacity elements must hold n_needed elements,
+    the array is grown by at least a factor of 2 (and at least min_growth
+    elements) so the cost of copying the data when the array grows is
+    amortized over the elements that are added.
+
+    Args:
+        capacity (int): The current allocated length of the array.
+        n_needed (int): The number of elements the array must hold.
+        min_growth (int): The minimum number of elements to add.
+
+    Returns:
+        The new allocated length of the array or capacity if the array can
+        hold n_needed elements.
+    """
+
+    if n_needed <= capacity:
+        return capacity
+
+    return max(n_needed, capacity + max(capacity, min_growth))
+
+
+def compact_array(data, max_ratio=1.1):
+    """Returns an array that doesn't keep a much larger array alive.
+
+    Trimming a grown array returns a view of it, which keeps the unused
+    capacity in memory for as long as the view exists.  When the array that
+    owns the data is more than max_ratio times the size of the view, a copy
+    of the view is returned so the grown array can be freed.  Memory mapped
+    arrays are returned as is since their capacity isn't held in memory.
+
+    Args:
+        data (array): The numpy array to compact.
+        max_ratio (float): The largest ratio of the size of the array that
+            owns the data to the size of data that is kept without copying.
+
+    Returns:
+        data or a copy of data.
+    """
+
+    owner = data
+    while isinstance(owner.base, np.ndarray):
+        owner = owner.base
+
+    if (isinstance(owner, np.memmap) or
+            owner.nbytes <= data.nbytes * max_ratio):
+        return data
+
+    return data.copy()
+
+
+def _encode_value(value):
+    """Returns a JSON serializable representation of an attribute value.
+
+    numpy scalars, numpy arrays and bytes are stored as dicts that include
+    their type so they can be restored by _decode_value.
+
+    Args:
+        value: The attribute value.
+
+    Raises:
+        TypeError: The value can't be serialized.
+
+    Returns:
+        The JSON serializable representation of the value.
+    """
+
+    if isinstance(value, np.generic):
+        if value.dtype.kind in 'Mm':
+            return {'__numpy__': value.dtype.str, 'value': str(value)}
+        return {'__numpy__': value.dtype.str, 'value': value.item()}
+    elif isinstance(value, np.ndarray):
+        if value.dtype.kind == 'O':
+            raise TypeError('Object arrays can not be saved.')
+        if value.dtype.kind in 'Mm':
+            return {'__ndarray__': value.dtype.str,
+                    'value': value.astype(str).tolist()}
+        return {'__ndarray__': value.dtype.str, 'value': value.tolist()}
+    elif isinstance(value, bytes) and not isinstance(value, str):
+        return {'__bytes__': value.decode('latin-1')}
+    elif isinstance(value, (list, tuple)):
+        return [_encode_value(item) for item in value]
+    elif isinstance(value, dict):
+        return dict((str(key), _encode_value(item)) for key, item in
+                    value.items())
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    # Python 2 unicode strings and long integers don't share a base class
+    # with their Python 3 counterparts.
+    try:
+        if isinstance(value, (unicode, long)):
+            return value
+    except NameError:
+        pass
+
+    raise TypeError('Attributes of type ' + str(type(value)) + ' can not ' +
+                    'be saved.')
+
+
+def _decode_value(value):
+    """Restores an attribute value encoded by _encode_value.
+
+    Args:
+        value: The JSON representation of the value.
+
+    Returns:
+        The attribute value.
+    """
+
+    if isinstance(value, list):
+        return [_decode_value(item) for item in value]
+    elif isinstance(value, dict):
+        if '__numpy__' in value:
+            return np.array(value['value'], dtype=value['__numpy__'])[()]
+        elif '__ndarray__' in value:
+            return np.array(value['value'], dtype=value['__ndarray__'])
+        elif '__bytes__' in value:
+            return value['__bytes__'].encode('latin-1')
+        return dict((key, _decode_value(item)) for key, item in value.items())
+
+    return value
+
+
 class PingData(object):
     """echolab2.PingData is the base class for all classes that store "ping"
     based data from fisheries sonar systems.
@@ -52,6 +181,11 @@ class PingData(object):
     dimension.
     """
 
+    # The version of the directory format written by the save method.  Version
+    # 2 stores the ChannelMetadata objects of RawData objects in a table with
+    # a per ping index into the table.
+    SAVE_FORMAT_VERSION = 2
+
     def __init__(self):
         """Initializes PingData class object.
 
@@ -377,7 +511,7 @@ class PingData(object):
             del_idx = index_array
 
         # Determine the indices of the pings we're keeping.
-        keep_idx = np.delete(np.arange(self.ping_time.shape[0]), del_idx)
+        keep_idx = np.delete(np.arange(self.n_pings), del_idx)
 
         # Determine the number of pings we're keeping.
         new_n_pings = keep_idx.shape[0]
@@ -393,7 +527,7 @@ class PingData(object):
                 if remove:
                     attr[0:new_n_pings, :] = attr[keep_idx, :]
                 else:
-                    attr[del_idx, :] = np.nan
+                    attr[del_idx, :] = self._get_fill_value(attr.dtype)
             else:
                 if remove:
                     # Copy the data we're keeping into a contiguous block.
@@ -416,12 +550,11 @@ class PingData(object):
                         # -1? -999? -9999? it's a good question.
                         attr[del_idx] = -1
 
-        # If we're removing the pings, shrink the arrays.
+        # If we're removing the pings, shrink the arrays and update the
+        # n_pings attribute.
         if remove:
             self.resize(new_n_pings, self.n_samples)
-
-        # Update the n_pings attribute.
-        self.n_pings = self.ping_time.shape[0]
+            self.n_pings = new_n_pings
 
 
     def append(self, obj_to_append):
@@ -576,7 +709,7 @@ class PingData(object):
         # Update the number of pings in the object we're inserting into
         # and then resize it.
         my_pings = my_pings + new_pings
-        self.resize(my_pings, my_samples)
+        self._resize_capacity(my_pings, my_samples)
 
         # Work through our data properties, inserting the data from
         # obj_to_insert.
@@ -621,14 +754,16 @@ class PingData(object):
             self.channel_id += obj_to_insert.channel_id
 
         # Update the n_pings attribute.
-        self.n_pings = self.ping_time.shape[0]
+        self.n_pings = my_pings
 
 
     def trim(self, n_pings=None, n_samples=None):
         """Trims pings from an echolab2 data object to a given length.
 
         This method deletes pings from a data object to a length defined by
-        n_pings and n_samples.
+        n_pings and n_samples. When only the ping axis is shortened, the data
+        attributes become views of the existing arrays and no data are
+        copied.
 
         Args:
             n_pings (int): Number of pings (horizontal axis).
@@ -644,6 +779,21 @@ class PingData(object):
         self.resize(n_pings, n_samples)
 
 
+    def _compact_arrays(self):
+        """Copies data attributes that are views of much larger arrays.
+
+        trim sets the data attributes to views of the existing arrays, which
+        keeps the unused capacity of grown arrays in memory.  This method is
+        called when no more data will be added (i.e. at the end of a read) to
+        copy the attributes that waste a lot of memory.  See compact_array.
+        """
+
+        for attr_name in self._data_attributes:
+            data = getattr(self, attr_name, None)
+            if isinstance(data, np.ndarray):
+                setattr(self, attr_name, compact_array(data))
+
+
     def roll(self, roll_pings):
         """Rolls our data array elements along the ping axis.
 
@@ -703,7 +853,9 @@ class PingData(object):
         """Iterates through the provided list of attributes and resizes them.
 
         The size of the attributes in the instance of the provided object
-        is resized given the new array dimensions.
+        is resized given the new array dimensions. When the ping axis is
+        shortened and the sample axis isn't changing, the attributes are
+        set to views of the first new_ping_dim pings of the existing arrays.
 
         Args:
             new_ping_dim (int): Ping dimension gives the width of the array (
@@ -712,28 +864,6 @@ class PingData(object):
                 array (vertical axis).
         """
 
-        def _resize2d(data, ping_dim, sample_dim):
-            """
-            _resize2d returns a new array of the specified dimensions with the
-            data from the provided array copied into it. This function is
-            used when we need to resize 2d arrays along the minor axis as
-            ndarray.resize and numpy.resize don't maintain the order of the
-            data in these cases.
-            """
-
-            # If the minor axis is changing, we have to either concatenate or
-            # copy into a new resized array.  We take the second approach
-            # for now, as there shouldn't be a performance differences between
-            # the two approaches.
-
-            # Create a new array.
-            new_array = np.empty((ping_dim, sample_dim))
-            # Fill it with NaNs.
-            new_array.fill(np.nan)
-            # Copy the data into our new array and return it.
-            new_array[0:data.shape[0], 0:data.shape[1]] = data
-            return new_array
-
         # Store the old sizes.
         old_sample_dim = self.n_samples
         old_ping_dim = self.ping_time.shape[0]
@@ -758,19 +888,16 @@ class PingData(object):
                 if attr.shape[0] == old_sample_dim != new_sample_dim:
                     # Resize this sample axes attribute.
                     attr = np.resize(attr,(new_sample_dim))
+                elif attr.shape[0] == old_ping_dim > new_ping_dim:
+                    # Shrink this ping axes attribute.
+                    attr = attr[0:new_ping_dim]
                 elif attr.shape[0] == old_ping_dim != new_ping_dim:
                     # Resize this ping axes attribute.
                     attr = np.resize(attr,(new_ping_dim))
             elif attr.ndim == 2:
                 # Resize this 2d sample data array.
-                if new_sample_dim == old_sample_dim:
-                    # If the minor axes isn't changing, we can use
-                    # np.resize() function.
-                    attr = np.resize(attr,(new_ping_dim, new_sample_dim))
-                else:
-                    # If the minor axes is changing, we need to use our
-                    # resize2d function.
-                    attr = _resize2d(attr, new_ping_dim, new_sample_dim)
+                attr = self._resize_sample_array(attr_name, attr,
+                                                 new_ping_dim, new_sample_dim)
 
             #  Update the attribute.
             setattr(self, attr_name, attr)
@@ -785,6 +912,263 @@ class PingData(object):
         # permits, in other methods of this class.
 
 
+    def _resize_sample_array(self, attr_name, data, ping_dim, sample_dim):
+        """Returns a 2d data attribute resized to the specified dimensions.
+
+        This is an internal method called by resize for each 2d data
+        attribute. Child classes that store their 2d data differently can
+        re-implement it.
+
+        Args:
+            attr_name (str): The name of the data attribute.
+            data (array): The 2d numpy array to resize.
+            ping_dim (int): The new ping dimension.
+            sample_dim (int): The new sample dimension.
+
+        Returns:
+            The resized array.
+        """
+
+        def _resize2d(data, ping_dim, sample_dim):
+            """
+            _resize2d returns a new array of the specified dimensions with the
+            data from the provided array copied into it. This function is
+            used when we need to resize 2d arrays along the minor axis as
+            ndarray.resize and numpy.resize don't maintain the order of the
+            data in these cases.
+            """
+
+            # If the minor axis is changing, we have to either concatenate or
+            # copy into a new resized array.  We take the second approach
+            # for now, as there shouldn't be a performance differences between
+            # the two approaches.
+
+            # Create a new array with the same type as the existing array.
+            new_array = np.empty((ping_dim, sample_dim), dtype=data.dtype)
+            # Fill it with NaNs (or the fill value for integer arrays).
+            new_array.fill(self._get_fill_value(data.dtype))
+            # Copy the data into our new array and return it.
+            ping_dim = min(ping_dim, data.shape[0])
+            sample_dim = min(sample_dim, data.shape[1])
+            new_array[0:ping_dim, 0:sample_dim] = data[0:ping_dim, 0:sample_dim]
+            return new_array
+
+        if sample_dim == data.shape[1] and ping_dim <= data.shape[0]:
+            # If we're only shrinking the ping axis, we can use a view of the
+            # existing array.
+            return data[0:ping_dim, :]
+        elif sample_dim == data.shape[1]:
+            # If the minor axes isn't changing, we can use np.resize()
+            # function.
+            return np.resize(data, (ping_dim, sample_dim))
+        else:
+            # If the minor axes is changing, we need to use our resize2d
+            # function.
+            return _resize2d(data, ping_dim, sample_dim)
+
+
+    def _resize_capacity(self, n_pings, n_samples):
+        """Resizes the data arrays so they can hold the specified number of
+        pings and samples.
+
+        The data arrays are resized to exactly n_pings. Child classes that
+        keep track of the number of pings separately from the length of the
+        data arrays can re-implement this method to grow the arrays using
+        grow_capacity.
+
+        Args:
+            n_pings (int): The number of pings the arrays must hold.
+            n_samples (int): The number of samples of the arrays.
+        """
+
+        self.resize(n_pings, n_samples)
+
+
+    def _get_fill_value(self, dtype):
+        """Returns the value used for empty samples in 2d data arrays.
+
+        Empty samples of floating point arrays are set to NaN. Integer arrays
+        can't store NaNs so the minimum value of signed types and the maximum
+        value of unsigned types are used to mark empty samples.
+
+        Args:
+            dtype (dtype): The data type of the array.
+
+        Returns:
+            The fill value for arrays of this type.
+        """
+
+        dtype = np.dtype(dtype)
+        if dtype.kind == 'i':
+            return np.iinfo(dtype).min
+        elif dtype.kind == 'u':
+            return np.iinfo(dtype).max
+        else:
+            return np.nan
+
+
+    def save(self, path, compress=False):
+        """Saves the object to a directory.
+
+        Each data attribute is saved as a numpy .npy file, or a compressed
+        .npz file if compress is True, and the other attributes and the
+        names of the array files are saved in the JSON file manifest.json.
+        Saved objects are loaded with the load method of their class.
+        Existing files in the directory are overwritten.
+
+        Args:
+            path (str): The path of the directory. It is created if it
+                doesn't exist.
+            compress (bool): Set to True to save the arrays in compressed
+                files. Compressed files are smaller but they can't be
+                memory mapped when they are loaded.
+
+        Raises:
+            TypeError: An attribute can't be saved.
+        """
+
+        arrays, attributes = self._get_save_state()
+
+        # Create the directory if it doesn't exist.
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        manifest = {'format': 'echolab2',
+                    'version': self.SAVE_FORMAT_VERSION,
+                    'class': (self.__class__.__module__ + '.' +
+                              self.__class__.__name__),
+                    'compressed': bool(compress),
+                    'arrays': {},
+                    'attributes': {}}
+
+        # Save the arrays.
+        for name, data in arrays.items():
+            if data.dtype.kind == 'O':
+                raise TypeError('The data attribute ' + name + ' is an ' +
+                                'object array and can not be saved.')
+            if compress:
+                filename = name + '.npz'
+                np.savez_compressed(os.path.join(path, filename), data=data)
+            else:
+                filename = name + '.npy'
+                np.save(os.path.join(path, filename), data)
+            manifest['arrays'][name] = filename
+
+        # Encode the other attributes and write the manifest.  The manifest is
+        # written last so a partially saved object can't be loaded.
+        for name, value in attributes.items():
+            manifest['attributes'][name] = _encode_value(value)
+        with open(os.path.join(path, 'manifest.json'), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+
+
+    @classmethod
+    def load(cls, path, memory_map=True):
+        """Loads an object saved with the save method.
+
+        If memory_map is True, the arrays saved in .npy files are memory
+        mapped so loading is fast and the data are only read from the files
+        when they are used. The arrays are mapped copy-on-write, so changes
+        to the data are not written to the files.
+
+        Args:
+            path (str): The path of the directory the object was saved to.
+            memory_map (bool): Set to False to read the arrays into memory.
+
+        Raises:
+            ValueError: The directory doesn't contain a saved object.
+            TypeError: The saved object isn't an instance of this class.
+
+        Returns:
+            The loaded object.
+        """
+
+        # Read the manifest.
+        manifest_filename = os.path.join(path, 'manifest.json')
+        if not os.path.isfile(manifest_filename):
+            raise ValueError(path + ' does not contain a saved echolab2 ' +
+                             'object.')
+        with open(manifest_filename, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+        if (manifest.get('format') != 'echolab2' or
+                manifest.get('version', 0) != cls.SAVE_FORMAT_VERSION):
+            raise ValueError(path + ' does not contain a saved echolab2 ' +
+                             'object that can be loaded by this version of ' +
+                             'echolab2.')
+
+        # Get the class of the saved object.
+        module_name, class_name = manifest['class'].rsplit('.', 1)
+        obj_class = getattr(importlib.import_module(module_name), class_name)
+        if not issubclass(obj_class, cls):
+            raise TypeError('The saved object is an instance of ' +
+                            manifest['class'] + ' and not ' + str(cls))
+
+        # Load the arrays.
+        arrays = {}
+        for name, filename in manifest['arrays'].items():
+            filename = os.path.join(path, filename)
+            if filename.endswith('.npz'):
+                with np.load(filename) as npz_file:
+                    arrays[name] = npz_file['data']
+            elif memory_map and os.path.getsize(filename) > 0:
+                arrays[name] = np.load(filename, mmap_mode='c')
+            else:
+                arrays[name] = np.load(filename)
+
+        # Decode the other attributes.
+        attributes = {}
+        for name, value in manifest['attributes'].items():
+            attributes[name] = _decode_value(value)
+
+        # Create the object without calling its __init__ method and set its
+        # state.
+        obj = obj_class.__new__(obj_class)
+        obj._set_load_state(arrays, attributes)
+
+        return obj
+
+
+    def _get_save_state(self):
+        """Returns the arrays and attributes that are saved by save.
+
+        This is an internal method. Child classes re-implement it to save
+        attributes that aren't arrays or JSON serializable values.
+
+        Returns:
+            A dict of the arrays to save keyed by name and a dict of the other
+            attributes to save keyed by name.
+        """
+
+        arrays = {}
+        for attr_name in self._data_attributes:
+            if hasattr(self, attr_name):
+                arrays[attr_name] = getattr(self, attr_name)
+
+        attributes = {}
+        for name, value in self.__dict__.items():
+            if name not in arrays:
+                attributes[name] = value
+
+        return arrays, attributes
+
+
+    def _set_load_state(self, arrays, attributes):
+        """Sets the state of an object that is being loaded.
+
+        This is an internal method called by load with the arrays and
+        attributes returned by _get_save_state when the object was saved.
+
+        Args:
+            arrays (dict): The arrays of the object keyed by name.
+            attributes (dict): The other attributes of the object keyed by
+                name.
+        """
+
+        self.__dict__.update(attributes)
+        for name, data in arrays.items():
+            setattr(self, name, data)
+
+
     def get_indices(self, start_ping=None, end_ping=None, start_time=None,
                     end_time=None, time_order=True):
         """Returns a boolean index array containing where the indices in the
@@ -815,6 +1199,11 @@ class PingData(object):
         # Generate the ping number vector.  We start counting pings at 1.
         ping_number = np.arange(self.n_pings) + 1
 
+        # Get the index into the data arrays of each ping and the ping times
+        # in ping order.
+        ping_order = self._get_ping_order()
+        ping_time = self.ping_time[ping_order]
+
         # If starts and/or ends are omitted, assume first and last respectively.
         if start_ping == start_time is None:
             start_ping = ping_number[0]
@@ -825,24 +1214,38 @@ class PingData(object):
         if time_order:
             # Return indices in time order.  Note that empty ping times will be
             # sorted to the front.
-            primary_index = self.ping_time.argsort()
+            primary_index = ping_time.argsort()
         else:
             # Return indices in ping order.
             primary_index = ping_number - 1
 
         # Generate a boolean mask of the values to return.
         if start_time:
-            mask = self.ping_time[primary_index] >= start_time
+            mask = ping_time[primary_index] >= start_time
         elif start_ping >= 1:
             mask = ping_number[primary_index] >= start_ping
         if end_time:
-            mask = np.logical_and(mask, self.ping_time[primary_index] <=
-                                  end_time)
+            mask = np.logical_and(mask, ping_time[primary_index] <= end_time)
         elif end_ping >= 2:
             mask = np.logical_and(mask, ping_number[primary_index] <= end_ping)
 
         # Return the indices that are included in the specified range.
-        return primary_index[mask]
+        return ping_order[primary_index[mask]]
+
+
+    def _get_ping_order(self):
+        """Returns the index into the data arrays of each ping in the order
+        the pings were added.
+
+        Pings are stored in order at the start of the data arrays.
+        Subclasses that store pings in a different order override this
+        method.
+
+        Returns:
+            A numpy array containing the indices of the pings.
+        """
+
+        return np.arange(self.n_pings)
 
 
     def _vertical_resample(self, data, sample_intervals,
@@ -986,10 +1389,13 @@ class PingData(object):
                         int(resample_factor[sample_interval]), axis=1)
 
                 else:
-                    # No change in resolution for this sample interval.
+                    # No change in resolution for this sample interval.  Only
+                    # copy the first count samples since the data array can
+                    # be wider than the longest ping (rolling RawData objects
+                    # have a fixed number of samples).
                     this_data = data[rows_this_interval[sample_interval]] \
                     [sample_counts[rows_this_interval[sample_interval]]
-                        == count]
+                        == count][:, 0:count]
 
                 # Generate the index array for this sample interval/sample
                 # count chunk of data.
@@ -1002,6 +1408,8 @@ class PingData(object):
                 unique_sample_offsets = np.unique(
                     sample_offsets_this_interval[sample_interval])
                 for offset in unique_sample_offsets:
+                    # Offsets from calibration objects can be floats.
+                    offset = int(offset)
                     resampled_data[rows_this_interval_count,
                     offset:offset + this_data.shape[1]] = this_data
 
@@ -1038,8 +1446,10 @@ class PingData(object):
         """
 
         # Determine the new array size.
-        new_sample_dims = (data.shape[1] + max(sample_offsets) -
-                           min_sample_offset)
+        # Offsets from calibration objects can be floats so we convert them to
+        # integers before using them as indices.
+        new_sample_dims = int(data.shape[1] + max(sample_offsets) -
+                              min_sample_offset)
 
         # Create the new array.
         shifted_data = np.empty(
@@ -1050,7 +1460,7 @@ class PingData(object):
         # Fill the array, looping over the different sample offsets.
         for offset in unique_sample_offsets:
             rows_this_offset = np.where(sample_offsets == offset)[0]
-            start_index = offset - min_sample_offset
+            start_index = int(offset - min_sample_offset)
             end_index = start_index + data.shape[1]
             shifted_data[rows_this_offset, start_index:end_index] = data[
                                             rows_this_offset, 0:data.shape[1]]
@@ -1173,12 +1583,23 @@ class PingData(object):
                     #    we're doing for now.
                     elif data.dtype == 'datetime64[ms]':
                         data[:] = np.datetime64('NaT')
+                    elif data.dtype.kind in 'iu' and np.isnan(value):
+                        # Integer arrays can't store NaNs so they are set to
+                        # the values used for deleted pings.
+                        if data.dtype.kind == 'u':
+                            data[:] = 0
+                        else:
+                            data[:] = -1
                     else:
                         data[:] = value
                 else:
-                    # Create the 2d array(s).
+                    # Create the 2d array(s).  Integer arrays can't store
+                    # NaNs so they are filled with their fill value.
                     data = np.empty((n_pings, self.n_samples), dtype=attr.dtype)
-                    data[:, :] = value
+                    if attr.dtype.kind in 'iu' and np.isnan(value):
+                        data[:, :] = self._get_fill_value(attr.dtype)
+                    else:
+                        data[:, :] = value
 
             # Add the attribute to our empty object.  We can skip using
             # add_attribute here because we shouldn't need to check
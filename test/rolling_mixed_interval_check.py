@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''
+This script checks that rolling RawData objects return the same Sv and power
+as a normal read when the sample interval changes between pings.
+
+Rolling RawData objects (used by the datagram ingest server) have a fixed
+number of samples which is usually larger than the longest ping.  Vertical
+resampling has to ignore the samples beyond each ping's count or the resampled
+rows will not fit in the output array.
+
+The script takes a raw file, halves the sample rate of every other block of
+10 pings (doubling the sample interval and dropping every other sample) and
+writes the result to a temporary file.  That file is read normally and is
+also replayed over TCP to a DatagramIngestServer using the server's default
+rolling buffer size.  The Sv and power of the pings in the rolling buffer are
+then compared to the same pings from the normal read, before and after
+some of the pings are deleted without being removed.
+
+usage: python rolling_mixed_interval_check.py [raw file]
+'''
+
+import os
+import sys
+import struct
+import asyncio
+import tempfile
+import numpy as np
+from echolab2.instruments import EK60
+from echolab2.instruments.util import parsers
+from echolab2.instruments.util import ek60_ingest
+
+
+def iter_datagrams(filename):
+    '''
+    Yields the datagrams in a raw file without the leading and trailing size.
+    '''
+    with open(filename, 'rb') as fh:
+        data = fh.read()
+    pos = 0
+    while pos + 4 <= len(data):
+        size = struct.unpack_from('=l', data, pos)[0]
+        yield data[pos + 4:pos + 4 + size]
+        pos += size + 8
+
+
+def mix_sample_intervals(in_filename, out_filename, block_size=10):
+    '''
+    Writes a copy of a raw file where every other block of block_size pings
+    has half the number of samples at twice the sample interval.
+    '''
+    raw_parser = parsers.SimradRawParser()
+    n_pings = {}
+    with open(out_filename, 'wb') as fh:
+        for raw_datagram in iter_datagrams(in_filename):
+            if raw_datagram[:4] == b'RAW0':
+                datagram = raw_parser.from_string(raw_datagram)
+
+                #  count the pings of each channel
+                ping = n_pings.get(datagram['channel'], 0)
+                n_pings[datagram['channel']] = ping + 1
+
+                if (ping // block_size) % 2 == 1 and datagram['count'] > 1:
+                    datagram['sample_interval'] *= 2.0
+                    datagram['count'] = datagram['count'] // 2
+                    for key in ['power', 'angle']:
+                        if datagram[key] is not None:
+                            datagram[key] = \
+                                datagram[key][0:datagram['count'] * 2:2]
+
+                    #  the packer expects the string fields as bytes
+                    datagram['type'] = datagram['type'].encode()
+                    datagram['spare0'] = datagram['spare0'].encode('latin_1')
+                    raw_datagram = raw_parser._pack_contents(datagram, 0)
+
+            fh.write(parsers._SimradDatagramParser.finalize_datagram(
+                    raw_datagram))
+
+
+def compare(name, full, rolling):
+    '''
+    Compares the rolling buffer's pings to the last pings of the normal read.
+    Deleted pings (with empty ping times) are skipped but must be empty.
+    '''
+    full_valid = ~np.isnat(full.ping_time)
+    rolling_valid = ~np.isnat(rolling.ping_time)
+    n_pings = np.count_nonzero(rolling_valid)
+    n_samples = min(full.data.shape[1], rolling.data.shape[1])
+    full_data = full.data[full_valid][-n_pings:, 0:n_samples]
+    rolling_data = rolling.data[rolling_valid][:, 0:n_samples]
+
+    #  anything beyond the normal read's samples must be empty as must the
+    #  deleted pings
+    empty_ok = (np.all(np.isnan(rolling.data[:, n_samples:])) and
+                np.all(np.isnan(rolling.data[~rolling_valid])) and
+                np.all(np.isnan(full.data[~full_valid])))
+    ok = (empty_ok and np.allclose(full_data, rolling_data, equal_nan=True)
+          and np.allclose(full.range[0:n_samples],
+                          rolling.range[0:n_samples]))
+    print('    %-6s %s' % (name, 'OK' if ok else 'MISMATCH'))
+    return ok
+
+
+async def replay(filename):
+    '''
+    Replays a raw file to a DatagramIngestServer and returns the server once
+    all of the datagrams have been stored.
+    '''
+    server = ek60_ingest.DatagramIngestServer()
+    tcp_server = await server.start_tcp('127.0.0.1', 0)
+    port = tcp_server.sockets[0].getsockname()[1]
+
+    n_sent = await ek60_ingest.replay_raw_file(filename, '127.0.0.1', port,
+                                               speed=None)
+
+    #  the sender can finish before the server has read everything
+    while server.n_received < n_sent:
+        await asyncio.sleep(0.01)
+    await server.stop()
+
+    return server
+
+
+if len(sys.argv) > 1:
+    in_filename = sys.argv[1]
+else:
+    in_filename = os.path.join(os.path.dirname(__file__), 'data',
+                               'test_data.raw')
+
+fd, mixed_filename = tempfile.mkstemp(suffix='.raw')
+os.close(fd)
+try:
+    mix_sample_intervals(in_filename, mixed_filename)
+
+    #  read the mixed file normally
+    ek60 = EK60.EK60()
+    ek60.read_raw(mixed_filename)
+
+    #  and replay it into the default rolling buffers
+    server = asyncio.run(replay(mixed_filename))
+
+    all_ok = True
+    for channel_id in ek60.channel_ids:
+        full = ek60.raw_data[channel_id]
+        rolling = server.ek60.raw_data[channel_id]
+        print('%s: %d pings, rolling buffer with %d samples' %
+              (channel_id, rolling.n_pings, rolling.n_samples))
+        all_ok &= compare('Sv', full.get_Sv(), rolling.get_Sv())
+        all_ok &= compare('power', full.get_power(), rolling.get_power())
+
+        #  delete (without removing) the 10th through 20th pings of the
+        #  rolling buffer from both objects.  The deleted pings must not
+        #  use the calibration of the other pings.
+        ping_time = rolling.get_power().ping_time
+        for raw_data in [full, rolling]:
+            raw_data.delete(start_time=ping_time[9], end_time=ping_time[19],
+                            remove=False)
+        print('  after deleting pings 10-20')
+        all_ok &= compare('Sv', full.get_Sv(), rolling.get_Sv())
+        all_ok &= compare('power', full.get_power(), rolling.get_power())
+finally:
+    os.remove(mixed_filename)
+
+if not all_ok:
+    sys.exit(1)